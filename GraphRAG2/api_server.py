@@ -1,42 +1,187 @@
 # File: D:\UnityGame\GraphRAG2\api_server.py
-from flask import Flask, request, jsonify
+import json
+import os
+import threading
+import time
+import uuid
+from flask import Flask, Response, request, jsonify, stream_with_context
 from flask_cors import CORS
-from src.main import BirdGraphRAG
+from src.config import Config
+from src.metrics import CONTENT_TYPE, METRICS
+from src.tracing import Trace
+from src.utils import ConcurrencyLimiter, Overloaded
 
 app = Flask(__name__)
+
+def _session_id(data):
+    """Session id lấy từ body hoặc header X-Session-Id; chưa có thì tạo mới."""
+    return data.get('session_id') or request.headers.get('X-Session-Id') or uuid.uuid4().hex
+
+def _new_trace():
+    """Trace cho một request; dùng lại X-Trace-Id của client nếu có (để nối log hai phía)."""
+    return Trace(request.headers.get('X-Trace-Id'))
+
 # Cho phép Frontend (port 3000) gọi sang Backend (port 5000)
 CORS(app) 
 
-print("⏳ Đang khởi động Bot... Vui lòng chờ!")
-# Khởi tạo Bot 1 lần duy nhất khi server bật
-bot = BirdGraphRAG()
-print("✅ Bot đã sẵn sàng!")
+# Khởi tạo Bot 1 lần duy nhất, ở thread nền: server bind cổng ngay,
+# trạng thái sẵn sàng được báo qua /api/health.
+bot = None
+_boot = {"status": "starting", "error": None, "started": time.perf_counter(), "ready_after_s": None}
+
+# Giới hạn số lượt chat xử lý đồng thời; hàng chờ đầy / chờ quá lâu -> 503 (backpressure)
+limiter = ConcurrencyLimiter(Config.MAX_CONCURRENT_TURNS, Config.MAX_QUEUED_TURNS, Config.QUEUE_TIMEOUT)
+
+def _init_bot(slots):
+    """slots: limiter của server, truyền vào thread (làm mới nền đọc nó để biết server đang đông)."""
+    global bot
+    print("⏳ Đang khởi động Bot ở background...")
+    try:
+        # Import ở đây: src.main kéo theo LangChain/Neo4j, không nên chặn lúc import server
+        from src.main import BirdGraphRAG
+        bot = BirdGraphRAG()
+        if Config.REFRESH_ENABLED:
+            # Làm mới nền chỉ chạy khi server rảnh: có request đang chờ / đủ slot -> tạm dừng
+            bot.start_refresh(busy=lambda: slots.waiting > 0 or slots.in_flight >= slots.limit)
+        _boot["status"] = "ready"
+        _boot["ready_after_s"] = round(time.perf_counter() - _boot["started"], 2)
+        print(f"✅ Bot đã sẵn sàng sau {_boot['ready_after_s']}s!")
+    except Exception as e:
+        _boot["status"] = "error"
+        _boot["error"] = str(e)
+        print(f"❌ Không khởi động được Bot: {e}")
+
+threading.Thread(target=_init_bot, args=(limiter,), name="bot-init", daemon=True).start()
+
+def _overloaded(e):
+    print(f"🚦 Quá tải, từ chối request: {e}")
+    return jsonify({"error": "Server is overloaded, please retry", "reason": str(e)}), 503, {"Retry-After": "1"}
+
+def _not_ready():
+    """Trả 503 khi Bot chưa sẵn sàng, None nếu đã sẵn sàng."""
+    if bot is not None:
+        return None
+    return jsonify({"error": "Bot is not ready", "status": _boot["status"]}), 503, {"Retry-After": "2"}
+
+@app.route('/api/health', methods=['GET'])
+def health_endpoint():
+    body = {
+        "status": _boot["status"],
+        "uptime_s": round(time.perf_counter() - _boot["started"], 2),
+        "ready_after_s": _boot["ready_after_s"],
+        "error": _boot["error"],
+        "load": limiter.stats(),
+        "answer_cache": bot.answer_cache.stats() if bot is not None and bot.answer_cache else None,
+    }
+    return jsonify(body), (200 if _boot["status"] == "ready" else 503)
+
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    # Histogram thời gian từng giai đoạn, token LLM, số lượt chậm (định dạng Prometheus)
+    return Response(METRICS.render(), content_type=CONTENT_TYPE)
 
 @app.route('/api/chat', methods=['POST'])
 def chat_endpoint():
+    not_ready = _not_ready()
+    if not_ready:
+        return not_ready
     try:
         # 1. Nhận dữ liệu từ React gửi sang
         data = request.json
         user_msg = data.get('message', '')
+        session_id = _session_id(data)
 
         if not user_msg:
             return jsonify({"error": "No message provided"}), 400
 
         print(f"📩 Nhận từ Web: {user_msg}")
 
-        # 2. Gửi cho Bot xử lý (Logic cũ của bạn)
-        ai_response = bot.process_turn(user_msg)
+        # 2. Gửi cho Bot xử lý (Logic cũ của bạn), khi còn slot
+        try:
+            limiter.acquire()
+        except Overloaded as e:
+            return _overloaded(e)
+        started = time.perf_counter()
+        trace = _new_trace()
+        try:
+            ai_response = bot.process_turn(user_msg, session_id, trace)
+        finally:
+            limiter.release()
+        total_ms = (time.perf_counter() - started) * 1000
 
         # 3. Trả kết quả về cho React
         return jsonify({
             "response": ai_response,
-            "status": "success"
-        })
+            "status": "success",
+            "session_id": session_id,
+            "trace_id": trace.trace_id,
+            "metrics": {"total_ms": round(total_ms, 1)}
+        }), 200, {"X-Trace-Id": trace.trace_id}
 
     except Exception as e:
         print(f"❌ Lỗi: {e}")
         return jsonify({"error": str(e)}), 500
 
+def _sse(event):
+    """Đóng gói một sự kiện thành khung Server-Sent Events."""
+    payload = {k: v for k, v in event.items() if k != "event"}
+    return f"event: {event['event']}\ndata: {json.dumps(payload, ensure_ascii=False)}\n\n"
+
+@app.route('/api/chat/stream', methods=['POST'])
+def chat_stream_endpoint():
+    not_ready = _not_ready()
+    if not_ready:
+        return not_ready
+    data = request.json or {}
+    user_msg = data.get('message', '')
+    session_id = _session_id(data)
+
+    if not user_msg:
+        return jsonify({"error": "No message provided"}), 400
+
+    print(f"📩 Nhận từ Web (stream): {user_msg}")
+    try:
+        limiter.acquire()
+    except Overloaded as e:
+        return _overloaded(e)
+    started = time.perf_counter()
+    trace = _new_trace()
+
+    def generate():
+        # first_stage: thời điểm có sự kiện đầu tiên của pipeline (stage 'contextualized'; sự kiện
+        #   session đã gửi ngay từ đầu nên đây không phải time-to-first-byte)
+        # TTFT: thời điểm gửi token đầu tiên của câu trả lời
+        first_stage = ttft = None
+        try:
+            yield _sse({"event": "session", "session_id": session_id, "trace_id": trace.trace_id})
+            for event in bot.stream_turn(user_msg, session_id, trace):
+                elapsed_ms = (time.perf_counter() - started) * 1000
+                if first_stage is None:
+                    first_stage = elapsed_ms
+                if event["event"] == "token" and ttft is None:
+                    ttft = elapsed_ms
+                if event["event"] == "done":
+                    event = dict(event, metrics={
+                        "first_stage_ms": round(first_stage, 1),
+                        "ttft_ms": round(ttft, 1) if ttft is not None else None,
+                        "total_ms": round(elapsed_ms, 1)
+                    })
+                    print(f"⏱️ [Stream] first stage {first_stage:.0f}ms | first token {ttft or 0:.0f}ms | total {elapsed_ms:.0f}ms")
+                yield _sse(event)
+        except Exception as e:
+            print(f"❌ Lỗi: {e}")
+            yield _sse({"event": "error", "error": str(e)})
+
+    response = Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no', 'X-Trace-Id': trace.trace_id}
+    )
+    # Trả slot khi stream kết thúc hoặc client ngắt kết nối
+    response.call_on_close(limiter.release)
+    return response
+
 if __name__ == '__main__':
-    # Chạy server tại cổng 5000
-    app.run(host='0.0.0.0', port=5000, debug=True)
\ No newline at end of file
+    # Chạy server tại cổng 5000 (dev server, mỗi request một thread).
+    # Production: dùng asgi_server.py (uvicorn). FLASK_DEBUG=1 để bật debug/reloader.
+    app.run(host='0.0.0.0', port=5000, debug=os.getenv("FLASK_DEBUG", "0") == "1", threaded=True)
\ No newline at end of file
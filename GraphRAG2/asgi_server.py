@@ -0,0 +1,215 @@
+# File: asgi_server.py
+# Server ASGI (Starlette + uvicorn) cho chat API, cùng các endpoint với api_server.py.
+# Pipeline chạy trên thread pool của Bot (aprocess_turn / astream_turn) nên event loop
+# không bị chặn; số lượt đồng thời bị giới hạn, quá tải -> 503 kèm Retry-After.
+# Chạy: uvicorn asgi_server:app --host 0.0.0.0 --port 5000   (hoặc python asgi_server.py)
+import json
+import threading
+import time
+import uuid
+from contextlib import asynccontextmanager
+
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.responses import JSONResponse, Response, StreamingResponse
+from starlette.routing import Route
+
+from src.config import Config
+from src.metrics import CONTENT_TYPE, METRICS
+from src.tracing import Trace
+from src.utils import AsyncConcurrencyLimiter, Overloaded
+
+# Bot khởi tạo ở thread nền (giống api_server.py): server nhận request ngay,
+# trạng thái sẵn sàng được báo qua /api/health.
+bot = None
+_boot = {"status": "starting", "error": None, "started": time.perf_counter(), "ready_after_s": None}
+
+# Giới hạn số lượt chat xử lý đồng thời; hàng chờ đầy / chờ quá lâu -> 503 (backpressure)
+limiter = AsyncConcurrencyLimiter(Config.MAX_CONCURRENT_TURNS, Config.MAX_QUEUED_TURNS, Config.QUEUE_TIMEOUT)
+
+
+def _init_bot(slots):
+    """slots: limiter của server, truyền vào thread (làm mới nền đọc nó để biết server đang đông)."""
+    global bot
+    print("⏳ Đang khởi động Bot ở background...")
+    try:
+        from src.main import BirdGraphRAG
+        bot = BirdGraphRAG()
+        if Config.REFRESH_ENABLED:
+            # Làm mới nền chỉ chạy khi server rảnh: có request đang chờ / đủ slot -> tạm dừng
+            bot.start_refresh(busy=lambda: slots.waiting > 0 or slots.in_flight >= slots.limit)
+        _boot["status"] = "ready"
+        _boot["ready_after_s"] = round(time.perf_counter() - _boot["started"], 2)
+        print(f"✅ Bot đã sẵn sàng sau {_boot['ready_after_s']}s!")
+    except Exception as e:
+        _boot["status"] = "error"
+        _boot["error"] = str(e)
+        print(f"❌ Không khởi động được Bot: {e}")
+
+
+@asynccontextmanager
+async def lifespan(app):
+    threading.Thread(target=_init_bot, args=(limiter,), name="bot-init", daemon=True).start()
+    yield
+    if bot is not None:
+        bot.close()
+
+
+def _not_ready():
+    """Trả 503 khi Bot chưa sẵn sàng, None nếu đã sẵn sàng."""
+    if bot is not None:
+        return None
+    return JSONResponse({"error": "Bot is not ready", "status": _boot["status"]}, 503, {"Retry-After": "2"})
+
+
+def _overloaded(e):
+    print(f"🚦 Quá tải, từ chối request: {e}")
+    return JSONResponse({"error": "Server is overloaded, please retry", "reason": str(e)}, 503, {"Retry-After": "1"})
+
+
+async def _read_message(request):
+    """Đọc body JSON -> (message, session_id). Session id lấy từ body hoặc header X-Session-Id."""
+    try:
+        data = await request.json()
+    except ValueError:
+        data = {}
+    data = data if isinstance(data, dict) else {}
+    session_id = data.get('session_id') or request.headers.get('X-Session-Id') or uuid.uuid4().hex
+    return data.get('message', ''), session_id
+
+
+def _new_trace(request):
+    """Trace cho một request; dùng lại X-Trace-Id của client nếu có (để nối log hai phía)."""
+    return Trace(request.headers.get('X-Trace-Id'))
+
+
+def _sse(event):
+    """Đóng gói một sự kiện thành khung Server-Sent Events."""
+    payload = {k: v for k, v in event.items() if k != "event"}
+    return f"event: {event['event']}\ndata: {json.dumps(payload, ensure_ascii=False)}\n\n"
+
+
+class _SlotStreamingResponse(StreamingResponse):
+    """StreamingResponse trả slot của limiter khi stream kết thúc, kể cả khi client ngắt kết nối."""
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            limiter.release()
+
+
+async def health_endpoint(request):
+    body = {
+        "status": _boot["status"],
+        "uptime_s": round(time.perf_counter() - _boot["started"], 2),
+        "ready_after_s": _boot["ready_after_s"],
+        "error": _boot["error"],
+        "load": limiter.stats(),
+        "answer_cache": bot.answer_cache.stats() if bot is not None and bot.answer_cache else None,
+    }
+    return JSONResponse(body, 200 if _boot["status"] == "ready" else 503)
+
+
+async def metrics_endpoint(request):
+    # Histogram thời gian từng giai đoạn, token LLM, số lượt chậm (định dạng Prometheus)
+    return Response(METRICS.render(), headers={"Content-Type": CONTENT_TYPE})
+
+
+async def chat_endpoint(request):
+    not_ready = _not_ready()
+    if not_ready:
+        return not_ready
+    user_msg, session_id = await _read_message(request)
+    if not user_msg:
+        return JSONResponse({"error": "No message provided"}, 400)
+
+    print(f"📩 Nhận từ Web: {user_msg}")
+    try:
+        await limiter.acquire()
+    except Overloaded as e:
+        return _overloaded(e)
+
+    started = time.perf_counter()
+    trace = _new_trace(request)
+    try:
+        ai_response = await bot.aprocess_turn(user_msg, session_id, trace)
+    except Exception as e:
+        print(f"❌ Lỗi: {e}")
+        return JSONResponse({"error": str(e), "trace_id": trace.trace_id}, 500)
+    finally:
+        limiter.release()
+    total_ms = (time.perf_counter() - started) * 1000
+
+    return JSONResponse({
+        "response": ai_response,
+        "status": "success",
+        "session_id": session_id,
+        "trace_id": trace.trace_id,
+        "metrics": {"total_ms": round(total_ms, 1)}
+    }, headers={"X-Trace-Id": trace.trace_id})
+
+
+async def chat_stream_endpoint(request):
+    not_ready = _not_ready()
+    if not_ready:
+        return not_ready
+    user_msg, session_id = await _read_message(request)
+    if not user_msg:
+        return JSONResponse({"error": "No message provided"}, 400)
+
+    print(f"📩 Nhận từ Web (stream): {user_msg}")
+    try:
+        await limiter.acquire()
+    except Overloaded as e:
+        return _overloaded(e)
+    started = time.perf_counter()
+    trace = _new_trace(request)
+
+    async def generate():
+        # first_stage / TTFT đo giống api_server.py
+        first_stage = ttft = None
+        try:
+            yield _sse({"event": "session", "session_id": session_id, "trace_id": trace.trace_id})
+            async for event in bot.astream_turn(user_msg, session_id, trace):
+                elapsed_ms = (time.perf_counter() - started) * 1000
+                if first_stage is None:
+                    first_stage = elapsed_ms
+                if event["event"] == "token" and ttft is None:
+                    ttft = elapsed_ms
+                if event["event"] == "done":
+                    event = dict(event, metrics={
+                        "first_stage_ms": round(first_stage, 1),
+                        "ttft_ms": round(ttft, 1) if ttft is not None else None,
+                        "total_ms": round(elapsed_ms, 1)
+                    })
+                    print(f"⏱️ [Stream] first stage {first_stage:.0f}ms | first token {ttft or 0:.0f}ms | total {elapsed_ms:.0f}ms")
+                yield _sse(event)
+        except Exception as e:
+            print(f"❌ Lỗi: {e}")
+            yield _sse({"event": "error", "error": str(e)})
+
+    return _SlotStreamingResponse(
+        generate(),
+        media_type='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no', 'X-Trace-Id': trace.trace_id}
+    )
+
+
+app = Starlette(
+    routes=[
+        Route('/api/health', health_endpoint, methods=['GET']),
+        Route('/metrics', metrics_endpoint, methods=['GET']),
+        Route('/api/chat', chat_endpoint, methods=['POST']),
+        Route('/api/chat/stream', chat_stream_endpoint, methods=['POST']),
+    ],
+    # Cho phép Frontend (port 3000) gọi sang Backend (port 5000)
+    middleware=[Middleware(CORSMiddleware, allow_origins=['*'], allow_methods=['*'], allow_headers=['*'])],
+    lifespan=lifespan,
+)
+
+if __name__ == '__main__':
+    import uvicorn
+
+    # Một worker: mỗi process giữ một Bot (model embedding, pool kết nối)
+    uvicorn.run(app, host='0.0.0.0', port=5000)
@@ -0,0 +1,212 @@
+# File: benchmarks/bench_e2e.py
+# Benchmark end-to-end OFFLINE, tái lập được: chạy BirdGraphRAG.process_turn thật trên bộ câu
+# hỏi cố định (tiếng Việt + tiếng Anh, có hội thoại nhiều lượt) với:
+#   - response Wikidata / Wikipedia / IUCN / Birdspedia / Xeno-canto đã ghi (fixtures/e2e_responses.json,
+#     phát lại cả độ trễ đã ghi), LLM giả tất định, graph trong bộ nhớ (benchmarks/offline.py)
+# Báo: độ trễ end-to-end và theo từng giai đoạn (span của Trace), số lời gọi LLM, số request
+# ra ngoài theo nguồn, số round trip graph, bộ nhớ. So với baseline_e2e.json: vượt ngưỡng -> exit 1.
+# Chạy (từ thư mục GraphRAG2):
+#   python -m benchmarks.bench_e2e                     # so với baseline
+#   python -m benchmarks.bench_e2e --update-baseline   # ghi baseline mới
+#   python -m benchmarks.bench_e2e --latency-scale 0   # không phát lại độ trễ (chạy nhanh, bỏ qua cổng độ trễ)
+#   python -m benchmarks.bench_e2e --record            # gọi dịch vụ thật, ghi lại fixtures (cần mạng, IUCN_API_TOKEN)
+import argparse
+import json
+import os
+import resource
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from benchmarks.offline import FakeLLM, FixtureReplayer, HashingEmbeddings, InMemoryGraph
+from src.config import Config
+from src.graph.embedding_service import EmbeddingService
+from src.tracing import Trace, tokenizer_name
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+CORPUS_PATH = os.path.join(HERE, "fixtures", "e2e_corpus.json")
+RESPONSES_PATH = os.path.join(HERE, "fixtures", "e2e_responses.json")
+BASELINE_PATH = os.path.join(HERE, "baseline_e2e.json")
+
+DEFAULT_TOLERANCES = {
+    "latency_pct": 0.25,      # độ trễ được phép chậm hơn baseline 25% ...
+    "latency_abs_ms": 20,     # ... cộng thêm 20ms (nhiễu lập lịch thread)
+    "memory_pct": 0.30,
+    "memory_abs_mib": 1.0,
+    "tokens_pct": 0.05,
+}
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))] if values else 0.0
+
+
+def _load(path):
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def run_suite(latency_scale, record=False):
+    corpus, responses = _load(CORPUS_PATH), _load(RESPONSES_PATH)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # Cô lập mọi trạng thái trên đĩa: cache response rỗng, không dùng gazetteer cục bộ
+        Config.RESPONSE_CACHE_PATH = os.path.join(tmp, "responses.sqlite3")
+        Config.GAZETTEER_PATH = os.path.join(tmp, "gazetteer.json.gz")
+        Config.SESSION_BACKEND = "memory"
+        Config.SLOW_TURN_MS = float("inf")
+        Config.OFFLINE_MODE = False
+
+        from src.main import BirdGraphRAG
+
+        llm = FakeLLM(corpus["analyses"], responses["llm"], latency_scale)
+        graph = InMemoryGraph(EmbeddingService(HashingEmbeddings()))
+        bot = BirdGraphRAG(graph=graph, llm=llm)
+        replayer = FixtureReplayer(responses["sources"], latency_scale, record=record)
+        replayer.install(bot)
+
+        tracemalloc.start()
+        turns = []
+        started = time.perf_counter()
+        for conversation in corpus["conversations"]:
+            for question in conversation["turns"]:
+                trace = Trace()
+                turn_started = time.perf_counter()
+                bot.process_turn(question, conversation["session"], trace)
+                turns.append({"e2e_ms": (time.perf_counter() - turn_started) * 1000, "spans": list(trace.spans)})
+        wall_s = time.perf_counter() - started
+        _, peak_traced = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        cache_stats = bot.answer_cache.stats() if bot.answer_cache else {}
+        bot.close()
+
+    if record:
+        responses["sources"] = replayer.fixtures
+        with open(RESPONSES_PATH, "w", encoding="utf-8") as f:
+            json.dump(responses, f, ensure_ascii=False, indent=2)
+        print(f"📼 Recorded {sum(replayer.requests.values())} responses -> {RESPONSES_PATH}")
+
+    stage_ms, tokens = {}, {"prompt": 0, "completion": 0}
+    saved = {"context": 0, "history": 0}
+    for turn in turns:
+        for span in turn["spans"]:
+            stage_ms.setdefault(span["name"], []).append(span["duration_ms"])
+            if span["name"] == "prompt":
+                # span "prompt" chỉ ghi số token ước tính của prompt, không phải một lời gọi LLM
+                saved["context"] += span["saved_tokens"]
+                continue
+            tokens["prompt"] += span.get("prompt_tokens", 0)
+            tokens["completion"] += span.get("completion_tokens", 0)
+            saved["history"] += span.get("raw_history_tokens", 0) - span.get("history_tokens", 0)
+    e2e = [t["e2e_ms"] for t in turns]
+
+    return {
+        "latency_scale": latency_scale,
+        "turns": len(turns),
+        "wall_s": round(wall_s, 2),
+        "e2e_ms": {"p50": round(percentile(e2e, 50), 1), "p95": round(percentile(e2e, 95), 1),
+                   "max": round(max(e2e), 1)},
+        "stages": {name: {"count": len(v), "p50_ms": round(percentile(v, 50), 1), "p95_ms": round(percentile(v, 95), 1)}
+                   for name, v in sorted(stage_ms.items())},
+        "llm_calls": dict(sorted(llm.calls.items())),
+        "llm_tokens": dict(tokens, tokenizer=tokenizer_name()),
+        # Token prompt tiết kiệm nhờ đóng gói context + nén lịch sử (so với context dạng repr, lịch sử nguyên văn)
+        "prompt_tokens_saved": dict(saved, per_turn=round(sum(saved.values()) / len(turns), 1)),
+        "outbound_requests": dict(sorted(replayer.requests.items())),
+        "graph_round_trips": graph.round_trips,
+        "answer_cache_hits": cache_stats.get("hits", 0),
+        "memory": {"peak_traced_mib": round(peak_traced / 2 ** 20, 2),
+                   # ru_maxrss: KB trên Linux
+                   "rss_max_mib": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)},
+        "missing_fixtures": sorted(set(replayer.missing)),
+    }
+
+
+def compare(current, baseline, tolerances):
+    """Output: danh sách chuỗi mô tả các chỉ số vượt ngưỡng so với baseline."""
+    failures = []
+
+    def latency(name, cur, base):
+        limit = base * (1 + tolerances["latency_pct"]) + tolerances["latency_abs_ms"]
+        if cur > limit:
+            failures.append(f"{name}: {cur:.1f}ms > {limit:.1f}ms (baseline {base:.1f}ms)")
+
+    def count(name, cur, base):
+        if cur > base:
+            failures.append(f"{name}: {cur} > baseline {base}")
+
+    if current["latency_scale"] == baseline["latency_scale"] and current["latency_scale"]:
+        for key in ("p50", "p95"):
+            latency(f"e2e {key}", current["e2e_ms"][key], baseline["e2e_ms"][key])
+        for stage, base in baseline["stages"].items():
+            if stage in current["stages"]:
+                latency(f"stage {stage} p50", current["stages"][stage]["p50_ms"], base["p50_ms"])
+    else:
+        print("⚠️ latency_scale khác baseline (hoặc bằng 0): bỏ qua cổng độ trễ.")
+
+    for group in ("llm_calls", "outbound_requests"):
+        for name in sorted(set(current[group]) | set(baseline[group])):
+            count(f"{group}.{name}", current[group].get(name, 0), baseline[group].get(name, 0))
+    count("graph_round_trips", current["graph_round_trips"], baseline["graph_round_trips"])
+
+    base_tokens, cur_tokens = baseline["llm_tokens"], current["llm_tokens"]
+    if base_tokens.get("tokenizer") == cur_tokens.get("tokenizer"):
+        for kind in ("prompt", "completion"):
+            limit = base_tokens[kind] * (1 + tolerances["tokens_pct"])
+            if cur_tokens[kind] > limit:
+                failures.append(f"llm_tokens.{kind}: {cur_tokens[kind]} > {limit:.0f} (baseline {base_tokens[kind]})")
+
+    base_mem, cur_mem = baseline["memory"]["peak_traced_mib"], current["memory"]["peak_traced_mib"]
+    limit = base_mem * (1 + tolerances["memory_pct"]) + tolerances["memory_abs_mib"]
+    if cur_mem > limit:
+        failures.append(f"memory peak: {cur_mem:.2f}MiB > {limit:.2f}MiB (baseline {base_mem:.2f}MiB)")
+
+    if current["missing_fixtures"]:
+        failures.append(f"missing fixtures: {', '.join(current['missing_fixtures'])}")
+    return failures
+
+
+def report(result):
+    print(f"\n--- {result['turns']} lượt chat, {result['wall_s']}s (latency scale {result['latency_scale']}) ---")
+    e2e = result["e2e_ms"]
+    print(f"End-to-end          : p50 {e2e['p50']:.0f}ms | p95 {e2e['p95']:.0f}ms | max {e2e['max']:.0f}ms")
+    print(f"{'stage':<20}| {'count':>5} | {'p50 ms':>8} | {'p95 ms':>8}")
+    for name, stage in result["stages"].items():
+        print(f"{name:<20}| {stage['count']:>5} | {stage['p50_ms']:>8.1f} | {stage['p95_ms']:>8.1f}")
+    print(f"LLM calls           : {result['llm_calls']}")
+    print(f"LLM tokens          : {result['llm_tokens']}")
+    print(f"Prompt tokens saved : {result.get('prompt_tokens_saved')}")
+    print(f"Outbound requests   : {result['outbound_requests']}")
+    print(f"Graph round trips   : {result['graph_round_trips']}")
+    print(f"Answer cache hits   : {result['answer_cache_hits']}")
+    print(f"Memory              : {result['memory']}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark end-to-end offline với fixtures đã ghi")
+    parser.add_argument("--latency-scale", type=float, default=1.0, help="hệ số nhân độ trễ đã ghi (0 = không chờ)")
+    parser.add_argument("--update-baseline", action="store_true")
+    parser.add_argument("--record", action="store_true", help="gọi dịch vụ thật và ghi lại fixtures")
+    args = parser.parse_args()
+
+    result = run_suite(args.latency_scale, record=args.record)
+    report(result)
+
+    if args.update_baseline:
+        tolerances = _load(BASELINE_PATH)["tolerances"] if os.path.exists(BASELINE_PATH) else DEFAULT_TOLERANCES
+        with open(BASELINE_PATH, "w", encoding="utf-8") as f:
+            json.dump({"tolerances": tolerances, "metrics": result}, f, ensure_ascii=False, indent=2)
+            f.write("\n")
+        print(f"\n📌 Baseline updated: {BASELINE_PATH}")
+        sys.exit(0)
+
+    baseline = _load(BASELINE_PATH)
+    failures = compare(result, baseline["metrics"], baseline["tolerances"])
+    if failures:
+        print("\n❌ REGRESSIONS:")
+        for failure in failures:
+            print(f"   - {failure}")
+        sys.exit(1)
+    print("\n✅ No regressions against baseline.")
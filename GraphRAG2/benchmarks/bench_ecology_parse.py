@@ -0,0 +1,94 @@
+# File: benchmarks/bench_ecology_parse.py
+# Throughput parse trang loài Animal Diversity Web (fixtures/adw/*.html, đọc hết vào bộ nhớ trước):
+#   - stream    : AdwEcologyParser (lxml HTMLPullParser theo chunk 16KB + XPath, dừng sớm) — cách dùng thật
+#   - lxml-tree : dựng cả cây lxml.html rồi XPath (để so sánh)
+#   - bs4-tree  : dựng cả cây BeautifulSoup rồi tìm mục (để so sánh; bỏ qua nếu chưa cài beautifulsoup4)
+# Mỗi cách chạy trong một process con riêng. Báo: trang/giây, MB HTML/giây, đỉnh bộ nhớ Python
+# (tracemalloc, một lượt parse) và RSS tăng thêm (gồm cả bộ nhớ C của libxml2).
+# Chạy: python -m benchmarks.bench_ecology_parse [số_vòng]   (từ thư mục GraphRAG2)
+import glob
+import multiprocessing
+import os
+import resource
+import sys
+import time
+import tracemalloc
+
+from src.data_loaders.birdspedia import CHUNK_SIZE, parse_ecology
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+PAGES_GLOB = os.path.join(HERE, "fixtures", "adw", "*.html")
+
+
+def parse_stream(data):
+    return parse_ecology(data[i:i + CHUNK_SIZE] for i in range(0, len(data), CHUNK_SIZE))
+
+
+def parse_lxml_tree(data):
+    import lxml.html
+    tree = lxml.html.document_fromstring(data)
+    return {section: tree.xpath(f"string(//h3[@id='{section}']/following-sibling::ul[1])")
+            for section in ("habitat", "behavior", "food_habits")}
+
+
+def parse_bs4_tree(data):
+    from bs4 import BeautifulSoup
+    soup = BeautifulSoup(data, "html.parser")
+    return {section: soup.find("h3", id=section).find_next_sibling("ul").get_text(" ", strip=True)
+            for section in ("habitat", "behavior", "food_habits")}
+
+
+MODES = {"stream": parse_stream, "lxml-tree": parse_lxml_tree, "bs4-tree": parse_bs4_tree}
+
+
+def run_mode(name, pages, rounds, results):
+    parse = MODES[name]
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    tracemalloc.start()
+    parse(pages[0])
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    started = time.perf_counter()
+    for _ in range(rounds):
+        for page in pages:
+            parse(page)
+    seconds = time.perf_counter() - started
+    count, size = rounds * len(pages), rounds * sum(len(p) for p in pages)
+    results.put({
+        "mode": name,
+        "pages_per_s": count / seconds,
+        "mb_per_s": size / seconds / 2 ** 20,
+        "peak_traced_kib": peak / 1024,
+        # ru_maxrss: KB trên Linux
+        "rss_growth_mib": (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - rss_before) / 1024,
+    })
+
+
+if __name__ == "__main__":
+    rounds = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    pages = []
+    for path in sorted(glob.glob(PAGES_GLOB)):
+        with open(path, "rb") as f:
+            pages.append(f.read())
+    print(f"{len(pages)} trang fixture, trung bình {sum(map(len, pages)) / len(pages) / 1024:.1f} KB, "
+          f"{rounds} vòng\n")
+    for data in pages[:1]:
+        print(f"Kết quả stream (trang đầu): {parse_stream(data)}\n")
+
+    try:
+        import bs4  # noqa: F401
+    except ImportError:
+        MODES.pop("bs4-tree")
+        print("⚠️ beautifulsoup4 chưa cài: bỏ qua bs4-tree.\n")
+
+    context = multiprocessing.get_context("fork")
+    print(f"{'mode':<10}| {'pages/s':>9} | {'MB/s':>7} | {'peak KiB':>9} | {'RSS +MiB':>8}")
+    for name in MODES:
+        queue = context.Queue()
+        worker = context.Process(target=run_mode, args=(name, pages, rounds, queue))
+        worker.start()
+        r = queue.get()
+        worker.join()
+        print(f"{r['mode']:<10}| {r['pages_per_s']:>9.1f} | {r['mb_per_s']:>7.2f} | "
+              f"{r['peak_traced_kib']:>9.1f} | {r['rss_growth_mib']:>8.1f}")
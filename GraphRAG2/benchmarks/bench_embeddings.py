@@ -0,0 +1,48 @@
+# File: benchmarks/bench_embeddings.py
+# Throughput (texts/giây) của EmbeddingService với all-MiniLM-L6-v2 trên CPU
+# ở nhiều kích thước batch, so với embed_query từng text một, và khi cache đã ấm.
+# Chạy: python -m benchmarks.bench_embeddings [số_text]   (từ thư mục GraphRAG2)
+import sys
+import time
+
+from langchain_huggingface import HuggingFaceEmbeddings
+
+from src.graph.embedding_service import EmbeddingService
+
+SPECIES = ["Chào mào", "Bói cá", "Chích chòe than", "Họa mi", "Cu gáy", "Vành khuyên", "Sẻ nhà", "Đại bàng"]
+
+
+def make_corpus(n):
+    return [
+        f"{SPECIES[i % len(SPECIES)]} (mẫu {i}) là loài chim sống ở rừng thưa, công viên và vườn "
+        f"cây ở Việt Nam. Chúng ăn côn trùng, quả mọng và hạt; mùa sinh sản kéo dài {i % 6 + 2} tháng."
+        for i in range(n)
+    ]
+
+
+def rate(n, seconds):
+    return n / seconds if seconds else float("inf")
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 256
+    texts = make_corpus(n)
+    model = HuggingFaceEmbeddings(model_name="all-MiniLM-L6-v2")
+    model.embed_query("warm up")
+
+    started = time.perf_counter()
+    for t in texts:
+        model.embed_query(t)
+    print(f"embed_query từng text   : {rate(n, time.perf_counter() - started):8.1f} texts/s")
+
+    for batch_size in (1, 8, 32, 64, 128):
+        service = EmbeddingService(model, cache_path=None, batch_size=batch_size)
+        started = time.perf_counter()
+        vectors = service.embed_documents(texts)
+        cold = time.perf_counter() - started
+
+        started = time.perf_counter()
+        service.embed_documents(texts)
+        warm = time.perf_counter() - started
+        print(f"batch {batch_size:4}              : {rate(n, cold):8.1f} texts/s (cold) | "
+              f"{rate(n, warm):10.1f} texts/s (cache) | {vectors[0].dtype}, {vectors[0].nbytes} B/vector")
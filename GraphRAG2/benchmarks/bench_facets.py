@@ -0,0 +1,100 @@
+# File: benchmarks/bench_facets.py
+# Độ trễ truy vấn theo tập (Neo4jHandler.find_birds) trên Neo4j THẬT (NEO4J_URI), cỡ cả checklist:
+#   - nạp N loài giả lập (tên khoa học "Benchmarkus avis-<n>") qua commit_batch, cùng phân bố thô
+#     như checklist thế giới: ~250 họ / 40 bộ, hạng IUCN lệch về LC, 1-3 sinh cảnh + 1-3 thức ăn mỗi loài
+#   - đo p50 / p95 của vài câu hỏi mẫu (FacetParser -> find_birds) và số db hits của một lần PROFILE
+#   - xoá sạch dữ liệu giả lập khi xong (kể cả khi lỗi); node Habitat / Diet / Status dùng chung được giữ
+# Nên chạy trên database thử nghiệm. Chạy: python -m benchmarks.bench_facets [số_loài] [số_vòng]
+#   (từ thư mục GraphRAG2)
+import random
+import sys
+import time
+
+from benchmarks.bench_e2e import percentile
+from src.facets import DIETS, HABITATS, STATUSES, FacetParser
+from src.graph.neo4j_handler import FACET_MATCHES, FIND_BIRDS_RETURN, Neo4jHandler
+
+PREFIX = "Benchmarkus avis-"
+QUESTIONS = [
+    "các loài chim nguy cấp sống ở rừng ngập mặn",
+    "Những loài chim nào ăn cá?",
+    "which birds eat insects in forests",
+    "các loài chim họ Benchmarkidae007 bị đe dọa",
+    "những loài chim bộ Benchmarkiformes03 sống ở đồng cỏ",
+]
+# Tỉ lệ thô các hạng IUCN của chim (phần lớn Ít quan tâm)
+STATUS_WEIGHTS = {"LC": 0.72, "NT": 0.09, "VU": 0.07, "EN": 0.04, "CR": 0.02, "DD": 0.02, "EX": 0.01,
+                  "EW": 0.005, "NE": 0.025}
+
+
+def seed(graph, count, batch=500):
+    rng = random.Random(42)
+    habitats, diets = list(HABITATS), list(DIETS)
+    codes, weights = list(STATUS_WEIGHTS), list(STATUS_WEIGHTS.values())
+    for start in range(0, count, batch):
+        units = []
+        for n in range(start, min(count, start + batch)):
+            family = n % 250
+            unit = graph.begin_enrichment(f"{PREFIX}{n:05d}", f"chim thử {n}")
+            unit.set_details(None, None, family={"name": f"Benchmarkidae{family:03d}"},
+                             order={"name": f"Benchmarkiformes{family % 40:02d}"})
+            unit.set_status(STATUSES[rng.choices(codes, weights)[0]][0])
+            unit.set_ecology({
+                "habitat": ", ".join(HABITATS[k][0] for k in rng.sample(habitats, rng.randint(1, 3))),
+                "diet": ", ".join(DIETS[k][0] for k in rng.sample(diets, rng.randint(1, 3))),
+            })
+            units.append(unit)
+        graph.commit_batch(units)
+
+
+def cleanup(graph):
+    query = """
+    MATCH (b:Bird) WHERE b.scientific_name STARTS WITH $prefix
+    OPTIONAL MATCH (b)-[:HAS_STATUS|HAS_ECOLOGY]->(x)
+    DETACH DELETE b, x
+    """
+    taxa = """
+    MATCH (t) WHERE (t:Family AND t.name STARTS WITH 'Benchmarkidae')
+                 OR (t:Order AND t.name STARTS WITH 'Benchmarkiformes')
+    DETACH DELETE t
+    """
+    with graph.driver.session() as session:
+        session.run(query, prefix=PREFIX).consume()
+        session.run(taxa).consume()
+
+
+def profile_db_hits(graph, facets):
+    query = "PROFILE " + "\n        ".join(FACET_MATCHES[n] for n in FACET_MATCHES if facets.get(n)) + FIND_BIRDS_RETURN
+    params = {name: list(facets.get(name) or []) for name in FACET_MATCHES}
+    with graph.driver.session() as session:
+        summary = session.run(query, limit=15, **params).consume()
+
+    def hits(plan):
+        return plan.get("dbHits", 0) + sum(hits(child) for child in plan.get("children", []))
+
+    return hits(summary.profile) if summary.profile else None
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 11000
+    rounds = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    graph = Neo4jHandler()
+    try:
+        started = time.perf_counter()
+        seed(graph, count)
+        print(f"🌱 Seeded {count} synthetic species in {time.perf_counter() - started:.1f}s\n")
+        parser = FacetParser(graph.get_taxa())
+
+        print(f"{'question':<55}| {'matches':>7} | {'p50 ms':>7} | {'p95 ms':>7} | {'db hits':>8}")
+        for question in QUESTIONS:
+            facets = parser.parse(question)
+            timings, total = [], 0
+            for _ in range(rounds):
+                t0 = time.perf_counter()
+                total, _ = graph.find_birds(facets)
+                timings.append((time.perf_counter() - t0) * 1000)
+            print(f"{question[:55]:<55}| {total:>7} | {percentile(timings, 50):>7.1f} | "
+                  f"{percentile(timings, 95):>7.1f} | {profile_db_hits(graph, facets):>8}")
+    finally:
+        cleanup(graph)
+        graph.close()
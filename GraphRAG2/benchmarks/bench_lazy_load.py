@@ -0,0 +1,58 @@
+# File: benchmarks/bench_lazy_load.py
+# Đo độ trễ bước lazy loading cho một loài "lạnh" (chưa có gì trong Graph)
+# với các fetcher giả lập (sleep), so sánh chạy tuần tự và chạy song song.
+# Chạy: python -m benchmarks.bench_lazy_load   (từ thư mục GraphRAG2)
+import time
+
+from src.data_loaders.concurrent_fetch import ConcurrentFetchStage
+
+# Độ trễ giả lập của từng nguồn (giây)
+FAKE_LATENCY = {
+    "wikidata": 0.8,
+    "wikipedia": 0.6,
+    "iucn": 0.4,
+    "xenocanto": 0.1,
+    "birdspedia": 0.5,
+}
+
+
+def make_stub(name, delay):
+    def fetch():
+        time.sleep(delay)
+        return {"source": name}
+    return fetch
+
+
+def run_sequential(tasks):
+    start = time.perf_counter()
+    results = {name: fn() for name, fn in tasks.items()}
+    return results, time.perf_counter() - start
+
+
+def run_concurrent(stage, tasks):
+    start = time.perf_counter()
+    results = stage.run(tasks)
+    return results, time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    tasks = {name: make_stub(name, d) for name, d in FAKE_LATENCY.items()}
+    stage = ConcurrentFetchStage(default_timeout=5.0, deadline=5.0)
+
+    print("--- COLD TURN: 5 nguồn, không có nguồn nào trễ hạn ---")
+    _, t_seq = run_sequential(tasks)
+    _, t_con = run_concurrent(stage, tasks)
+    print(f"Tổng độ trễ các nguồn : {sum(FAKE_LATENCY.values()):.2f}s")
+    print(f"Nguồn chậm nhất       : {max(FAKE_LATENCY.values()):.2f}s")
+    print(f"Tuần tự               : {t_seq:.2f}s")
+    print(f"Song song             : {t_con:.2f}s  (x{t_seq / t_con:.1f})")
+
+    print("\n--- COLD TURN: IUCN treo 3s, deadline tổng 1s ---")
+    slow_tasks = dict(tasks, iucn=make_stub("iucn", 3.0))
+    slow_stage = ConcurrentFetchStage(default_timeout=5.0, deadline=1.0)
+    results, t_partial = run_concurrent(slow_stage, slow_tasks)
+    print(f"Song song             : {t_partial:.2f}s")
+    print(f"Nguồn ghi được vào Graph: {sorted(results)}")
+
+    stage.shutdown()
+    slow_stage.shutdown()
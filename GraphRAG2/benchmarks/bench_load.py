@@ -0,0 +1,204 @@
+# File: benchmarks/bench_load.py
+# Load test cho asgi_server.py: gửi /api/chat theo tốc độ cố định (open loop) tăng dần,
+# báo p50/p95/p99 độ trễ, số request bị từ chối 503 và throughput thật.
+# LLM, Neo4j và các nguồn HTTP đều là bản giả lập có độ trễ (sleep), không cần mạng.
+# Gọi thẳng app ASGI trong process (không qua socket) để đo chính server.
+# Chạy: python -m benchmarks.bench_load [--rates 2,5,10,20,40] [--duration 5]
+#                                        [--concurrency 8] [--queue 16] [--queue-timeout 10]
+#   (từ thư mục GraphRAG2)
+import argparse
+import asyncio
+import json
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+import asgi_server
+from benchmarks.bench_neo4j_roundtrips import CountingDriver, CountingSession
+from src.config import Config
+from src.data_loaders.concurrent_fetch import ConcurrentFetchStage
+from src.facets import FacetParser
+from src.graph.neo4j_handler import Neo4jHandler
+from src.main import BirdGraphRAG
+from src.prompting import PromptAssembler
+from src.query_classifier import RewriteClassifier
+from src.refresh import PopularityCounter
+from src.session_store import InMemorySessionStore
+from src.utils import AsyncConcurrencyLimiter
+
+# Độ trễ giả lập (giây)
+NEO4J_LATENCY = 0.005
+FETCH_LATENCY = {"wikidata": 0.15, "wikipedia": 0.3, "iucn": 0.2, "xenocanto": 0.1, "birdspedia": 0.25}
+LLM_FIRST_TOKEN = 0.15
+LLM_TOKENS = 20
+LLM_TOKEN_GAP = 0.01
+
+SPECIES = {
+    "chào mào": "Pycnonotus jocosus", "bói cá": "Alcedo atthis", "chích chòe": "Copsychus saularis",
+    "cu gáy": "Spilopelia chinensis", "sẻ nhà": "Passer domesticus", "họa mi": "Garrulax canorus",
+}
+QUESTIONS = ["{} ăn gì?", "{} sống ở đâu?", "{} nặng bao nhiêu?", "{} có bị đe dọa không?"]
+
+
+class StubSession(CountingSession):
+    def run(self, query, **params):
+        time.sleep(NEO4J_LATENCY)
+        return super().run(query, **params)
+
+
+class StubDriver(CountingDriver):
+    def session(self, **kwargs):
+        return StubSession(self)
+
+
+class StubEmbeddings:
+    def embed_query(self, text):
+        return [0.0] * 384
+
+    def embed_documents(self, texts):
+        return [[0.0] * 384 for _ in texts]
+
+
+class StubLLM:
+    """stream(): token đầu sau LLM_FIRST_TOKEN, sau đó mỗi token cách LLM_TOKEN_GAP."""
+    def stream(self, prompt):
+        time.sleep(LLM_FIRST_TOKEN)
+        for i in range(LLM_TOKENS):
+            if i:
+                time.sleep(LLM_TOKEN_GAP)
+            yield SimpleNamespace(content=f"tok{i} ")
+
+    def invoke(self, prompt):
+        time.sleep(LLM_FIRST_TOKEN)
+        question = prompt.split("Latest Question: ", 1)[-1].split("\n", 1)[0]
+        return SimpleNamespace(content=json.dumps({"standalone_question": question, "common_name": None}))
+
+    def bind(self, **kwargs):
+        return self
+
+
+def _sleepy(name, value):
+    def fetch(*args, **kwargs):
+        time.sleep(FETCH_LATENCY[name])
+        return value
+    return fetch
+
+
+def build_stub_bot(concurrency):
+    """BirdGraphRAG với các thành phần thật (pipeline, fetch stage, session, classifier) trên backend giả."""
+    bot = BirdGraphRAG.__new__(BirdGraphRAG)
+    bot.graph = Neo4jHandler(driver=StubDriver(), embeddings=StubEmbeddings(), init_indices=False)
+    bot.llm = bot.analysis_llm = StubLLM()
+    bot.wikidata = SimpleNamespace(
+        common_map=SPECIES,
+        get_bird_data=lambda name: time.sleep(FETCH_LATENCY["wikidata"]) or {
+            "scientific_name": SPECIES.get(name.lower(), name), "image_url": "https://img/x.jpg", "mass": "30"
+        },
+    )
+    bot.wiki = SimpleNamespace(get_page=_sleepy("wikipedia", {
+        "summary": "Một loài chim phổ biến ở Việt Nam.", "title": None, "pageid": 1, "revid": 1, "lang": "vi"
+    }))
+    bot.iucn = SimpleNamespace(get_conservation_status=_sleepy("iucn", "Least Concern"))
+    bot.xenocanto = SimpleNamespace(get_audio=_sleepy("xenocanto", [{"id": "1", "url": "https://xeno-canto.org/1"}]))
+    bot.birdspedia = SimpleNamespace(fetch_ecology_data=_sleepy("birdspedia", {"diet": "Insects", "habitat": "Forest"}))
+    bot.fetch_stage = ConcurrentFetchStage(deadline=5.0, max_workers=max(16, 5 * concurrency))
+    bot.turn_executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="turn")
+    bot.sessions = InMemorySessionStore()
+    bot.prompts = PromptAssembler(token_budget=Config.PROMPT_TOKEN_BUDGET, history_budget=Config.HISTORY_TOKEN_BUDGET,
+                                  history_message_tokens=Config.HISTORY_MESSAGE_TOKENS)
+    bot.rewrite_classifier = RewriteClassifier(SPECIES.keys())
+    bot.facet_parser = FacetParser()
+    bot.popularity = PopularityCounter()
+    bot.refresher = None
+    # Tắt cache câu trả lời: đo chi phí đầy đủ của mỗi lượt
+    bot.answer_cache = None
+    return bot
+
+
+async def asgi_post(app, path, body):
+    """Gửi một request POST JSON thẳng vào app ASGI. Output: (status, body bytes)."""
+    pending = [{"type": "http.request", "body": json.dumps(body).encode(), "more_body": False}]
+    status, chunks = None, []
+
+    async def receive():
+        if pending:
+            return pending.pop()
+        await asyncio.Event().wait()
+
+    async def send(message):
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+        elif message["type"] == "http.response.body":
+            chunks.append(message.get("body", b""))
+
+    scope = {
+        "type": "http", "asgi": {"version": "3.0", "spec_version": "2.4"}, "http_version": "1.1",
+        "method": "POST", "scheme": "http", "path": path, "raw_path": path.encode(), "root_path": "",
+        "query_string": b"", "headers": [(b"content-type", b"application/json")],
+        "client": ("127.0.0.1", 0), "server": ("127.0.0.1", 5000),
+    }
+    await app(scope, receive, send)
+    return status, b"".join(chunks)
+
+
+def percentile(values, p):
+    if not values:
+        return float("nan")
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))]
+
+
+async def run_rate(rate, duration):
+    """Open loop: bắn request đều đặn `rate` req/s trong `duration` giây, không chờ request trước."""
+    latencies, statuses = [], []
+
+    async def one(i):
+        name = random.choice(list(SPECIES))
+        body = {"message": random.choice(QUESTIONS).format(name.capitalize()), "session_id": f"load-{i}"}
+        started = time.perf_counter()
+        status, _ = await asgi_post(asgi_server.app, "/api/chat", body)
+        statuses.append(status)
+        if status == 200:
+            latencies.append((time.perf_counter() - started) * 1000)
+
+    started = time.perf_counter()
+    tasks = []
+    for i in range(int(rate * duration)):
+        await asyncio.sleep(max(0.0, started + i / rate - time.perf_counter()))
+        tasks.append(asyncio.create_task(one(i)))
+    await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - started
+    return latencies, statuses, elapsed
+
+
+async def main(args):
+    print(f"Giới hạn: {args.concurrency} lượt đồng thời, hàng chờ {args.queue}, chờ tối đa {args.queue_timeout}s")
+    print(f"{'req/s':>6} | {'sent':>5} | {'ok':>5} | {'503':>5} | {'p50 ms':>8} | {'p95 ms':>8} | {'p99 ms':>8} | {'ok/s':>6}")
+    for rate in args.rates:
+        # Limiter mới cho mỗi mức tải (gắn với event loop hiện tại)
+        asgi_server.limiter = AsyncConcurrencyLimiter(args.concurrency, args.queue, args.queue_timeout)
+        latencies, statuses, elapsed = await run_rate(rate, args.duration)
+        ok, rejected = statuses.count(200), statuses.count(503)
+        print(f"{rate:>6g} | {len(statuses):>5} | {ok:>5} | {rejected:>5} | {percentile(latencies, 50):>8.0f} | "
+              f"{percentile(latencies, 95):>8.0f} | {percentile(latencies, 99):>8.0f} | {ok / elapsed:>6.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load test asgi_server với backend giả lập")
+    parser.add_argument("--rates", type=lambda s: [float(x) for x in s.split(",")], default=[2, 5, 10, 20, 40])
+    parser.add_argument("--duration", type=float, default=5.0, help="số giây cho mỗi mức tải")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--queue", type=int, default=16)
+    parser.add_argument("--queue-timeout", type=float, default=10.0)
+    args = parser.parse_args()
+
+    random.seed(0)
+    bot = build_stub_bot(args.concurrency)
+    asgi_server.bot = bot
+    asgi_server._boot["status"] = "ready"
+    try:
+        asyncio.run(main(args))
+    finally:
+        bot.close()
@@ -0,0 +1,108 @@
+# File: benchmarks/bench_neo4j_roundtrips.py
+# Đếm số session / round trip tới Neo4j cho một lượt chat với loài "lạnh":
+#   - Trước: check_data_status + 5 hàm update_* lẻ + get_full_context
+#   - Sau : check_data_status + 1 BirdEnrichment.commit(return_context=True)
+# Dùng driver giả lập đếm số lần gọi, không cần Neo4j thật.
+# Chạy: python -m benchmarks.bench_neo4j_roundtrips   (từ thư mục GraphRAG2)
+from src.graph.neo4j_handler import Neo4jHandler
+
+
+class CountingRecord(dict):
+    def data(self):
+        return dict(self)
+
+
+class CountingResult:
+    def __init__(self, records):
+        self.records = records
+
+    def single(self):
+        return self.records[0] if self.records else None
+
+    def __iter__(self):
+        return iter(self.records)
+
+    def consume(self):
+        return None
+
+
+class CountingSession:
+    def __init__(self, driver):
+        self.driver = driver
+
+    def __enter__(self):
+        self.driver.sessions += 1
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def run(self, query, **params):
+        self.driver.round_trips += 1
+        # Loài chưa có trong Graph -> không có record cho các câu đọc
+        if "UNWIND $rows" in query:
+            return CountingResult([CountingRecord(ScientificName=params["rows"][0]["sci"])])
+        return CountingResult([])
+
+    def execute_write(self, work):
+        return work(self)
+
+    execute_read = execute_write
+
+
+class CountingDriver:
+    def __init__(self):
+        self.sessions = 0
+        self.round_trips = 0
+
+    def session(self, **kwargs):
+        return CountingSession(self)
+
+    def reset(self):
+        self.sessions = self.round_trips = 0
+
+    def close(self):
+        pass
+
+
+class FakeEmbeddings:
+    def embed_query(self, text):
+        return [0.0] * 384
+
+    def embed_documents(self, texts):
+        return [self.embed_query(t) for t in texts]
+
+
+SCI = "Alcedo atthis"
+ECO = {"diet": "Fish", "habitat": "Rivers", "migration": "Partial"}
+
+
+def cold_turn_before(graph):
+    graph.check_data_status(SCI)
+    graph.update_details(SCI, "https://img/alcedo.jpg", "40")
+    graph.update_wiki(SCI, "Bói cá", "Bói cá thường là loài chim nhỏ...")
+    graph.update_status(SCI, "Least Concern (Ít quan tâm)")
+    graph.update_audio(SCI, "https://xeno-canto.org/explore?query=Alcedo%20atthis")
+    graph.update_ecology(SCI, ECO)
+    return graph.get_full_context(SCI)
+
+
+def cold_turn_after(graph):
+    graph.check_data_status(SCI)
+    return (graph.begin_enrichment(SCI, "Bói cá")
+            .set_details("https://img/alcedo.jpg", "40")
+            .set_wiki("Bói cá thường là loài chim nhỏ...")
+            .set_status("Least Concern (Ít quan tâm)")
+            .set_audio("https://xeno-canto.org/explore?query=Alcedo%20atthis")
+            .set_ecology(ECO)
+            .commit(return_context=True))
+
+
+if __name__ == "__main__":
+    driver = CountingDriver()
+    graph = Neo4jHandler(driver=driver, embeddings=FakeEmbeddings())
+
+    for label, flow in [("Trước (update_* lẻ)", cold_turn_before), ("Sau (unit of work)", cold_turn_after)]:
+        driver.reset()
+        flow(graph)
+        print(f"{label:22}: {driver.sessions} sessions, {driver.round_trips} round trips / cold turn")
@@ -0,0 +1,67 @@
+# File: benchmarks/bench_rewrite_classifier.py
+# Tỉ lệ lượt chat bỏ qua được lời gọi LLM viết lại câu hỏi (_contextualize_query)
+# trên một bộ hội thoại mẫu, và thời gian tiết kiệm ước lượng.
+# Chạy: python -m benchmarks.bench_rewrite_classifier [độ_trễ_LLM_giây]   (từ thư mục GraphRAG2)
+import sys
+import time
+
+from src.query_classifier import RewriteClassifier
+
+# Tên loài giống WikidataFetcher.common_map + vài tên tiếng Anh đã có trong Graph
+KNOWN_NAMES = [
+    "chim bói cá", "bói cá", "bói cá thường", "chào mào", "chim sẻ", "sẻ nhà", "chim sâu",
+    "vành khuyên", "chích chòe", "chích chòe than", "cu gáy", "chim sáo", "đại bàng",
+    "họa mi", "chim công", "công", "kingfisher", "house sparrow", "oriental magpie-robin",
+]
+
+# Mỗi hội thoại: lượt đầu không có lịch sử nên không bao giờ gọi LLM viết lại;
+# chỉ các lượt sau được tính.
+CONVERSATIONS = [
+    ["Chào mào ăn gì?", "Nó sống ở đâu?", "Chào mào có hót hay không?", "còn chích chòe thì sao?"],
+    ["Chim bói cá nặng bao nhiêu?", "Bói cá có bị đe dọa không?", "Loài này đẻ mấy trứng?"],
+    ["Tell me about the kingfisher", "What does it eat?", "Is the house sparrow endangered?",
+     "House sparrow song"],
+    ["Họa mi hót vào mùa nào?", "Họa mi sống ở rừng hay đồng bằng?", "Chim công có bay được không?",
+     "Con này nặng bao nhiêu?"],
+    ["Cu gáy ăn gì?", "Vành khuyên ăn gì?", "Chích chòe than có quý hiếm không?", "Đại bàng sống bao lâu?"],
+    ["Oriental magpie-robin habitat", "Where does it nest?", "Oriental magpie-robin diet"],
+]
+
+# Hồi quy: câu hỏi không nêu loài nào (từ thông dụng trùng tên loài một âm tiết)
+# -> find_all_known_species phải rỗng; "chúng tôi / chúng ta" không phải đại từ trỏ về loài
+NO_SPECIES = [
+    "Làm sao để nuôi chim cảnh thành công?",
+    "Chim gì sống ở công viên?",
+    "Chúng ta nên cho chim ăn gì vào mùa đông?",
+]
+NO_REWRITE = ["Chúng tôi muốn biết chào mào ăn gì?", "Chim công có bay được không?"]
+
+
+if __name__ == "__main__":
+    llm_latency = float(sys.argv[1]) if len(sys.argv) > 1 else 0.7
+    classifier = RewriteClassifier(KNOWN_NAMES)
+
+    follow_ups = [turn for conv in CONVERSATIONS for turn in conv[1:]]
+    started = time.perf_counter()
+    decisions = [classifier.needs_rewrite(q) for q in follow_ups]
+    per_call_us = (time.perf_counter() - started) / len(follow_ups) * 1e6
+
+    for q, need in zip(follow_ups, decisions):
+        print(f"  {'LLM ' if need else 'skip'} | {q}")
+
+    skipped = decisions.count(False)
+    print(f"\nLượt có lịch sử       : {len(follow_ups)}")
+    print(f"Bỏ qua LLM            : {skipped} ({skipped / len(follow_ups):.0%})")
+    print(f"Chi phí bộ phân loại  : {per_call_us:.1f} µs/lượt")
+    print(f"Tiết kiệm ước lượng   : {skipped * llm_latency:.1f}s "
+          f"(giả định {llm_latency}s mỗi lần gọi LLM viết lại)")
+
+    failures = [f"{q!r} -> {classifier.find_all_known_species(q)}" for q in NO_SPECIES
+                if classifier.find_all_known_species(q)]
+    failures += [f"{q!r} -> cần viết lại" for q in NO_REWRITE if classifier.needs_rewrite(q)]
+    if failures:
+        print("\n❌ Nhận nhầm tên loài:")
+        for failure in failures:
+            print(f"   {failure}")
+        sys.exit(1)
+    print("\n✅ Không nhận nhầm từ thông dụng là tên loài.")
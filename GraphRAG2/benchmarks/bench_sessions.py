@@ -0,0 +1,29 @@
+# File: benchmarks/bench_sessions.py
+# Kiểm tra bộ nhớ của session store khi có hàng nghìn session đồng thời:
+# mỗi session chat nhiều lượt, bộ nhớ phải phẳng nhờ giới hạn lịch sử + eviction.
+# Chạy: python -m benchmarks.bench_sessions   (từ thư mục GraphRAG2)
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+from src.session_store import InMemorySessionStore
+
+TURNS_PER_SESSION = 20
+ANSWER = "Chào mào là loài chim phổ biến ở Việt Nam. " * 20
+
+
+def chat(store, session_id):
+    for i in range(TURNS_PER_SESSION):
+        store.get_history(session_id)
+        store.append(session_id, "human", f"Câu hỏi {i}")
+        store.append(session_id, "ai", ANSWER)
+
+
+if __name__ == "__main__":
+    store = InMemorySessionStore(max_messages=6, idle_ttl=1800, max_sessions=5000)
+    tracemalloc.start()
+    with ThreadPoolExecutor(max_workers=32) as pool:
+        for n_sessions in (1000, 2000, 5000, 10000, 20000):
+            list(pool.map(lambda i: chat(store, f"s{n_sessions}-{i}"), range(n_sessions)))
+            current, _ = tracemalloc.get_traced_memory()
+            print(f"{n_sessions:6} sessions x {TURNS_PER_SESSION} turns -> "
+                  f"{len(store):5} live sessions, {current / 1024 / 1024:6.1f} MiB")
@@ -0,0 +1,44 @@
+# File: benchmarks/bench_startup.py
+# Đo thời gian khởi động api_server.py trong process mới:
+#   - import: thời gian `import api_server` (server có thể bind cổng ngay sau đó)
+#   - ready : thời gian tới khi /api/health trả 200 (Bot đã khởi tạo xong ở background)
+# với các cấu hình EMBEDDING_BACKEND / EMBEDDING_PRELOAD khác nhau.
+# Chạy: python -m benchmarks.bench_startup   (từ thư mục GraphRAG2, cần Neo4j + model)
+import json
+import os
+import subprocess
+import sys
+
+PROBE = r"""
+import json, time
+t0 = time.perf_counter()
+import api_server
+t_import = time.perf_counter() - t0
+client = api_server.app.test_client()
+while True:
+    body = client.get('/api/health').get_json()
+    if body['status'] != 'starting':
+        break
+    time.sleep(0.05)
+print(json.dumps({"import_s": t_import, "ready_s": time.perf_counter() - t0, "status": body['status']}))
+"""
+
+CONFIGS = [
+    {"EMBEDDING_BACKEND": "torch", "EMBEDDING_PRELOAD": "1"},
+    {"EMBEDDING_BACKEND": "torch", "EMBEDDING_PRELOAD": "0"},
+    {"EMBEDDING_BACKEND": "onnx", "EMBEDDING_PRELOAD": "1"},
+    {"EMBEDDING_BACKEND": "onnx-int8", "EMBEDDING_PRELOAD": "1"},
+]
+
+
+if __name__ == "__main__":
+    for config in CONFIGS:
+        env = dict(os.environ, **config)
+        proc = subprocess.run([sys.executable, "-c", PROBE], env=env, capture_output=True, text=True)
+        lines = [l for l in proc.stdout.splitlines() if l.startswith("{")]
+        label = f"{config['EMBEDDING_BACKEND']:9} preload={config['EMBEDDING_PRELOAD']}"
+        if not lines:
+            print(f"{label}: failed\n{proc.stderr[-500:]}")
+            continue
+        result = json.loads(lines[-1])
+        print(f"{label}: import {result['import_s']:.2f}s | ready {result['ready_s']:.2f}s ({result['status']})")
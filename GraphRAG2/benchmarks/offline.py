@@ -0,0 +1,291 @@
+# File: benchmarks/offline.py
+# Các thành phần thay thế dịch vụ thật cho benchmark offline (bench_e2e):
+#   - HashingEmbeddings : embedding tất định (hash từ -> 384 chiều), không cần tải model
+#   - InMemoryGraph     : Neo4jHandler chạy trên dict trong bộ nhớ (cùng interface, cùng cột context)
+#   - FakeLLM           : LLM tất định; phân tích câu hỏi theo fixture, sinh câu trả lời từ hash prompt
+#   - FixtureReplayer   : thay các hàm gọi mạng của fetcher bằng response đã ghi (hoặc ghi lại khi --record)
+import hashlib
+import json
+import math
+import re
+import threading
+import time
+import zlib
+from collections import Counter
+from types import SimpleNamespace
+
+from src.graph.neo4j_handler import BirdEnrichment, Neo4jHandler
+
+DIMENSIONS = 384
+WORD_PATTERN = re.compile(r"\w+", re.UNICODE)
+
+
+class HashingEmbeddings:
+    """Bag-of-words băm vào 384 chiều, chuẩn hoá L2. Cùng text -> cùng vector trên mọi máy."""
+    def embed_query(self, text):
+        vector = [0.0] * DIMENSIONS
+        for word in WORD_PATTERN.findall(text.lower()):
+            vector[zlib.crc32(word.encode("utf-8")) % DIMENSIONS] += 1.0
+        norm = math.sqrt(sum(x * x for x in vector))
+        return [x / norm for x in vector] if norm else vector
+
+    def embed_documents(self, texts):
+        return [self.embed_query(t) for t in texts]
+
+
+class _NoDriver:
+    """InMemoryGraph không có driver: hàm nào lỡ gọi Neo4j thật sẽ báo lỗi ngay."""
+    def session(self, **kwargs):
+        raise RuntimeError("InMemoryGraph has no Neo4j driver")
+
+    def close(self):
+        pass
+
+
+class InMemoryEnrichment(BirdEnrichment):
+    def commit(self, return_context=False):
+        self.handler._apply([self.row])
+        self.handler._notify_write([self.row["sci"]])
+        if return_context:
+            context = self.handler._context(self.row["sci"])
+            self.handler._cache_context(self.row["sci"], context)
+            return context
+
+
+class InMemoryGraph(Neo4jHandler):
+    """
+    Neo4jHandler trên dict: cùng ngữ nghĩa MERGE/COALESCE của ENRICH_QUERY và cùng
+    cột với CONTEXT_FIELDS. round_trips đếm số lần gọi tương ứng một round trip Neo4j.
+    read_bird / check_data_status / get_full_context (kể cả read-through cache) là của
+    Neo4jHandler; ở đây chỉ thay _read_birds.
+    """
+    def __init__(self, embeddings):
+        super().__init__(driver=_NoDriver(), embeddings=embeddings, init_indices=False)
+        self.birds = {}
+        self.round_trips = 0
+        self._lock = threading.Lock()
+
+    def _init_indices(self):
+        pass
+
+    def _apply(self, rows):
+        with self._lock:
+            self.round_trips += 1
+            for row in rows:
+                bird = self.birds.setdefault(row["sci"], {})
+                bird["common_name"] = bird.get("common_name") or row["common"]
+                bird["image_url"] = row["image_url"] or bird.get("image_url")
+                bird["mass"] = row["mass"] or bird.get("mass")
+                for key in ("status", "ecology"):
+                    if row[key]:
+                        bird[key] = dict(row[key][0])
+                if row["family"]:
+                    bird["family"] = dict(row["family"][0])
+                if row["wiki"]:
+                    # summary / embedding None: chỉ cập nhật revision (COALESCE như ENRICH_QUERY)
+                    bird["wiki"] = dict(bird.get("wiki", {}),
+                                        **{k: v for k, v in row["wiki"][0].items() if v is not None})
+                if row["audio"]:
+                    # Bộ bản ghi mới thay hẳn bộ cũ, như ENRICH_QUERY
+                    bird["audio"] = sorted((dict(x) for x in row["audio"]), key=lambda x: x["rank"])
+
+    def _context(self, scientific_name):
+        bird = self.birds[scientific_name]
+        wiki, audio = bird.get("wiki", {}), (bird.get("audio") or [{}])[0]
+        status, ecology = bird.get("status", {}), bird.get("ecology", {})
+        return {
+            "Name": bird.get("common_name"), "ScientificName": scientific_name,
+            "ImageURL": bird.get("image_url"), "Mass": bird.get("mass"),
+            "Description": wiki.get("summary"), "AudioURL": audio.get("url"),
+            "ConservationStatus": status.get("status"),
+            "Diet": ecology.get("diet"), "Habitat": ecology.get("habitat"),
+            "Family": (bird.get("family") or {}).get("name_vi") or (bird.get("family") or {}).get("name"),
+        }
+
+    def _facets(self, bird):
+        """Các khoá mà ENRICH_QUERY nối thành node Family / Order / Status / Habitat / Diet."""
+        family = bird.get("family") or {}
+        status = bird.get("status") or {}
+        ecology = bird.get("ecology") or {}
+        return {
+            "families": {family.get("name")},
+            "orders": {o["name"] for o in family.get("order", [])},
+            "statuses": {c["code"] for c in status.get("category", [])},
+            "habitats": {h["key"] for h in ecology.get("habitats", [])},
+            "diets": {d["key"] for d in ecology.get("diets", [])},
+        }
+
+    def find_birds(self, facets, limit=15):
+        with self._lock:
+            self.round_trips += 1
+            matched = []
+            for sci, bird in self.birds.items():
+                keys = self._facets(bird)
+                if all(keys[name] & set(values) for name, values in facets.items() if values):
+                    categories = (bird.get("status") or {}).get("category") or [{}]
+                    rank = categories[0].get("rank")
+                    matched.append((-(rank if rank is not None else -1), bird.get("common_name") or "", sci))
+            matched.sort()
+            return len(matched), [self._context(sci) for _, _, sci in matched[:limit]]
+
+    def get_taxa(self):
+        with self._lock:
+            self.round_trips += 1
+            taxa = {}
+            for bird in self.birds.values():
+                family = bird.get("family")
+                if family:
+                    taxa[("family", family["name"])] = family.get("name_vi")
+                    for order in family.get("order", []):
+                        taxa[("order", order["name"])] = order.get("name_vi")
+            return [{"rank": rank, "name": name, "name_vi": name_vi} for (rank, name), name_vi in taxa.items()]
+
+    def _read_birds(self, scientific_names):
+        with self._lock:
+            self.round_trips += 1
+            results = {}
+            for sci in scientific_names:
+                bird = self.birds.get(sci)
+                if bird is not None:
+                    flags = {"has_wiki": "wiki" in bird, "has_audio": "audio" in bird,
+                             "has_status": "status" in bird, "has_ecology": "ecology" in bird}
+                    context = self._context(sci)
+                    results[sci] = (self._status(context, flags), context)
+            return results
+
+    def get_known_common_names(self):
+        with self._lock:
+            self.round_trips += 1
+            return sorted({b["common_name"].lower() for b in self.birds.values() if b.get("common_name")})
+
+    def begin_enrichment(self, scientific_name, common_name=None):
+        return InMemoryEnrichment(self, scientific_name, common_name)
+
+    def commit_batch(self, units):
+        rows = [unit.row for unit in units]
+        if rows:
+            self._apply(rows)
+            self._notify_write([row["sci"] for row in rows])
+
+    def semantic_search(self, question, k=5, vector=None):
+        if vector is None:
+            vector = self.embeddings.embed_query(question)
+        with self._lock:
+            self.round_trips += 1
+            scored = []
+            for sci, bird in self.birds.items():
+                embedding = bird.get("wiki", {}).get("embedding")
+                if embedding:
+                    cosine = sum(float(a) * float(b) for a, b in zip(vector, embedding))
+                    # Neo4j chuẩn hoá similarity cosine về [0, 1]: (1 + cos) / 2
+                    scored.append(dict(self._context(sci), Score=(1 + cosine) / 2))
+        return sorted(scored, key=lambda r: r["Score"], reverse=True)[:k]
+
+
+class FakeLLM:
+    """
+    LLM tất định, có độ trễ cố định (theo fixture):
+    - invoke (JSON mode, phân tích câu hỏi): trả kết quả ghi sẵn theo câu hỏi, mặc định
+      là câu hỏi giữ nguyên và không có tên loài.
+    - stream (sinh câu trả lời): n token sinh từ hash của prompt (chuỗi hoặc danh sách message).
+    """
+    def __init__(self, analyses, latency, latency_scale=1.0):
+        self.analyses = analyses
+        self.latency = latency
+        self.latency_scale = latency_scale
+        self.calls = Counter()
+        self._lock = threading.Lock()
+
+    def _sleep(self, key):
+        if self.latency_scale:
+            time.sleep(self.latency[key] * self.latency_scale / 1000)
+
+    def bind(self, **kwargs):
+        return self
+
+    def invoke(self, prompt):
+        with self._lock:
+            self.calls["analysis"] += 1
+        self._sleep("analysis_ms")
+        question = prompt.split("Latest Question: ", 1)[-1].split("\n", 1)[0].strip()
+        result = self.analyses.get(question, {"standalone_question": question, "common_name": None,
+                                              "scientific_name": None})
+        return SimpleNamespace(content=json.dumps(result, ensure_ascii=False))
+
+    def stream(self, prompt):
+        with self._lock:
+            self.calls["generation"] += 1
+        if not isinstance(prompt, str):
+            prompt = "\n".join(message.content for message in prompt)
+        digest = hashlib.sha1(prompt.encode("utf-8")).hexdigest()
+        self._sleep("first_token_ms")
+        for i in range(self.latency["tokens"]):
+            if i:
+                self._sleep("token_gap_ms")
+            yield SimpleNamespace(content=f"{digest[i % len(digest)]}{i} ")
+
+
+class MissingFixture(KeyError):
+    pass
+
+
+class FixtureReplayer:
+    """
+    Thay các hàm gọi mạng (đằng sau response cache) của fetcher:
+      WikidataFetcher._run_query, WikipediaFetcher._fetch_summary,
+      IUCNFetcher._fetch_status, BirdspediaFetcher._scrape, XenoCantoFetcher._fetch_recordings
+    bằng response đã ghi {nguồn: {khoá: {"latency_ms", "value"}}}. Mỗi lần gọi = một
+    request ra ngoài (đếm trong `requests`; Xeno-canto: một lượt tìm đã chọn bản ghi, có thể
+    gồm vài trang). record=True: gọi hàm thật và ghi lại.
+    """
+    WIKIDATA_TERM = re.compile(r'wdt:P225 "([^"]*)"')
+
+    def __init__(self, fixtures, latency_scale=1.0, record=False):
+        self.fixtures = fixtures
+        self.latency_scale = latency_scale
+        self.record = record
+        self.requests = Counter()
+        self.missing = []
+        self._lock = threading.Lock()
+
+    def _call(self, source, key, real_fn):
+        with self._lock:
+            self.requests[source] += 1
+        if self.record:
+            started = time.perf_counter()
+            value = real_fn()
+            entry = {"latency_ms": round((time.perf_counter() - started) * 1000), "value": value}
+            with self._lock:
+                self.fixtures.setdefault(source, {})[key] = entry
+            return value
+        entry = self.fixtures.get(source, {}).get(key)
+        if entry is None:
+            with self._lock:
+                self.missing.append(f"{source}:{key}")
+            raise MissingFixture(f"{source}:{key}")
+        if self.latency_scale:
+            time.sleep(entry["latency_ms"] * self.latency_scale / 1000)
+        return entry["value"]
+
+    def install(self, bot):
+        wikidata, wiki, iucn, birdspedia = bot.wikidata, bot.wiki, bot.iucn, bot.birdspedia
+        xenocanto = bot.xenocanto
+        run_query, fetch_summary = wikidata._run_query, wiki._fetch_summary
+        fetch_status, scrape = iucn._fetch_status, birdspedia._scrape
+        fetch_recordings = xenocanto._fetch_recordings
+
+        def replay_wikidata(query):
+            term = self.WIKIDATA_TERM.search(query).group(1)
+            return self._call("wikidata", term, lambda: run_query(query))
+
+        wikidata._run_query = replay_wikidata
+        wiki._fetch_summary = lambda name, lang: self._call(
+            "wikipedia", f"{lang}|{name}", lambda: fetch_summary(name, lang))
+        iucn._fetch_status = lambda sci: self._call("iucn", sci, lambda: fetch_status(sci))
+        birdspedia._scrape = lambda sci: self._call("birdspedia", sci, lambda: scrape(sci))
+        xenocanto._fetch_recordings = lambda sci: self._call(
+            "xenocanto", sci, lambda: fetch_recordings(sci))
+        if not self.record:
+            # Có fixture thì không cần token / key thật; vẫn đi qua nhánh gọi API + cache
+            iucn.token = iucn.token if iucn.token not in (None, "", "YOUR_TOKEN_HERE") else "offline-fixture"
+            xenocanto.api_key = xenocanto.api_key or "offline-fixture"
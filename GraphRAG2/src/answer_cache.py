@@ -0,0 +1,119 @@
+import itertools
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Iterable, Optional, Tuple
+
+import numpy as np
+
+
+class SemanticAnswerCache:
+    """
+    Cache câu trả lời theo (tên khoa học, embedding câu hỏi độc lập).
+    - Câu hỏi mới về CÙNG loài, có cosine >= threshold với một câu đã trả lời
+      -> dùng lại câu trả lời đó, bỏ qua đọc Graph + LLM.
+    - Tối đa max_entries câu trả lời (LRU), mỗi câu sống tối đa ttl giây.
+    - invalidate(sci) xoá mọi câu trả lời của loài; Neo4jHandler gọi sau mỗi lần ghi.
+    - Mỗi loài có một "generation" tăng khi bị invalidate: câu trả lời tính từ
+      context cũ (ghi xen giữa lúc đọc và lúc lưu) sẽ không được lưu.
+    """
+    def __init__(self, embeddings, threshold: float = 0.92, max_entries: int = 2000,
+                 ttl: float = 86400):
+        self.embeddings = embeddings
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()   # id -> (sci, unit vector, answer, expires_at)
+        self._by_species = {}           # sci -> set(id)
+        self._generations = {}          # sci -> int
+        self._ids = itertools.count()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        # Độ trễ cả lượt chat (giây) của các lượt dùng cache / không dùng cache gần đây
+        self._hit_latency = deque(maxlen=1000)
+        self._miss_latency = deque(maxlen=1000)
+
+    def _unit_vector(self, question: str) -> np.ndarray:
+        # EmbeddingService cache theo hash -> câu đã embed ở bước vector search không bị embed lại
+        vector = np.asarray(self.embeddings.embed_query(question), dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _remove_locked(self, entry_id):
+        sci = self._entries.pop(entry_id)[0]
+        ids = self._by_species.get(sci)
+        if ids is not None:
+            ids.discard(entry_id)
+            if not ids:
+                del self._by_species[sci]
+
+    def lookup(self, scientific_name: str, question: str) -> Optional[Tuple[str, float]]:
+        """Output: (câu trả lời, score) nếu có câu hỏi đủ giống cho loài này, ngược lại None."""
+        vector = self._unit_vector(question)
+        now = time.monotonic()
+        with self._lock:
+            best_id, best_score = None, self.threshold
+            for entry_id in list(self._by_species.get(scientific_name, ())):
+                _, cached_vector, _, expires_at = self._entries[entry_id]
+                if expires_at < now:
+                    self._remove_locked(entry_id)
+                    continue
+                score = float(np.dot(cached_vector, vector))
+                if score >= best_score:
+                    best_id, best_score = entry_id, score
+            if best_id is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._entries.move_to_end(best_id)
+            return self._entries[best_id][2], best_score
+
+    def generation(self, scientific_name: str) -> int:
+        """Đọc TRƯỚC khi lấy context; truyền lại cho store()."""
+        with self._lock:
+            return self._generations.get(scientific_name, 0)
+
+    def store(self, scientific_name: str, question: str, answer: str, generation: int):
+        if not answer:
+            return
+        vector = self._unit_vector(question)
+        with self._lock:
+            if self._generations.get(scientific_name, 0) != generation:
+                return
+            entry_id = next(self._ids)
+            self._entries[entry_id] = (scientific_name, vector, answer, time.monotonic() + self.ttl)
+            self._by_species.setdefault(scientific_name, set()).add(entry_id)
+            while len(self._entries) > self.max_entries:
+                self._remove_locked(next(iter(self._entries)))
+
+    def invalidate(self, scientific_names: Iterable[str]):
+        """Xoá câu trả lời của các loài vừa được ghi vào Graph."""
+        with self._lock:
+            for sci in scientific_names:
+                self._generations[sci] = self._generations.get(sci, 0) + 1
+                for entry_id in list(self._by_species.get(sci, ())):
+                    self._remove_locked(entry_id)
+                    self.invalidations += 1
+
+    def record_latency(self, hit: bool, seconds: float):
+        with self._lock:
+            (self._hit_latency if hit else self._miss_latency).append(seconds)
+
+    @staticmethod
+    def _p50_ms(samples) -> Optional[float]:
+        return round(float(np.median(samples)) * 1000, 1) if samples else None
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+                "invalidations": self.invalidations,
+                "cached_p50_ms": self._p50_ms(self._hit_latency),
+                "uncached_p50_ms": self._p50_ms(self._miss_latency),
+            }
@@ -10,4 +10,141 @@ class Config:
     NEO4J_PASSWORD = os.getenv("NEO4J_PASSWORD")
     
     # User Agent giả lập trình duyệt để tránh bị chặn khi cào dữ liệu
-    USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
\ No newline at end of file
+    USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
+
+    # Lazy loading song song: timeout riêng từng nguồn (giây) và deadline tổng cho cả bước fetch
+    FETCH_DEADLINE = float(os.getenv("FETCH_DEADLINE", "8"))
+    FETCH_TIMEOUTS = {
+        "wikidata": float(os.getenv("FETCH_TIMEOUT_WIKIDATA", "6")),
+        "wikipedia": float(os.getenv("FETCH_TIMEOUT_WIKIPEDIA", "6")),
+        "iucn": float(os.getenv("FETCH_TIMEOUT_IUCN", "5")),
+        "xenocanto": float(os.getenv("FETCH_TIMEOUT_XENOCANTO", "4")),
+        "birdspedia": float(os.getenv("FETCH_TIMEOUT_BIRDSPEDIA", "5")),
+    }
+
+    # Cache định danh Wikidata (tên thường -> tên khoa học): LRU + TTL (giây)
+    WIKIDATA_CACHE_SIZE = int(os.getenv("WIKIDATA_CACHE_SIZE", "2048"))
+    WIKIDATA_CACHE_TTL = float(os.getenv("WIKIDATA_CACHE_TTL", "86400"))
+    WIKIDATA_NEGATIVE_TTL = float(os.getenv("WIKIDATA_NEGATIVE_TTL", "600"))
+
+    # Cache response trên đĩa (SQLite) dùng chung cho các data loader
+    RESPONSE_CACHE_PATH = os.getenv("RESPONSE_CACHE_PATH", os.path.join(".cache", "responses.sqlite3"))
+    RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "50000"))
+    RESPONSE_CACHE_NEGATIVE_TTL = float(os.getenv("RESPONSE_CACHE_NEGATIVE_TTL", "86400"))
+    RESPONSE_CACHE_TTLS = {
+        "wikipedia": 30 * 86400,
+        "wikidata": 30 * 86400,
+        "iucn": 90 * 86400,
+        "birdspedia": 90 * 86400,
+        "xenocanto": 90 * 86400,
+    }
+    # OFFLINE_MODE=1: chỉ phục vụ từ cache, không gọi ra ngoài
+    OFFLINE_MODE = os.getenv("OFFLINE_MODE", "0") == "1"
+
+    # Truy xuất vector trên bird_desc_index: score (cosine) tối thiểu để bỏ qua
+    # bước nhận diện thực thể, và để đưa một loài vào câu trả lời nhiều loài
+    VECTOR_TOP_K = int(os.getenv("VECTOR_TOP_K", "5"))
+    VECTOR_MATCH_THRESHOLD = float(os.getenv("VECTOR_MATCH_THRESHOLD", "0.80"))
+    VECTOR_MULTI_THRESHOLD = float(os.getenv("VECTOR_MULTI_THRESHOLD", "0.55"))
+
+    # Lịch sử hội thoại theo session: backend 'memory' hoặc 'sqlite'
+    SESSION_BACKEND = os.getenv("SESSION_BACKEND", "memory")
+    SESSION_DB_PATH = os.getenv("SESSION_DB_PATH", os.path.join(".cache", "sessions.sqlite3"))
+    SESSION_MAX_MESSAGES = int(os.getenv("SESSION_MAX_MESSAGES", "6"))
+    SESSION_IDLE_TTL = float(os.getenv("SESSION_IDLE_TTL", "1800"))
+    SESSION_MAX_SESSIONS = int(os.getenv("SESSION_MAX_SESSIONS", "10000"))
+
+    # Số lần gọi lại LLM khi JSON phân tích câu hỏi không hợp lệ
+    ANALYSIS_MAX_RETRIES = int(os.getenv("ANALYSIS_MAX_RETRIES", "2"))
+
+    # Chỉ mục tên loài cục bộ (xuất từ Wikidata), dùng trước khi gọi SPARQL
+    GAZETTEER_PATH = os.getenv("GAZETTEER_PATH", os.path.join("data", "gazetteer.json.gz"))
+
+    # Client HTTP dùng chung (src/data_loaders/base_fetcher.py): pool kết nối, retry, circuit breaker
+    HTTP_USER_AGENT = os.getenv("HTTP_USER_AGENT", "BirdGraphRAG/1.0 (contact@example.com)")
+    HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", "16"))
+    HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "3.05"))
+    HTTP_READ_TIMEOUT = float(os.getenv("HTTP_READ_TIMEOUT", "10"))
+    HTTP_MAX_RETRIES = int(os.getenv("HTTP_MAX_RETRIES", "2"))
+    HTTP_MAX_BACKOFF = float(os.getenv("HTTP_MAX_BACKOFF", "8"))
+    HTTP_BREAKER_THRESHOLD = int(os.getenv("HTTP_BREAKER_THRESHOLD", "5"))
+    HTTP_BREAKER_RESET = float(os.getenv("HTTP_BREAKER_RESET", "30"))
+    # Giới hạn số request/giây cho từng host (khớp cả tên miền con, vd vi.wikipedia.org)
+    HTTP_DEFAULT_RATE = float(os.getenv("HTTP_DEFAULT_RATE", "5"))
+    HTTP_RATE_LIMITS = {
+        "query.wikidata.org": 5.0,
+        "wikipedia.org": 10.0,
+        "apiv3.iucnredlist.org": 2.0,
+        "xeno-canto.org": 2.0,
+        "animaldiversity.org": 1.0,
+    }
+
+    # API Xeno-canto v3 (cần key); URL đổi được để trỏ tới server giả lập cục bộ.
+    # Mỗi loài giữ tối đa XENO_CANTO_MAX_RECORDINGS bản ghi, đọc tối đa MAX_PAGES trang mỗi lượt tìm
+    XENO_CANTO_API_URL = os.getenv("XENO_CANTO_API_URL", "https://xeno-canto.org/api/3/recordings")
+    XENO_CANTO_API_KEY = os.getenv("XENO_CANTO_API_KEY", "")
+    XENO_CANTO_MAX_RECORDINGS = int(os.getenv("XENO_CANTO_MAX_RECORDINGS", "3"))
+    XENO_CANTO_MAX_PAGES = int(os.getenv("XENO_CANTO_MAX_PAGES", "2"))
+    XENO_CANTO_PAGE_SIZE = int(os.getenv("XENO_CANTO_PAGE_SIZE", "100"))
+    XENO_CANTO_PREFETCH_WORKERS = int(os.getenv("XENO_CANTO_PREFETCH_WORKERS", "4"))
+
+    # Trang loài của Animal Diversity Web (dữ liệu sinh thái). Trang đã lưu sẵn trong
+    # ADW_PAGES_DIR (<Chi>_<loài>.html) được đọc thay cho request
+    ADW_BASE_URL = os.getenv("ADW_BASE_URL", "https://animaldiversity.org/accounts")
+    ADW_PAGES_DIR = os.getenv("ADW_PAGES_DIR", os.path.join("data", "adw"))
+
+    # Số loài tối đa trong một câu hỏi so sánh ("so sánh chào mào và chích chòe")
+    MAX_SPECIES_PER_TURN = int(os.getenv("MAX_SPECIES_PER_TURN", "4"))
+
+    # Ngân sách token (đo bằng tiktoken) cho prompt sinh câu trả lời và lịch sử gửi kèm lời gọi phân tích
+    PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", "1200"))
+    HISTORY_TOKEN_BUDGET = int(os.getenv("HISTORY_TOKEN_BUDGET", "300"))
+    # Câu trả lời cũ trong lịch sử được tóm lược còn các câu đầu, tối đa chừng này token
+    HISTORY_MESSAGE_TOKENS = int(os.getenv("HISTORY_MESSAGE_TOKENS", "60"))
+
+    # Read-through cache context loài (Neo4jHandler.read_bird); xoá khi process này ghi loài đó
+    CONTEXT_CACHE_SIZE = int(os.getenv("CONTEXT_CACHE_SIZE", "4096"))
+    CONTEXT_CACHE_TTL = float(os.getenv("CONTEXT_CACHE_TTL", "300"))
+
+    # Embedding: cache vector float32 theo hash nội dung + kích thước batch
+    EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", os.path.join(".cache", "embeddings.sqlite3"))
+    EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "32"))
+    # Model sentence-transformers dùng cho bird_desc_index (đổi model phải embed lại mọi mô tả)
+    EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "all-MiniLM-L6-v2")
+    # Backend cho model embedding: 'torch', 'onnx' hoặc 'onnx-int8' (cần sentence-transformers[onnx])
+    EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "torch")
+    EMBEDDING_ONNX_FILE = os.getenv("EMBEDDING_ONNX_FILE", "onnx/model_qint8_avx512.onnx")
+    # Tải model embedding ngay lúc khởi động (song song) thay vì ở request đầu tiên
+    EMBEDDING_PRELOAD = os.getenv("EMBEDDING_PRELOAD", "1") == "1"
+
+    # Phục vụ đồng thời (api_server / asgi_server): số lượt chat xử lý cùng lúc,
+    # số request được xếp hàng chờ, và thời gian chờ tối đa trước khi trả 503
+    MAX_CONCURRENT_TURNS = int(os.getenv("MAX_CONCURRENT_TURNS", "8"))
+    MAX_QUEUED_TURNS = int(os.getenv("MAX_QUEUED_TURNS", "16"))
+    QUEUE_TIMEOUT = float(os.getenv("QUEUE_TIMEOUT", "10"))
+
+    # Cache câu trả lời ngữ nghĩa: khoá = tên khoa học + embedding câu hỏi độc lập.
+    # Tự xoá khi Graph ghi vào loài tương ứng; TTL phòng khi ghi từ process khác (ingest)
+    ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE_ENABLED", "1") == "1"
+    ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.92"))
+    ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "2000"))
+    ANSWER_CACHE_TTL = float(os.getenv("ANSWER_CACHE_TTL", "86400"))
+
+    # Câu hỏi theo tập ("các loài chim nguy cấp sống ở rừng ngập mặn"): số loài tối đa đưa vào câu trả lời
+    FACET_MAX_BIRDS = int(os.getenv("FACET_MAX_BIRDS", "15"))
+
+    # Làm mới nền dữ liệu cũ trong Graph (src/refresh.py): mỗi REFRESH_INTERVAL giây kiểm tra
+    # tối đa REFRESH_BATCH_SIZE loài chưa kiểm tra trong REFRESH_MAX_AGE giây, loài được hỏi nhiều
+    # trước (điểm phổ biến giảm một nửa sau mỗi REFRESH_POPULARITY_HALF_LIFE giây)
+    REFRESH_ENABLED = os.getenv("REFRESH_ENABLED", "1") == "1"
+    REFRESH_INTERVAL = float(os.getenv("REFRESH_INTERVAL", "900"))
+    REFRESH_BATCH_SIZE = int(os.getenv("REFRESH_BATCH_SIZE", "50"))
+    REFRESH_MAX_AGE = float(os.getenv("REFRESH_MAX_AGE", str(7 * 86400)))
+    REFRESH_POPULARITY_HALF_LIFE = float(os.getenv("REFRESH_POPULARITY_HALF_LIFE", "86400"))
+    # Làm mới nền dùng client HTTP riêng (bucket + circuit breaker riêng, không tranh với lượt chat),
+    # với tốc độ bằng REFRESH_HTTP_RATE_SHARE lần HTTP_RATE_LIMITS
+    REFRESH_HTTP_RATE_SHARE = float(os.getenv("REFRESH_HTTP_RATE_SHARE", "0.25"))
+
+    # Tracing: lượt chat chậm hơn SLOW_TURN_MS được ghi đầy đủ breakdown vào slow-turn log (JSONL)
+    SLOW_TURN_MS = float(os.getenv("SLOW_TURN_MS", "8000"))
+    SLOW_TURN_LOG_PATH = os.getenv("SLOW_TURN_LOG_PATH", os.path.join("logs", "slow_turns.jsonl"))
@@ -0,0 +1,257 @@
+import copy
+import email.utils
+import random
+import threading
+import time
+from typing import Dict, Optional
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from src.config import Config
+from src.data_loaders.response_cache import get_response_cache
+from src.metrics import METRICS
+from src.utils import RateLimiter
+
+HTTP_REQUESTS = METRICS.counter(
+    "birdrag_http_requests_total", "Outbound HTTP requests by host and outcome.", ("host", "outcome"))
+
+# 429 và lỗi tạm thời phía server: thử lại. 4xx khác (404, 401...) trả về ngay cho fetcher.
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class CircuitOpenError(Exception):
+    """Host đang bị ngắt mạch: không gửi request, fetcher báo lỗi ngay (không bị cache)."""
+
+
+class CircuitBreaker:
+    """
+    Ngắt mạch theo host:
+    - closed: gửi bình thường; failure_threshold lỗi liên tiếp -> open.
+    - open: từ chối ngay trong reset_timeout giây (không để lượt chat chờ timeout vô ích).
+    - half-open: hết reset_timeout thì cho MỘT request thử; thành công -> closed, lỗi -> open lại.
+    """
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self.opened_at is None:
+                return "closed"
+            return "half-open" if time.monotonic() - self.opened_at >= self.reset_timeout else "open"
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            if time.monotonic() - self.opened_at < self.reset_timeout or self._probing:
+                return False
+            self._probing = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._probing or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+            self._probing = False
+
+
+def _retry_after(response) -> Optional[float]:
+    """Header Retry-After: số giây hoặc HTTP-date. None nếu không có / không đọc được."""
+    value = response.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, email.utils.parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class HttpClient:
+    """
+    Client HTTP dùng chung cho mọi fetcher:
+    - một requests.Session: giữ kết nối keep-alive theo host (không bắt tay TCP + TLS lại mỗi lần)
+    - rate limit token bucket theo host (Config.HTTP_RATE_LIMITS, khớp theo hậu tố tên miền)
+    - thử lại GET với exponential backoff + jitter, tôn trọng Retry-After
+    - circuit breaker theo host
+    """
+    def __init__(self, rate_limits: Dict[str, float] = None, max_retries: int = 2,
+                 backoff_base: float = 0.5, max_backoff: float = 8.0,
+                 timeout=(3.05, 10), pool_size: int = 16,
+                 failure_threshold: int = 5, reset_timeout: float = 30.0, default_rate: float = None):
+        self.rate_limits = rate_limits or {}
+        self.limiter = RateLimiter(self.rate_limits, default_rate=default_rate or Config.HTTP_DEFAULT_RATE)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.max_backoff = max_backoff
+        self.timeout = timeout
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+
+        self.session = requests.Session()
+        self.session.headers["User-Agent"] = Config.HTTP_USER_AGENT
+        # pool_maxsize: số kết nối giữ lại cho MỖI host; fetcher chạy song song trên nhiều thread
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._lock = threading.Lock()
+
+    def _rate_key(self, host: str) -> str:
+        """'vi.wikipedia.org' dùng chung bucket 'wikipedia.org' nếu được cấu hình."""
+        for key in self.rate_limits:
+            if host == key or host.endswith("." + key):
+                return key
+        return host
+
+    def breaker(self, host: str) -> CircuitBreaker:
+        with self._lock:
+            if host not in self._breakers:
+                self._breakers[host] = CircuitBreaker(self.failure_threshold, self.reset_timeout)
+            return self._breakers[host]
+
+    def _backoff(self, attempt: int, response=None) -> Optional[float]:
+        """Số giây chờ trước lần thử tiếp theo; None nếu server yêu cầu chờ lâu hơn max_backoff."""
+        if response is not None:
+            retry_after = _retry_after(response)
+            if retry_after is not None:
+                return retry_after if retry_after <= self.max_backoff else None
+        delay = min(self.max_backoff, self.backoff_base * 2 ** attempt)
+        return delay * random.uniform(0.5, 1.0)
+
+    def get(self, url: str, params: dict = None, headers: dict = None, timeout=None,
+            stream: bool = False) -> requests.Response:
+        """
+        GET có rate limit, retry và circuit breaker. Trả về response cuối cùng
+        (kể cả 4xx/5xx — fetcher tự raise_for_status); ném CircuitOpenError nếu host
+        đang bị ngắt mạch, hoặc exception mạng của requests khi hết lượt thử.
+        stream=True: body chưa được tải, đọc dần bằng iter_content và phải close() khi xong.
+        """
+        host = urlsplit(url).hostname or ""
+        breaker = self.breaker(host)
+        attempt = 0
+        while True:
+            if not breaker.allow():
+                HTTP_REQUESTS.inc(host=host, outcome="circuit_open")
+                raise CircuitOpenError(f"circuit open for {host}")
+            self.limiter.acquire(self._rate_key(host))
+            try:
+                response = self.session.get(url, params=params, headers=headers,
+                                            timeout=timeout or self.timeout, stream=stream)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                breaker.record_failure()
+                HTTP_REQUESTS.inc(host=host, outcome="network_error")
+                delay = self._backoff(attempt) if attempt < self.max_retries else None
+                if delay is None:
+                    raise
+                print(f"      [HTTP] {host}: {e.__class__.__name__}, retry in {delay:.1f}s")
+            except Exception:
+                # Lỗi khác khi đọc body / theo redirect (ChunkedEncodingError, TooManyRedirects...):
+                # không thử lại, nhưng vẫn phải ghi nhận để request thử half-open không kẹt mãi
+                breaker.record_failure()
+                HTTP_REQUESTS.inc(host=host, outcome="error")
+                raise
+            else:
+                if response.status_code not in RETRY_STATUSES:
+                    breaker.record_success()
+                    HTTP_REQUESTS.inc(host=host, outcome=str(response.status_code))
+                    return response
+                breaker.record_failure()
+                HTTP_REQUESTS.inc(host=host, outcome=str(response.status_code))
+                delay = self._backoff(attempt, response) if attempt < self.max_retries else None
+                if delay is None:
+                    return response
+                print(f"      [HTTP] {host}: {response.status_code}, retry in {delay:.1f}s")
+                response.close()
+            time.sleep(delay)
+            attempt += 1
+
+    def get_json(self, url: str, params: dict = None, headers: dict = None, timeout=None):
+        response = self.get(url, params=params, headers=headers, timeout=timeout)
+        response.raise_for_status()
+        return response.json()
+
+    def stats(self) -> dict:
+        with self._lock:
+            breakers = dict(self._breakers)
+        return {host: b.state for host, b in breakers.items()}
+
+    def close(self):
+        self.session.close()
+
+
+_shared_client = None
+_background_client = None
+_shared_lock = threading.Lock()
+
+
+def get_http_client() -> HttpClient:
+    """Client dùng chung trong process (pool kết nối + rate limit chung cho mọi fetcher)."""
+    global _shared_client
+    with _shared_lock:
+        if _shared_client is None:
+            _shared_client = HttpClient(
+                rate_limits=Config.HTTP_RATE_LIMITS,
+                max_retries=Config.HTTP_MAX_RETRIES,
+                max_backoff=Config.HTTP_MAX_BACKOFF,
+                timeout=(Config.HTTP_CONNECT_TIMEOUT, Config.HTTP_READ_TIMEOUT),
+                pool_size=Config.HTTP_POOL_SIZE,
+                failure_threshold=Config.HTTP_BREAKER_THRESHOLD,
+                reset_timeout=Config.HTTP_BREAKER_RESET,
+            )
+        return _shared_client
+
+
+def get_background_http_client() -> HttpClient:
+    """
+    Client riêng cho làm mới nền (src/refresh.py): token bucket và circuit breaker riêng, tốc độ
+    bằng Config.REFRESH_HTTP_RATE_SHARE lần client chính -> không rút cạn bucket của lượt chat,
+    và lỗi của làm mới nền không ngắt mạch host cho lượt chat.
+    """
+    global _background_client
+    with _shared_lock:
+        if _background_client is None:
+            share = Config.REFRESH_HTTP_RATE_SHARE
+            _background_client = HttpClient(
+                rate_limits={host: rate * share for host, rate in Config.HTTP_RATE_LIMITS.items()},
+                default_rate=Config.HTTP_DEFAULT_RATE * share,
+                max_retries=Config.HTTP_MAX_RETRIES,
+                max_backoff=Config.HTTP_MAX_BACKOFF,
+                timeout=(Config.HTTP_CONNECT_TIMEOUT, Config.HTTP_READ_TIMEOUT),
+                pool_size=2,
+                failure_threshold=Config.HTTP_BREAKER_THRESHOLD,
+                reset_timeout=Config.HTTP_BREAKER_RESET,
+            )
+        return _background_client
+
+
+class BaseFetcher:
+    """Lớp cha của các fetcher: client HTTP dùng chung + response cache trên đĩa."""
+    def __init__(self):
+        self.http = get_http_client()
+        self.cache = get_response_cache()
+
+    def with_client(self, http: HttpClient):
+        """Bản sao dùng client HTTP khác (vd làm mới nền); cache và trạng thái khác vẫn dùng chung."""
+        clone = copy.copy(self)
+        clone.http = http
+        return clone
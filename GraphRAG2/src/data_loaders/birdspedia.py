@@ -1,29 +1,221 @@
-import requests
-from bs4 import BeautifulSoup
+import os
+import re
+from typing import Dict, Iterable, List, Optional
+
+from lxml import etree
+
 from src.config import Config
+from src.data_loaders.base_fetcher import BaseFetcher
+
+CHUNK_SIZE = 16 * 1024
+SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+
+# Các mục (id của thẻ h3) trên trang loài ADW cần đọc -> trường dữ liệu sinh thái
+SECTIONS = ("geographic_range", "habitat", "behavior", "food_habits")
+DIET_LABELS = ("Animal Foods", "Plant Foods", "Other Foods")
+HABITAT_LABELS = ("Habitat Regions", "Terrestrial Biomes", "Aquatic Biomes", "Wetlands", "Other Habitat Features")
+MAX_PARAGRAPHS = 3
+MAX_VALUES = 8
+
+# XPath biên dịch sẵn một lần (biên dịch lại mỗi lần gọi .xpath() tốn hơn cả việc parse)
+KEYWORD_ITEMS = etree.XPath("./li[span[@class='label']]")
+KEYWORD_LABEL = etree.XPath("string(span[@class='label'])")
+KEYWORD_VALUES = etree.XPath("./ul//text()")
+
+
+def _text(element) -> str:
+    return " ".join("".join(element.itertext()).split())
+
+
+def _first_sentence(paragraphs: List[str], keyword: str = None) -> Optional[str]:
+    """Câu đầu tiên (chứa keyword nếu có) trong các đoạn văn, tối đa ~240 ký tự."""
+    for paragraph in paragraphs:
+        for sentence in SENTENCE_END.split(paragraph):
+            if sentence and (keyword is None or keyword in sentence.lower()):
+                return sentence if len(sentence) <= 240 else sentence[:239].rstrip() + "…"
+    return None
+
+
+class AdwEcologyParser:
+    """
+    Trích Diet / Habitat / Migration từ trang loài Animal Diversity Web mà không dựng cả cây DOM:
+    - lxml HTMLPullParser nhận từng chunk bytes, chỉ báo sự kiện 'end' của h3 / p / ul
+    - mỗi phần tử cấp cao được đọc bằng XPath biên dịch sẵn (nhãn từ khoá) hoặc itertext rồi xoá
+      khỏi cây ngay -> bộ nhớ không tăng theo độ dài trang
+    - đã đọc xong mọi mục cần thiết (Food Habits đứng sau Behavior) thì `done`: ngừng nhận chunk,
+      phần còn lại của trang (Predation, References...) không cần tải
+    """
+    def __init__(self):
+        self.parser = etree.HTMLPullParser(events=("end",), tag=("h3", "p", "ul"))
+        self.section = None
+        self.finished = set()
+        self.paragraphs: Dict[str, List[str]] = {}
+        self.keywords: Dict[str, Dict[str, List[str]]] = {}
+        self.done = False
+
+    def feed(self, chunk: bytes):
+        self.parser.feed(chunk)
+        self._drain()
+
+    def close(self):
+        # Luôn đóng parser (kể cả khi dừng sớm) để libxml2 giải phóng ngữ cảnh parse
+        self.parser.close()
+        self._drain()
+
+    def _drain(self):
+        for _, element in self.parser.read_events():
+            if self.done:
+                break
+            if next(element.iterancestors("ul"), None) is not None:
+                continue  # danh sách lồng trong ul.keywords: đọc cùng danh sách cha
+            if element.tag == "h3":
+                self._start_section(element)
+            elif self.section in SECTIONS:
+                if element.tag == "p":
+                    paragraphs = self.paragraphs.setdefault(self.section, [])
+                    text = _text(element) if len(paragraphs) < MAX_PARAGRAPHS else None
+                    if text:
+                        paragraphs.append(text)
+                elif "keywords" in (element.get("class") or ""):
+                    self._read_keywords(element)
+            self._release(element)
+
+    def _start_section(self, heading):
+        if self.section in SECTIONS:
+            self.finished.add(self.section)
+        self.section = heading.get("id") or _text(heading).lower().replace(" ", "_")
+        self.done = self.finished.issuperset(SECTIONS)
 
-class BirdspediaFetcher:
+    def _read_keywords(self, ul):
+        """<li><span class="label">Primary Diet</span><ul>...giá trị (có thể lồng)...</ul></li>"""
+        keywords = self.keywords.setdefault(self.section, {})
+        for item in KEYWORD_ITEMS(ul):
+            label = " ".join(KEYWORD_LABEL(item).split())
+            values = [" ".join(t.split()) for t in KEYWORD_VALUES(item) if t.strip()]
+            keywords.setdefault(label, []).extend(values)
+
+    @staticmethod
+    def _release(element):
+        """Xoá phần tử đã đọc và các anh em đứng trước nó (đều đã parse xong) khỏi cây."""
+        element.clear(keep_tail=True)
+        parent = element.getparent()
+        if parent is not None:
+            while element.getprevious() is not None:
+                del parent[0]
+
+    def _values(self, section: str, labels: Iterable[str]) -> List[str]:
+        keywords = self.keywords.get(section, {})
+        values = []
+        for label in labels:
+            values.extend(v for v in keywords.get(label, []) if v not in values)
+        return values[:MAX_VALUES]
+
+    def result(self) -> Optional[Dict]:
+        """Output: {diet, habitat, migration} (trường không tìm thấy là None), None nếu trang không có gì."""
+        primary = self._values("food_habits", ("Primary Diet",))
+        foods = self._values("food_habits", DIET_LABELS)
+        if primary:
+            diet = ", ".join(primary).capitalize() + (f" ({', '.join(foods)})" if foods else "")
+        else:
+            diet = _first_sentence(self.paragraphs.get("food_habits", []))
+
+        habitat_values = self._values("habitat", HABITAT_LABELS)
+        habitat = (", ".join(habitat_values).capitalize() if habitat_values
+                   else _first_sentence(self.paragraphs.get("habitat", [])))
+
+        behaviors = self._values("behavior", ("Key Behaviors",))
+        label = "Migratory" if "migratory" in behaviors else "Non-migratory" if "sedentary" in behaviors else None
+        detail = _first_sentence([p for s in SECTIONS for p in self.paragraphs.get(s, [])], keyword="migrat")
+        migration = f"{label}: {detail}" if label and detail else label or detail
+
+        if not (diet or habitat or migration):
+            return None
+        return {"diet": diet, "habitat": habitat, "migration": migration}
+
+
+def parse_ecology(chunks: Iterable[bytes]) -> Optional[Dict]:
+    """Đọc dần các chunk HTML của một trang loài ADW; dừng ngay khi đã có đủ các mục cần thiết."""
+    parser = AdwEcologyParser()
+    for chunk in chunks:
+        parser.feed(chunk)
+        if parser.done:
+            break
+    parser.close()
+    return parser.result()
+
+
+class BirdspediaFetcher(BaseFetcher):
     """
-    Giả lập cào dữ liệu từ một nguồn giả định 'birdspedia' hoặc nguồn tương tự 
-    như 'animaldiversity.org' để lấy Diet và Habitat.
+    Dữ liệu sinh thái (Diet, Habitat, Migration) từ trang loài của Animal Diversity Web
+    (animaldiversity.org/accounts/<Chi>_<loài>/). Trang đã lưu trong Config.ADW_PAGES_DIR
+    được đọc từ đĩa; nếu không thì tải qua client HTTP dùng chung (stream, parse theo chunk).
+    Kết quả được cache trên đĩa theo tên khoa học.
     """
+    def __init__(self, pages_dir: str = None, base_url: str = None):
+        super().__init__()
+        self.pages_dir = pages_dir if pages_dir is not None else Config.ADW_PAGES_DIR
+        self.base_url = (base_url or Config.ADW_BASE_URL).rstrip("/")
+
     def fetch_ecology_data(self, scientific_name: str):
-        # Trong thực tế, bạn sẽ thay URL này bằng URL thật. 
-        # Ví dụ tìm kiếm trên animaldiversity bằng tên khoa học
-        search_url = f"https://animaldiversity.org/search/simple/?q={scientific_name}"
-        
+        if not scientific_name:
+            return None
         try:
-            # Code giả lập logic cào dữ liệu
-            # response = requests.get(search_url, headers={'User-Agent': Config.USER_AGENT})
-            # soup = BeautifulSoup(response.content, 'html.parser')
-            # ... logic trích xuất text ...
-            
-            # Trả về dữ liệu giả lập cho demo (thay bằng code cào thật của bạn)
-            return {
-                "diet": "Omnivore (Insects, Fruits, Seeds)",
-                "habitat": "Tropical subtropical moist broadleaf forests, Urban areas",
-                "migration": "Non-migratory"
-            }
+            return self.cache.get_or_fetch(
+                "birdspedia", scientific_name, lambda: self._scrape(scientific_name)
+            )
         except Exception as e:
             print(f"[Birdspedia Error] {e}")
-            return None
\ No newline at end of file
+            return None
+
+    @staticmethod
+    def page_name(scientific_name: str) -> str:
+        """'Alcedo atthis' -> 'Alcedo_atthis' (tên trang trên ADW)."""
+        return "_".join(scientific_name.split()).capitalize()
+
+    def _scrape(self, scientific_name: str):
+        return self._load(scientific_name)[1]
+
+    def fetch_if_modified(self, scientific_name: str, etag: str = None, last_modified: str = None):
+        """
+        Làm mới: GET có điều kiện (If-None-Match / If-Modified-Since) theo validator đã lưu
+        trong node Ecology. Output: dữ liệu mới (đã cập nhật cache), hoặc None nếu trang không đổi.
+        """
+        changed, data = self._load(scientific_name, etag, last_modified)
+        if changed and data:
+            self.cache.set("birdspedia", scientific_name, data)
+            return data
+        return None
+
+    def _load(self, scientific_name: str, etag: str = None, last_modified: str = None):
+        """
+        Output: (changed, {diet, habitat, migration, etag, last_modified} hoặc None).
+        Trang đã lưu: etag là mtime của file. 304 -> (False, None).
+        """
+        page = self.page_name(scientific_name)
+        saved = os.path.join(self.pages_dir, f"{page}.html") if self.pages_dir else None
+        if saved and os.path.exists(saved):
+            file_etag = f"file:{os.stat(saved).st_mtime_ns}"
+            if etag == file_etag:
+                return False, None
+            with open(saved, "rb") as f:
+                data = parse_ecology(iter(lambda: f.read(CHUNK_SIZE), b""))
+            return True, dict(data, etag=file_etag, last_modified=None) if data else None
+
+        headers = {}
+        if etag:
+            headers["If-None-Match"] = etag
+        if last_modified:
+            headers["If-Modified-Since"] = last_modified
+        response = self.http.get(f"{self.base_url}/{page}/", headers=headers or None, stream=True)
+        try:
+            if response.status_code == 304:
+                return False, None
+            if response.status_code == 404:
+                return True, None  # ADW chưa có trang cho loài này (kết quả rỗng được cache ngắn hạn)
+            response.raise_for_status()
+            data = parse_ecology(response.iter_content(CHUNK_SIZE))
+            if data:
+                data.update(etag=response.headers.get("ETag"), last_modified=response.headers.get("Last-Modified"))
+            return True, data
+        finally:
+            response.close()
@@ -0,0 +1,53 @@
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from typing import Any, Callable, Dict, Optional
+
+
+class ConcurrentFetchStage:
+    """
+    Chạy song song các fetcher độc lập (Wikidata, Wikipedia, IUCN, ...).
+    - Mỗi nguồn có timeout riêng.
+    - Cả stage có một deadline tổng: nguồn nào trễ hạn thì bị bỏ qua,
+      các nguồn đã xong vẫn được trả về để ghi vào Graph.
+    """
+    def __init__(self, timeouts: Optional[Dict[str, float]] = None,
+                 default_timeout: float = 8.0, deadline: float = 10.0,
+                 max_workers: int = 16):
+        self.timeouts = timeouts or {}
+        self.default_timeout = default_timeout
+        self.deadline = deadline
+        # Pool dùng chung cho mọi lượt chat. Thread của nguồn bị timeout không thể
+        # bị huỷ giữa chừng nên pool cần rộng hơn số nguồn để không bị nghẽn.
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="fetch")
+
+    def run(self, tasks: Dict[str, Callable[[], Any]]) -> Dict[str, Any]:
+        """
+        tasks: {tên_nguồn: hàm không tham số}; tên dạng "nguồn@x" (vd "wikipedia@Alcedo atthis",
+               nhiều loài trong một stage) dùng timeout của "nguồn".
+        Output: {tên_nguồn: kết quả} chỉ gồm các nguồn trả về kịp hạn và không lỗi.
+        """
+        if not tasks:
+            return {}
+
+        start = time.monotonic()
+        stage_deadline = start + self.deadline
+        futures = {name: self.executor.submit(fn) for name, fn in tasks.items()}
+
+        results = {}
+        for name, future in futures.items():
+            timeout = self.timeouts.get(name.split("@", 1)[0], self.default_timeout)
+            source_deadline = min(start + timeout, stage_deadline)
+            remaining = max(0.0, source_deadline - time.monotonic())
+            try:
+                results[name] = future.result(timeout=remaining)
+            except FutureTimeout:
+                future.cancel()
+                print(f"   ⏱️ [Fetch] '{name}' missed the deadline ({time.monotonic() - start:.2f}s), skipping.")
+            except Exception as e:
+                print(f"   [Fetch Error] '{name}': {e}")
+
+        print(f"   ⚡ [Fetch] {len(results)}/{len(tasks)} sources in {time.monotonic() - start:.2f}s")
+        return results
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,184 @@
+import argparse
+import bisect
+import difflib
+import gzip
+import json
+import os
+import threading
+import time
+import unicodedata
+from typing import Dict, List, Optional
+
+from src.config import Config
+from src.data_loaders.base_fetcher import get_http_client
+
+WIKIDATA_ENDPOINT = "https://query.wikidata.org/sparql"
+
+# Xuất theo trang: các loài (P105 = species) chim, kèm tên khoa học (P225), ảnh (P18),
+# khối lượng (P2067), nhãn + alias vi/en.
+# - Chọn loài chim qua Avibase ID (P2026, chỉ có ở taxon chim) thay vì wdt:P171+ wd:Q5113:
+#   đường dẫn bắc cầu buộc WDQS tính lại cả cây phân loại mỗi trang và quá timeout 60s.
+# - Phân trang theo khoá (IRI > IRI cuối của trang trước) thay vì OFFSET: không phải
+#   sắp xếp rồi bỏ qua mọi trang trước đó.
+EXPORT_QUERY = """
+SELECT ?item ?sci ?image ?mass ?label WHERE {{
+  {{
+    SELECT ?item ?sci WHERE {{
+      ?item wdt:P2026 []; wdt:P105 wd:Q7432; wdt:P225 ?sci.
+      FILTER(STR(?item) > "{after}")
+    }}
+    ORDER BY STR(?item)
+    LIMIT {limit}
+  }}
+  OPTIONAL {{ ?item wdt:P18 ?image. }}
+  OPTIONAL {{ ?item wdt:P2067 ?mass. }}
+  OPTIONAL {{
+    {{ ?item rdfs:label ?label. }} UNION {{ ?item skos:altLabel ?label. }}
+    FILTER(LANG(?label) IN ("vi", "en"))
+  }}
+}}
+"""
+
+
+def fold(text: str) -> str:
+    """Chuẩn hoá không dấu: 'Chích chòe' -> 'chich choe', 'đại bàng' -> 'dai bang'."""
+    text = " ".join(text.strip().lower().split()).replace("đ", "d")
+    return "".join(c for c in unicodedata.normalize("NFD", text) if unicodedata.category(c) != "Mn")
+
+
+class SpeciesGazetteer:
+    """
+    Chỉ mục tên loài chim trong bộ nhớ, xây từ file export Wikidata.
+    Tra cứu theo thứ tự: khớp chính xác -> không dấu -> tiền tố -> gần đúng (fuzzy).
+    """
+    def __init__(self, records: List[list]):
+        # record: [qid, scientific_name, image_url, mass, [tên vi/en/alias...]]
+        self.records = records
+        self.exact: Dict[str, int] = {}
+        self.folded: Dict[str, int] = {}
+        for idx, (_, sci, _, _, names) in enumerate(records):
+            for name in [sci] + names:
+                key = " ".join(name.strip().lower().split())
+                self.exact.setdefault(key, idx)
+                self.folded.setdefault(fold(name), idx)
+        self.sorted_keys = sorted(self.folded)
+        # Nhóm theo 2 ký tự đầu để fuzzy chỉ so với một tập nhỏ
+        self.buckets: Dict[str, List[str]] = {}
+        for key in self.sorted_keys:
+            self.buckets.setdefault(key[:2], []).append(key)
+
+    @classmethod
+    def load(cls, path: str) -> Optional["SpeciesGazetteer"]:
+        if not path or not os.path.exists(path):
+            return None
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            return cls(json.load(f))
+
+    def _result(self, idx: int, match: str) -> dict:
+        qid, sci, image, mass, _ = self.records[idx]
+        return {"scientific_name": sci, "image_url": image, "mass": mass, "wikidata_id": qid, "match": match}
+
+    def lookup(self, name: str, partial: bool = True, fuzzy_cutoff: float = 0.88) -> Optional[dict]:
+        """partial=False: chỉ khớp chính xác / không dấu (không tiền tố, không fuzzy)."""
+        if not name:
+            return None
+        key = " ".join(name.strip().lower().split())
+        if key in self.exact:
+            return self._result(self.exact[key], "exact")
+
+        folded = fold(name)
+        if folded in self.folded:
+            return self._result(self.folded[folded], "accent")
+        if not partial:
+            return None
+
+        # Tiền tố trọn từ ("bói cá" -> "bói cá thường", không phải "sparrow" -> "sparrowhawk"):
+        # chỉ nhận khi mọi tên khớp trỏ về đúng MỘT loài, nhập nhằng thì coi như không tìm thấy
+        if len(folded) >= 4:
+            i = bisect.bisect_left(self.sorted_keys, folded)
+            species = set()
+            while i < len(self.sorted_keys) and self.sorted_keys[i].startswith(folded) and len(species) < 2:
+                if self.sorted_keys[i][len(folded):len(folded) + 1] in (" ", "-"):
+                    species.add(self.folded[self.sorted_keys[i]])
+                i += 1
+            if len(species) == 1:
+                return self._result(species.pop(), "prefix")
+            if species:
+                return None
+
+        close = difflib.get_close_matches(folded, self.buckets.get(folded[:2], []), n=1, cutoff=fuzzy_cutoff)
+        if close:
+            return self._result(self.folded[close[0]], "fuzzy")
+        return None
+
+
+_shared_gazetteer = None
+_shared_loaded = False
+_shared_lock = threading.Lock()
+
+
+def get_gazetteer() -> Optional[SpeciesGazetteer]:
+    """Gazetteer dùng chung trong process; None nếu chưa build file (Config.GAZETTEER_PATH)."""
+    global _shared_gazetteer, _shared_loaded
+    # Các fetcher được tạo song song lúc khởi động: chỉ nạp file một lần
+    with _shared_lock:
+        if not _shared_loaded:
+            _shared_gazetteer = SpeciesGazetteer.load(Config.GAZETTEER_PATH)
+            _shared_loaded = True
+            if _shared_gazetteer is None:
+                print(f"   [Gazetteer] No local index at {Config.GAZETTEER_PATH}, using SPARQL only.")
+        return _shared_gazetteer
+
+
+def export_from_wikidata(out_path: str, page_size: int = 5000):
+    """Bulk export các loài chim từ Wikidata ra file gazetteer (json.gz)."""
+    http = get_http_client()
+    headers = {"Accept": "application/sparql-results+json"}
+    by_item: Dict[str, list] = {}
+    after = ""
+    while True:
+        query = EXPORT_QUERY.format(limit=page_size, after=after)
+        bindings = http.get_json(WIKIDATA_ENDPOINT, params={"query": query}, headers=headers,
+                                 timeout=(Config.HTTP_CONNECT_TIMEOUT, 300))["results"]["bindings"]
+        if not bindings:
+            break
+        after = max(row["item"]["value"] for row in bindings)
+        for row in bindings:
+            qid = row["item"]["value"].rsplit("/", 1)[-1]
+            rec = by_item.setdefault(qid, [qid, row["sci"]["value"], None, None, []])
+            if rec[2] is None and "image" in row:
+                rec[2] = row["image"]["value"]
+            if rec[3] is None and "mass" in row:
+                rec[3] = row["mass"]["value"]
+            label = row.get("label", {}).get("value")
+            if label and label not in rec[4]:
+                rec[4].append(label)
+        print(f"   [Gazetteer] after {after.rsplit('/', 1)[-1]}: {len(by_item)} species so far")
+
+    if os.path.dirname(out_path):
+        os.makedirs(os.path.dirname(out_path), exist_ok=True)
+    with gzip.open(out_path, "wt", encoding="utf-8") as f:
+        json.dump(list(by_item.values()), f, ensure_ascii=False, separators=(",", ":"))
+    print(f"✅ [Gazetteer] Wrote {len(by_item)} species to {out_path}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build / query the local bird species gazetteer")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    build = sub.add_parser("build", help="Export bird taxa from Wikidata")
+    build.add_argument("--out", default=Config.GAZETTEER_PATH)
+    build.add_argument("--page-size", type=int, default=5000)
+    lookup = sub.add_parser("lookup", help="Resolve a name with the local index")
+    lookup.add_argument("name")
+    lookup.add_argument("--path", default=Config.GAZETTEER_PATH)
+    args = parser.parse_args()
+
+    if args.cmd == "build":
+        export_from_wikidata(args.out, args.page_size)
+    else:
+        gazetteer = SpeciesGazetteer.load(args.path)
+        if gazetteer is None:
+            raise SystemExit(f"Gazetteer not found at {args.path}; run the 'build' command first.")
+        started = time.perf_counter()
+        result = gazetteer.lookup(args.name)
+        print(f"{result} ({(time.perf_counter() - started) * 1e6:.0f} µs)")
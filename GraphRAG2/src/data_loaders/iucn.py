@@ -1,8 +1,9 @@
-import requests
 import os
+from src.data_loaders.base_fetcher import BaseFetcher
 
-class IUCNFetcher:
+class IUCNFetcher(BaseFetcher):
     def __init__(self):
+        super().__init__()
         # Lấy token từ biến môi trường (cấu hình trong .env)
         self.token = os.getenv("IUCN_API_TOKEN", "YOUR_TOKEN_HERE")
         self.base_url = "https://apiv3.iucnredlist.org/api/v3"
@@ -32,26 +33,40 @@ class IUCNFetcher:
             print("   [IUCN Warning] Missing API Token. Using Mock/Wikidata is recommended instead.")
             return "Unknown (Missing API Token)"
 
-        # Gọi API IUCN
+        # Gọi API IUCN (có cache trên đĩa theo tên khoa học)
         try:
-            # Endpoint: /species/{name}?token={token}
-            url = f"{self.base_url}/species/{scientific_name}?token={self.token}"
-            response = requests.get(url, timeout=10)
-            data = response.json()
-
-            # Kiểm tra kết quả
-            if 'result' in data and len(data['result']) > 0:
-                # Lấy category code (ví dụ: 'LC', 'EN')
-                code = data['result'][0].get('category', 'NE')
-                # Map sang tên đầy đủ
-                return self.category_map.get(code, code)
-            else:
-                return "Not Found in IUCN Database"
-
+            return self.cache.get_or_fetch(
+                "iucn", scientific_name, lambda: self._fetch_status(scientific_name)
+            )
         except Exception as e:
             print(f"   [IUCN Error] {e}")
             return None
 
+    def has_token(self) -> bool:
+        return bool(self.token) and self.token != "YOUR_TOKEN_HERE"
+
+    def get_version(self) -> str:
+        """Phiên bản Red List hiện hành (vd '2022-2'): đổi phiên bản mới cần kiểm tra lại trạng thái."""
+        return self.http.get_json(f"{self.base_url}/version", params={"token": self.token}).get("version")
+
+    def refresh_status(self, scientific_name: str) -> str:
+        """Tải lại trạng thái (không dùng entry cache cũ) và cập nhật cache."""
+        return self.cache.refresh("iucn", scientific_name, lambda: self._fetch_status(scientific_name))
+
+    def _fetch_status(self, scientific_name: str) -> str:
+        # Endpoint: /species/{name}?token={token}
+        data = self.http.get_json(f"{self.base_url}/species/{scientific_name}",
+                                  params={"token": self.token})
+
+        # Kiểm tra kết quả
+        if 'result' in data and len(data['result']) > 0:
+            # Lấy category code (ví dụ: 'LC', 'EN')
+            code = data['result'][0].get('category', 'NE')
+            # Map sang tên đầy đủ
+            return self.category_map.get(code, code)
+        else:
+            return "Not Found in IUCN Database"
+
 # --- Mẹo nhỏ (Pro Tip) ---
 # Nếu bạn không muốn xin API Key của IUCN (vì duyệt khá lâu),
 # bạn có thể dùng WikidataFetcher để lấy trạng thái bảo tồn.
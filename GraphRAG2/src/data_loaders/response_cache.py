@@ -0,0 +1,172 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+from src.config import Config
+
+_MISSING = object()
+
+
+class ResponseCache:
+    """
+    Cache bền vững (SQLite) cho response của các data loader.
+    - Key = (nguồn, query đã chuẩn hoá), value lưu dạng JSON.
+    - TTL riêng cho từng nguồn; kết quả rỗng (None) dùng negative_ttl ngắn hơn.
+    - Giới hạn số entry, vượt quá thì xoá entry lâu không dùng nhất (LRU). Thời điểm truy cập
+      chỉ được ghi lại khi đã cũ hơn touch_interval giây (đọc trúng cache không tốn một lần
+      commit), số entry được đếm dần thay vì COUNT(*) mỗi lần ghi.
+    - offline=True: chỉ trả dữ liệu có trong cache (kể cả đã hết hạn), không gọi mạng.
+    """
+    def __init__(self, path: str, ttls: Optional[Dict[str, float]] = None,
+                 default_ttl: float = 30 * 86400, negative_ttl: float = 86400,
+                 max_entries: int = 50000, offline: bool = False, touch_interval: float = 3600):
+        self.path = path
+        self.ttls = ttls or {}
+        self.default_ttl = default_ttl
+        self.negative_ttl = negative_ttl
+        self.max_entries = max_entries
+        self.offline = offline
+        self.touch_interval = touch_interval
+        self.hits = 0
+        self.misses = 0
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                source TEXT NOT NULL,
+                key TEXT NOT NULL,
+                value TEXT,
+                fetched_at REAL NOT NULL,
+                last_access REAL NOT NULL,
+                PRIMARY KEY (source, key)
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_responses_access ON responses(last_access)")
+        self._conn.commit()
+        self._count = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+
+    @staticmethod
+    def normalize_key(query: str) -> str:
+        return " ".join(str(query).strip().lower().split())
+
+    def _ttl(self, source: str, value) -> float:
+        if value is None:
+            return self.negative_ttl
+        return self.ttls.get(source, self.default_ttl)
+
+    def get(self, source: str, query: str, allow_stale: bool = False):
+        """Trả về value đã cache, hoặc _MISSING nếu không có / đã hết hạn."""
+        key = self.normalize_key(query)
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, fetched_at, last_access FROM responses WHERE source = ? AND key = ?",
+                (source, key)
+            ).fetchone()
+            if row is None:
+                return _MISSING
+            value = json.loads(row[0])
+            if not allow_stale and row[1] + self._ttl(source, value) < now:
+                return _MISSING
+            if row[2] + self.touch_interval < now:
+                self._conn.execute(
+                    "UPDATE responses SET last_access = ? WHERE source = ? AND key = ?",
+                    (now, source, key)
+                )
+                self._conn.commit()
+            return value
+
+    def set(self, source: str, query: str, value):
+        key = self.normalize_key(query)
+        now = time.time()
+        data = json.dumps(value, ensure_ascii=False)
+        with self._lock:
+            updated = self._conn.execute(
+                "UPDATE responses SET value = ?, fetched_at = ?, last_access = ? WHERE source = ? AND key = ?",
+                (data, now, now, source, key)
+            ).rowcount
+            if not updated:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO responses (source, key, value, fetched_at, last_access) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (source, key, data, now, now)
+                )
+                self._count += 1
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        """
+        Gọi khi đang giữ lock: vượt max_entries thì xoá các entry LRU xuống còn ~90% giới hạn
+        (xoá theo lô, không phải mỗi lần ghi), rồi đếm lại (file có thể được process khác ghi).
+        """
+        if self._count <= self.max_entries:
+            return
+        self._conn.execute(
+            "DELETE FROM responses WHERE rowid IN "
+            "(SELECT rowid FROM responses ORDER BY last_access ASC LIMIT ?)",
+            (self._count - int(self.max_entries * 0.9),)
+        )
+        self._count = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+
+    def get_or_fetch(self, source: str, query: str, fetch: Callable[[], Any]):
+        """
+        Đọc cache, nếu miss thì gọi fetch() và lưu kết quả.
+        fetch() nên ném exception khi lỗi mạng để lỗi không bị cache.
+        """
+        value = self.get(source, query, allow_stale=self.offline)
+        if value is not _MISSING:
+            self.hits += 1
+            return value
+
+        self.misses += 1
+        if self.offline:
+            print(f"      [Cache] Offline mode: no cached '{source}' response for '{query}'.")
+            return None
+
+        value = fetch()
+        self.set(source, query, value)
+        return value
+
+    def refresh(self, source: str, query: str, fetch: Callable[[], Any]):
+        """Bỏ qua entry đang có: gọi fetch() và ghi đè (dùng khi biết dữ liệu nguồn đã đổi)."""
+        if self.offline:
+            return self.get(source, query, allow_stale=True)
+        value = fetch()
+        self.set(source, query, value)
+        return value
+
+    def stats(self) -> dict:
+        with self._lock:
+            size = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        return {"size": size, "hits": self.hits, "misses": self.misses, "offline": self.offline}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+_shared_cache = None
+_shared_lock = threading.Lock()
+
+
+def get_response_cache() -> ResponseCache:
+    """Cache dùng chung cho mọi fetcher trong process (cấu hình từ Config)."""
+    global _shared_cache
+    with _shared_lock:
+        if _shared_cache is None:
+            _shared_cache = ResponseCache(
+                Config.RESPONSE_CACHE_PATH,
+                ttls=Config.RESPONSE_CACHE_TTLS,
+                negative_ttl=Config.RESPONSE_CACHE_NEGATIVE_TTL,
+                max_entries=Config.RESPONSE_CACHE_MAX_ENTRIES,
+                offline=Config.OFFLINE_MODE
+            )
+        return _shared_cache
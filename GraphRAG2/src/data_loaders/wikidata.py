@@ -1,12 +1,32 @@
+import re
 import sys
-from SPARQLWrapper import SPARQLWrapper, JSON
+from src.config import Config
+from src.data_loaders.base_fetcher import BaseFetcher
+from src.data_loaders.gazetteer import get_gazetteer
+from src.utils import TTLCache
 
-class WikidataFetcher:
+# Họ / bộ của một loài: đi ngược chuỗi đơn vị phân loại cha (P171) tới đơn vị có bậc (P105)
+# họ (Q35409) / bộ (Q36602); lấy tên khoa học (P225) và nhãn tiếng Việt nếu có.
+TAXONOMY_PATTERN = """OPTIONAL { ?item wdt:P171+ ?family. ?family wdt:P105 wd:Q35409; wdt:P225 ?familyName.
+                      OPTIONAL { ?family rdfs:label ?familyVi. FILTER(LANG(?familyVi) = "vi") } }
+          OPTIONAL { ?item wdt:P171+ ?order. ?order wdt:P105 wd:Q36602; wdt:P225 ?orderName.
+                      OPTIONAL { ?order rdfs:label ?orderVi. FILTER(LANG(?orderVi) = "vi") } }"""
+
+
+def _taxon(row: dict, rank: str):
+    """Dòng kết quả SPARQL -> {name, name_vi} của họ / bộ ('family' / 'order'), hoặc None."""
+    name = row.get(f"{rank}Name", {}).get("value")
+    if not name:
+        return None
+    return {"name": name, "name_vi": row.get(f"{rank}Vi", {}).get("value")}
+
+class WikidataFetcher(BaseFetcher):
     def __init__(self):
-        self.sparql = SPARQLWrapper("https://query.wikidata.org/sparql")
-        self.sparql.setReturnFormat(JSON)
-        # Thêm User-Agent để tránh bị Wikidata chặn request
-        self.sparql.addCustomHttpHeader("User-Agent", "BirdGraphRAG/1.0 (contact@example.com)")
+        # self.http: client dùng chung (keep-alive, retry, rate limit); self.cache: response cache
+        super().__init__()
+        self.endpoint = "https://query.wikidata.org/sparql"
+        # API MediaWiki của Wikidata: đọc lastrevid của nhiều item trong một request (làm mới dữ liệu)
+        self.api_url = "https://www.wikidata.org/w/api.php"
 
         # TỪ ĐIỂN CỨNG: Sửa sai ngay lập tức cho các loài phổ biến ở VN
         self.common_map = {
@@ -28,28 +48,89 @@ class WikidataFetcher:
             "công": "Pavo cristatus"
         }
 
-    def get_bird_data(self, common_name: str):
+        # Cache kết quả định danh theo tên đã chuẩn hoá: process_turn và
+        # _lazy_load_data hỏi cùng một tên nên lần thứ 2 không phải gọi SPARQL nữa.
+        self.resolution_cache = TTLCache(
+            maxsize=Config.WIKIDATA_CACHE_SIZE,
+            ttl=Config.WIKIDATA_CACHE_TTL,
+            negative_ttl=Config.WIKIDATA_NEGATIVE_TTL
+        )
+        # Chỉ mục tên loài cục bộ (build bằng: python -m src.data_loaders.gazetteer build)
+        self.gazetteer = get_gazetteer()
+
+    def _run_query(self, query: str):
+        # Client dùng chung gửi User-Agent riêng (Wikidata chặn request không có UA)
+        results = self.http.get_json(
+            self.endpoint, params={"query": query},
+            headers={"Accept": "application/sparql-results+json"}
+        )
+        # Không có kết quả -> None để được cache âm với TTL ngắn
+        return results["results"]["bindings"] or None
+
+    @staticmethod
+    def normalize_name(name: str) -> str:
+        return re.sub(r"\s+", " ", name.strip().lower())
+
+    def cache_stats(self) -> dict:
+        return self.resolution_cache.stats()
+
+    def get_bird_data(self, common_name: str, strict: bool = False):
         """
         Hàm mới: Trả về cả Tên khoa học VÀ Link ảnh.
         Output: {'scientific_name': '...', 'image_url': '...'}
+        strict=True: ném lỗi mạng thay vì trả None (làm mới nền cần phân biệt "không có" với "lỗi").
         """
         if not common_name: return None
 
+        normalized_name = self.normalize_name(common_name)
+        try:
+            return self.resolution_cache.get_or_load(
+                normalized_name, lambda: self._resolve(normalized_name, common_name)
+            )
+        except Exception as e:
+            if strict:
+                raise
+            print(f"      [Wikidata Error] {e}")
+            return None
+
+    def _resolve(self, normalized_name: str, common_name: str):
+        """
+        Gọi SPARQL thật. Trả về None nếu không tìm thấy (được cache âm),
+        ném exception nếu lỗi mạng (không cache).
+        """
         # 1. Xử lý từ điển cứng
-        normalized_name = common_name.strip().lower()
         if normalized_name in self.common_map:
             # Nếu tìm thấy trong dict, lấy tên khoa học làm từ khóa tìm kiếm
             search_term = self.common_map[normalized_name]
             print(f"      [Wikidata] Found in local dict: {normalized_name} -> {search_term}")
         else:
-            search_term = common_name
+            search_term = common_name.strip()
+
+        # 2. Tra chỉ mục cục bộ (không tốn request). Tên lấy từ từ điển cứng có thể là
+        # tên chi (vd 'Zosterops') nên chỉ khớp chính xác, không khớp tiền tố / gần đúng.
+        if self.gazetteer is not None:
+            hit = self.gazetteer.lookup(search_term, partial=normalized_name not in self.common_map)
+            if hit:
+                print(f"      [Gazetteer] {hit['match']} match: {search_term} -> {hit['scientific_name']}")
+                return {
+                    "scientific_name": hit["scientific_name"],
+                    "image_url": hit["image_url"],
+                    "mass": hit["mass"],
+                    "wikidata_id": hit["wikidata_id"],
+                    "revid": None,
+                    # Chỉ mục cục bộ không có họ / bộ: làm mới nền (fetch_details) bổ sung sau
+                    "family": None,
+                    "order": None
+                }
+
+        # 3. Fallback: SPARQL trên query.wikidata.org
 
         # Chuẩn bị biến thể viết hoa (Title Case)
         name_title = search_term.title()
 
         # QUERY SPARQL MỚI (Thêm ?mass)
         query = f"""
-        SELECT ?scientificName ?image ?mass WHERE {{
+        SELECT ?item ?scientificName ?image ?mass ?revid ?familyName ?familyVi ?orderName ?orderVi WHERE {{
           {{ ?item rdfs:label "{search_term}"@vi. }}
           UNION
           {{ ?item rdfs:label "{search_term}"@en. }}
@@ -66,35 +147,83 @@ class WikidataFetcher:
           
           # --- MỚI: Lấy khối lượng (P2067) ---
           OPTIONAL {{ ?item wdt:P2067 ?mass. }}
+
+          # Revision hiện tại của item (để biết khi nào cần làm mới)
+          OPTIONAL {{ ?item schema:version ?revid. }}
+          {TAXONOMY_PATTERN}
         }}
         LIMIT 1
         """
         
-        self.sparql.setQuery(query)
-        try:
-            results = self.sparql.query().convert()
-            bindings = results["results"]["bindings"]
-            
-            if bindings:
-                data = bindings[0]
-                sci_name = data["scientificName"]["value"]
-                img_url = data.get("image", {}).get("value", None)
-                
-                # Lấy cân nặng (Wikidata thường trả về đơn vị Gram hoặc Kg)
-                mass_val = data.get("mass", {}).get("value", None)
-                
-                print(f"      [Wikidata] Resolved: {sci_name} | Mass: {mass_val}")
-                
-                return {
-                    "scientific_name": sci_name,
-                    "image_url": img_url,
-                    "mass": mass_val # Trả về cân nặng
-                }
-                
-        except Exception as e:
-            print(f"      [Wikidata Error] {e}")
-            
-        return None
+        bindings = self.cache.get_or_fetch(
+            "wikidata", search_term, lambda: self._run_query(query)
+        )
+        
+        if not bindings:
+            return None
+
+        data = bindings[0]
+        sci_name = data["scientificName"]["value"]
+        img_url = data.get("image", {}).get("value", None)
+        
+        # Lấy cân nặng (Wikidata thường trả về đơn vị Gram hoặc Kg)
+        mass_val = data.get("mass", {}).get("value", None)
+        
+        print(f"      [Wikidata] Resolved: {sci_name} | Mass: {mass_val}")
+        
+        return {
+            "scientific_name": sci_name,
+            "image_url": img_url,
+            "mass": mass_val, # Trả về cân nặng
+            "wikidata_id": data.get("item", {}).get("value", "").rsplit("/", 1)[-1] or None,
+            "revid": int(data["revid"]["value"]) if "revid" in data else None,
+            "family": _taxon(data, "family"),
+            "order": _taxon(data, "order")
+        }
+
+    def get_revisions(self, qids) -> dict:
+        """lastrevid của nhiều item (50 item / request, wbgetentities). Output: {qid: revid}."""
+        qids, revisions = list(qids), {}
+        for i in range(0, len(qids), 50):
+            data = self.http.get_json(self.api_url, params={
+                "action": "wbgetentities", "ids": "|".join(qids[i:i + 50]),
+                "props": "info", "format": "json"})
+            for qid, entity in data.get("entities", {}).items():
+                if "missing" not in entity:
+                    revisions[qid] = entity.get("lastrevid")
+        return revisions
+
+    def fetch_details(self, qids) -> dict:
+        """
+        Tải lại ảnh + cân nặng + họ / bộ của nhiều item trong MỘT câu SPARQL (không qua cache).
+        Output: {qid: {image_url, mass, wikidata_id, revid, family, order}}.
+        """
+        qids = list(qids)
+        if not qids:
+            return {}
+        values = " ".join(f"wd:{qid}" for qid in qids)
+        query = f"""
+        SELECT ?item ?image ?mass ?revid ?familyName ?familyVi ?orderName ?orderVi WHERE {{
+          VALUES ?item {{ {values} }}
+          OPTIONAL {{ ?item wdt:P18 ?image. }}
+          OPTIONAL {{ ?item wdt:P2067 ?mass. }}
+          OPTIONAL {{ ?item schema:version ?revid. }}
+          {TAXONOMY_PATTERN}
+        }}
+        """
+        details = {}
+        for row in self._run_query(query) or []:
+            qid = row["item"]["value"].rsplit("/", 1)[-1]
+            # Item có nhiều ảnh -> nhiều dòng; giữ dòng đầu như câu tra theo tên
+            details.setdefault(qid, {
+                "image_url": row.get("image", {}).get("value"),
+                "mass": row.get("mass", {}).get("value"),
+                "wikidata_id": qid,
+                "revid": int(row["revid"]["value"]) if "revid" in row else None,
+                "family": _taxon(row, "family"),
+                "order": _taxon(row, "order"),
+            })
+        return details
 
     def get_scientific_name(self, common_name: str) -> str:
         """
@@ -1,45 +1,116 @@
-import wikipedia
-from wikipedia.exceptions import DisambiguationError, PageError
+from src.data_loaders.base_fetcher import BaseFetcher
 
-class WikipediaFetcher:
+# Một request MediaWiki API cho mỗi ngôn ngữ: tìm trang khớp nhất (generator=search)
+# và lấy luôn đoạn mở đầu dạng text (prop=extracts), cờ trang định hướng (pageprops)
+# và id trang + revision hiện tại (prop=info, dùng để làm mới dữ liệu: src/refresh.py).
+# Thư viện `wikipedia` cũ cần 3 request (search, page, summary) và đổi ngôn ngữ
+# bằng trạng thái toàn cục; ở đây ngôn ngữ nằm trong URL nên các thread không giẫm nhau.
+SEARCH_PARAMS = {
+    "action": "query",
+    "format": "json",
+    "formatversion": "2",
+    "generator": "search",
+    "gsrlimit": "1",
+    "prop": "extracts|pageprops|info",
+    "exintro": "1",
+    "explaintext": "1",
+    "ppprop": "disambiguation",
+    "redirects": "1",
+}
+# Tra theo id trang (làm mới): prop=info tối đa 50 trang / request, extracts tối đa 20
+PAGES_PARAMS = {
+    "action": "query",
+    "format": "json",
+    "formatversion": "2",
+    "exintro": "1",
+    "explaintext": "1",
+}
+REVISION_BATCH = 50
+EXTRACT_BATCH = 20
+
+
+def _page(page: dict, lang: str) -> dict:
+    return {
+        "summary": page.get("extract", "")[0:1000] or None,  # Lấy khoảng 1000 ký tự đầu
+        "title": page.get("title"),
+        "pageid": page.get("pageid"),
+        "revid": page.get("lastrevid"),
+        "lang": lang,
+    }
+
+class WikipediaFetcher(BaseFetcher):
     def __init__(self):
-        # Set User Agent để tuân thủ chính sách của Wikipedia
-        # (Thư viện wikipedia python đôi khi bị chặn nếu không có header chuẩn, 
-        # nhưng wrapper này thường tự xử lý, ta set lang mặc định là en trước)
-        wikipedia.set_lang("en")
+        super().__init__()
 
     def get_summary(self, bird_name: str, lang: str = 'vi') -> str:
+        """Lấy tóm tắt về loài chim (xem get_page)."""
+        page = self.get_page(bird_name, lang)
+        return page["summary"] if page else None
+
+    def get_page(self, bird_name: str, lang: str = 'vi') -> dict:
         """
-        Lấy tóm tắt về loài chim.
+        Tìm trang Wikipedia của loài chim.
         Chiến lược:
         1. Thử tìm bằng ngôn ngữ yêu cầu (thường là 'vi').
-        2. Nếu không thấy, thử tìm bằng tiếng Anh.
-        3. Nếu gặp trang định hướng (Disambiguation), lấy kết quả đầu tiên.
+        2. Nếu không thấy (hoặc chỉ gặp trang định hướng), thử tìm bằng tiếng Anh.
+        Output: {summary, title, pageid, revid, lang} hoặc None.
+        Kết quả được cache trên đĩa theo (lang, tên loài).
         """
-        
-        # Thử với ngôn ngữ chính (Tiếng Việt)
+        if not bird_name:
+            return None
         try:
-            wikipedia.set_lang(lang)
-            # search trước để lấy tên trang chính xác nhất
-            search_results = wikipedia.search(bird_name)
-            
-            if not search_results:
-                raise PageError(bird_name)
-            
-            # Lấy trang đầu tiên tìm được
-            page = wikipedia.page(search_results[0])
-            return page.summary[0:1000] # Lấy khoảng 1000 ký tự đầu
-            
-        except (PageError, DisambiguationError, Exception):
+            page = self.cache.get_or_fetch(
+                "wikipedia", f"{lang}|{bird_name}", lambda: self._fetch_summary(bird_name, lang)
+            )
+        except Exception as e:
+            print(f"   [Wiki Error] Could not fetch data: {e}")
+            return None
+        if isinstance(page, str):
+            # Entry cache cũ: chỉ có đoạn tóm tắt, chưa có id trang / revision
+            return {"summary": page, "title": None, "pageid": None, "revid": None, "lang": None}
+        return page
+
+    def refresh_page(self, bird_name: str, lang: str = 'vi') -> dict:
+        """
+        Tìm lại trang (không dùng entry cache cũ) và cập nhật cache. Output như get_page.
+        Lỗi mạng được ném ra (làm mới nền không đánh dấu đã kiểm tra khi nguồn lỗi).
+        """
+        return self.cache.refresh(
+            "wikipedia", f"{lang}|{bird_name}", lambda: self._fetch_summary(bird_name, lang)
+        )
+
+    def _fetch_summary(self, bird_name: str, lang: str) -> dict:
+        """Gọi Wikipedia thật. Lỗi mạng được ném ra để không bị cache."""
+        summary = self._search_extract(bird_name, lang)
+        if summary is None and lang != "en":
             # Fallback sang Tiếng Anh
             print(f"   [Wiki] '{bird_name}' not found in '{lang}'. Switching to English...")
-            try:
-                wikipedia.set_lang("en")
-                search_results = wikipedia.search(bird_name)
-                if search_results:
-                    page = wikipedia.page(search_results[0])
-                    return page.summary[0:1000]
-            except Exception as e:
-                print(f"   [Wiki Error] Could not fetch data: {e}")
-        
-        return None
\ No newline at end of file
+            summary = self._search_extract(bird_name, "en")
+        return summary
+
+    def _search_extract(self, bird_name: str, lang: str) -> dict:
+        data = self.http.get_json(f"https://{lang}.wikipedia.org/w/api.php",
+                                  params=dict(SEARCH_PARAMS, gsrsearch=bird_name))
+        pages = data.get("query", {}).get("pages", [])
+        if not pages or "disambiguation" in pages[0].get("pageprops", {}):
+            return None
+        page = _page(pages[0], lang)
+        return page if page["summary"] else None
+
+    def _query_pages(self, pageids, lang: str, batch: int, **params):
+        for i in range(0, len(pageids), batch):
+            ids = "|".join(str(p) for p in pageids[i:i + batch])
+            data = self.http.get_json(f"https://{lang}.wikipedia.org/w/api.php",
+                                      params=dict(PAGES_PARAMS, pageids=ids, **params))
+            yield from (p for p in data.get("query", {}).get("pages", []) if not p.get("missing"))
+
+    def get_revisions(self, pageids, lang: str) -> dict:
+        """Revision hiện tại của nhiều trang, 50 trang / request. Output: {pageid: revid}."""
+        return {p["pageid"]: p.get("lastrevid")
+                for p in self._query_pages(list(pageids), lang, REVISION_BATCH, prop="info")}
+
+    def fetch_pages(self, pageids, lang: str) -> dict:
+        """Tải lại đoạn mở đầu theo id trang (không qua cache), 20 trang / request. Output: {pageid: page}."""
+        return {p["pageid"]: _page(p, lang)
+                for p in self._query_pages(list(pageids), lang, EXTRACT_BATCH,
+                                           prop="extracts|info", exlimit=str(EXTRACT_BATCH))}
@@ -1,19 +1,214 @@
+# Bản ghi âm thật từ Xeno-canto (API JSON v3, cần API key: https://xeno-canto.org/account).
+# Prefetch cả một danh sách loài vào response cache (chạy trước khi ingest):
+#   python -m src.data_loaders.xenocanto checklist.txt --workers 4
+#   - checklist cùng định dạng với src.ingest ("tên thường" hoặc "tên thường,tên khoa học")
+import argparse
+import heapq
+import math
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Dict, Iterable, Iterator, List, Optional
 from urllib.parse import quote
 
-class XenoCantoFetcher:
-    def get_audio(self, scientific_name: str):
-        if not scientific_name: return None
-        
-        # Tạo đường link tìm kiếm trực tiếp trên trang chủ Xeno-canto
-        # Ví dụ: https://xeno-canto.org/explore?query=Alcedo%20atthis
-        encoded_name = quote(scientific_name)
-        search_url = f"https://xeno-canto.org/explore?query={encoded_name}"
-        
-        print(f"      🔗 Generated Safe Link: {search_url}")
-        
-        # Trả về link trang web thay vì link file .mp3
+from src.config import Config
+from src.data_loaders.base_fetcher import BaseFetcher
+
+# Chất lượng do cộng đồng Xeno-canto chấm: A tốt nhất ... E kém nhất; chưa chấm xếp cuối
+QUALITY_RANK = {"A": 0, "B": 1, "C": 2, "D": 3, "E": 4}
+# Tâm lãnh thổ Việt Nam: xếp hạng bản ghi theo khoảng cách khi cùng chất lượng
+VIETNAM_CENTER = (16.0, 107.5)
+
+
+def _distance_km(lat, lon, origin=VIETNAM_CENTER) -> float:
+    """Khoảng cách haversine tới origin; thiếu toạ độ -> vô cùng."""
+    try:
+        lat, lon = float(lat), float(lon)
+    except (TypeError, ValueError):
+        return math.inf
+    phi1, phi2 = math.radians(origin[0]), math.radians(lat)
+    d_phi, d_lambda = phi2 - phi1, math.radians(lon - origin[1])
+    h = math.sin(d_phi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(d_lambda / 2) ** 2
+    return 2 * 6371.0 * math.asin(math.sqrt(h))
+
+
+def _length_seconds(length: str) -> Optional[int]:
+    """'1:05' hoặc '1:02:03' -> số giây."""
+    try:
+        seconds = 0
+        for part in str(length).split(":"):
+            seconds = seconds * 60 + int(part)
+        return seconds
+    except ValueError:
+        return None
+
+
+def _float_or_none(value) -> Optional[float]:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class XenoCantoFetcher(BaseFetcher):
+    """
+    Chọn vài bản ghi âm tốt nhất của một loài từ API Xeno-canto:
+    - lượt 1 chỉ tìm bản ghi ở Việt Nam (cnt:vietnam); chưa đủ thì lượt 2 tìm toàn cầu
+    - đọc kết quả theo từng trang (stream), chỉ giữ top-k trong một heap; dừng sớm khi
+      đã có đủ k bản ghi chất lượng A ở Việt Nam, hoặc hết max_pages trang mỗi lượt
+    - xếp hạng: chất lượng trước, rồi khoảng cách tới Việt Nam
+    Kết quả (metadata gọn, không phải response thô) được cache trên đĩa theo tên khoa học.
+    api_url trỏ được tới server giả lập cục bộ (XENO_CANTO_API_URL) để thử nghiệm.
+    """
+    def __init__(self, api_url: str = None, api_key: str = None, max_recordings: int = None,
+                 max_pages: int = None, page_size: int = None):
+        super().__init__()
+        self.api_url = api_url or Config.XENO_CANTO_API_URL
+        self.api_key = api_key if api_key is not None else Config.XENO_CANTO_API_KEY
+        self.max_recordings = max_recordings or Config.XENO_CANTO_MAX_RECORDINGS
+        self.max_pages = max_pages or Config.XENO_CANTO_MAX_PAGES
+        self.page_size = page_size or Config.XENO_CANTO_PAGE_SIZE
+
+    @staticmethod
+    def search_link(scientific_name: str) -> Dict:
+        """Link trang tìm kiếm (dùng khi chưa cấu hình API key)."""
+        url = f"https://xeno-canto.org/explore?query={quote(scientific_name)}"
+        return {"id": f"search:{scientific_name}", "url": url, "quality": None,
+                "lat": None, "lon": None, "length": None, "loc": "Xeno-canto Database"}
+
+    def get_audio(self, scientific_name: str) -> Optional[List[Dict]]:
+        """
+        Output: list bản ghi đã xếp hạng (tốt nhất trước), mỗi bản ghi
+        {id, url, quality, lat, lon, length (giây), loc}; None nếu không có bản ghi nào.
+        """
+        if not scientific_name:
+            return None
+        if not self.api_key:
+            print("   [Xeno-canto Warning] Missing XENO_CANTO_API_KEY. Using a search link instead.")
+            return [self.search_link(scientific_name)]
+        try:
+            return self.cache.get_or_fetch(
+                "xenocanto", scientific_name, lambda: self._fetch_recordings(scientific_name)
+            )
+        except Exception as e:
+            print(f"   [Xeno-canto Error] {e}")
+            return None
+
+    def _query(self, scientific_name: str, country: str = None) -> str:
+        # Cú pháp tag của API v3: gen:Alcedo sp:atthis cnt:vietnam
+        parts = scientific_name.split()
+        query = f"gen:{parts[0]}" + (f" sp:{parts[1]}" if len(parts) > 1 else "")
+        return f"{query} cnt:{country}" if country else query
+
+    def iter_recordings(self, query: str) -> Iterator[Dict]:
+        """Duyệt kết quả theo từng trang (tối đa max_pages), yield từng bản ghi thô."""
+        page, pages = 1, 1
+        while page <= min(pages, self.max_pages):
+            data = self.http.get_json(self.api_url, params={
+                "query": query, "key": self.api_key, "page": page, "per_page": self.page_size})
+            pages = int(data.get("numPages") or 1)
+            yield from data.get("recordings") or []
+            page += 1
+
+    @staticmethod
+    def _compact(rec: Dict) -> Dict:
+        """Bản ghi thô của API -> metadata gọn lưu vào Graph."""
+        lat, lon = _float_or_none(rec.get("lat")), _float_or_none(rec.get("lon", rec.get("lng")))
         return {
-            "url": search_url,
-            "loc": "Xeno-canto Database", # Địa điểm: Kho dữ liệu
-            "rec": "Search Link"          # Người thu: Link tìm kiếm
-        }
\ No newline at end of file
+            "id": str(rec.get("id")),
+            "url": rec.get("file"),
+            "quality": rec.get("q") if rec.get("q") in QUALITY_RANK else None,
+            "lat": lat, "lon": lon,
+            "length": _length_seconds(rec.get("length")),
+            "loc": rec.get("loc") or rec.get("cnt"),
+        }
+
+    @staticmethod
+    def _rank(rec: Dict) -> tuple:
+        return (QUALITY_RANK.get(rec["quality"], len(QUALITY_RANK)), _distance_km(rec["lat"], rec["lon"]))
+
+    def _select(self, recordings: Iterable[Dict], best: list, seen: set, local: bool) -> bool:
+        """
+        Đưa bản ghi vào heap top-k (best chứa (-rank, id, rec): đỉnh heap là bản ghi kém nhất).
+        Output: True nếu đã đủ k bản ghi chất lượng A (không thể tốt hơn) -> dừng đọc trang.
+        """
+        for raw in recordings:
+            rec = self._compact(raw)
+            if not rec["url"] or rec["id"] in seen:
+                continue
+            seen.add(rec["id"])
+            rank = self._rank(rec)
+            entry = (tuple(-x for x in rank), rec["id"], rec)
+            if len(best) < self.max_recordings:
+                heapq.heappush(best, entry)
+            elif entry > best[0]:
+                heapq.heapreplace(best, entry)
+            if local and len(best) >= self.max_recordings and -best[0][0][0] == QUALITY_RANK["A"]:
+                return True
+        return False
+
+    def _fetch_recordings(self, scientific_name: str) -> Optional[List[Dict]]:
+        best, seen = [], set()
+        if not self._select(self.iter_recordings(self._query(scientific_name, "vietnam")), best, seen, local=True):
+            if len(best) < self.max_recordings:
+                self._select(self.iter_recordings(self._query(scientific_name)), best, seen, local=False)
+        if not best:
+            return None
+        ranked = [rec for _, _, rec in sorted(best, reverse=True)]
+        print(f"      🎵 [Xeno-canto] {scientific_name}: {len(ranked)} recordings "
+              f"(best quality {ranked[0]['quality']}, {ranked[0]['loc']})")
+        return ranked
+
+    def prefetch(self, scientific_names: Iterable[str], workers: int = 4) -> Dict[str, int]:
+        """
+        Nạp sẵn bản ghi của nhiều loài vào response cache, tối đa `workers` loài cùng lúc.
+        scientific_names được đọc dần (không cần nạp cả danh sách vào bộ nhớ).
+        Output: {"species", "with_audio", "failed"}.
+        """
+        stats = {"species": 0, "with_audio": 0, "failed": 0}
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="xenocanto") as pool:
+            queue = iter(scientific_names)
+            in_flight = {}
+
+            def submit_next():
+                name = next(queue, None)
+                if name is not None:
+                    in_flight[pool.submit(self.get_audio, name)] = name
+
+            for _ in range(workers):
+                submit_next()
+
+            while in_flight:
+                finished, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    in_flight.pop(future)
+                    stats["species"] += 1
+                    try:
+                        recordings = future.result()
+                    except Exception:
+                        recordings = None
+                    if recordings:
+                        stats["with_audio"] += 1
+                    else:
+                        stats["failed"] += 1
+                    submit_next()
+        print(f"✅ [Xeno-canto] Prefetch done: {stats}")
+        return stats
+
+
+if __name__ == "__main__":
+    from src.data_loaders.wikidata import WikidataFetcher
+    from src.ingest import read_species_list
+
+    parser = argparse.ArgumentParser(description="Prefetch Xeno-canto recordings for a species checklist")
+    parser.add_argument("species_file")
+    parser.add_argument("--workers", type=int, default=Config.XENO_CANTO_PREFETCH_WORKERS)
+    args = parser.parse_args()
+
+    wikidata = WikidataFetcher()
+
+    def scientific_names():
+        for common_name, sci_name in read_species_list(args.species_file):
+            sci_name = sci_name or wikidata.get_scientific_name(common_name)
+            if sci_name:
+                yield sci_name
+
+    XenoCantoFetcher().prefetch(scientific_names(), workers=args.workers)
@@ -0,0 +1,211 @@
+import re
+import threading
+import unicodedata
+from typing import Dict, Iterable, List, Optional
+
+# Các thuộc tính "theo tập" của loài chim, chuẩn hoá thành khoá cố định (node Habitat / Diet / Status
+# trong Graph) từ dữ liệu sinh thái ADW + trạng thái IUCN, và nhận diện trong câu hỏi để trả lời
+# câu dạng "các loài chim nguy cấp sống ở rừng ngập mặn" bằng MỘT truy vấn Cypher (find_birds).
+#
+# key -> (tên tiếng Anh, tên tiếng Việt, từ khoá tiếng Anh (nhãn ADW / câu hỏi), cụm từ tiếng Việt).
+# Cụm dài được khớp trước: "rừng ngập mặn" -> mangrove (không tính thêm "rừng" -> forest).
+HABITATS = {
+    "forest": ("Forest", "Rừng", ("forest", "rainforest", "woodland", "jungle"), ("rừng", "rừng rậm")),
+    "mangrove": ("Mangrove", "Rừng ngập mặn", ("mangrove",), ("rừng ngập mặn", "ngập mặn", "rừng đước")),
+    "scrub": ("Scrubland", "Cây bụi", ("scrub forest", "scrub", "scrubland", "shrubland", "chaparral"),
+              ("cây bụi", "bụi rậm", "trảng cây bụi")),
+    "grassland": ("Grassland", "Đồng cỏ", ("grassland", "savanna or grassland", "savanna", "meadow"),
+                  ("đồng cỏ", "trảng cỏ", "thảo nguyên")),
+    "wetland": ("Wetland", "Đầm lầy", ("wetland", "marsh", "swamp", "bog"),
+                ("đầm lầy", "vùng ngập nước", "đất ngập nước")),
+    "freshwater": ("Freshwater", "Sông hồ nước ngọt",
+                   ("freshwater", "lakes and ponds", "rivers and streams", "lake", "river", "pond", "stream"),
+                   ("nước ngọt", "sông", "suối", "ao hồ", "hồ nước", "sông hồ")),
+    "coastal": ("Coastal", "Ven biển", ("coastal", "intertidal or littoral", "estuarine", "estuary", "beach",
+                                        "shore", "coast"),
+                ("ven biển", "bờ biển", "bãi biển", "cửa sông", "bãi triều")),
+    "marine": ("Marine", "Biển", ("saltwater or marine", "marine", "ocean", "sea", "sea ice", "pelagic", "reef"),
+               ("biển", "đại dương", "biển khơi", "hải đảo")),
+    "agricultural": ("Farmland", "Đồng ruộng", ("agricultural", "farmland", "rice field", "paddy"),
+                     ("đồng ruộng", "ruộng", "ruộng lúa", "nông nghiệp")),
+    "urban": ("Urban", "Đô thị", ("urban", "suburban", "city", "cities", "garden", "park"),
+              ("thành phố", "đô thị", "thành thị", "khu dân cư", "công viên")),
+    "mountains": ("Mountains", "Vùng núi", ("mountains", "mountain", "montane"), ("núi", "vùng núi", "đồi núi")),
+    "desert": ("Desert", "Sa mạc", ("desert or dune", "desert", "dune"), ("sa mạc",)),
+}
+
+# "Carnivore" của ADW bao cả loài ăn cá / côn trùng nên không gán khoá; dùng danh sách thức ăn cụ thể
+DIETS = {
+    "insects": ("Insects", "Côn trùng", ("insectivore", "insect"), ("côn trùng", "sâu bọ", "ăn sâu")),
+    "fish": ("Fish", "Cá", ("piscivore", "fish"), ("ăn cá", "bắt cá", "cá nhỏ")),
+    "vertebrates": ("Small vertebrates", "Động vật có xương sống nhỏ",
+                    ("eats terrestrial vertebrates", "terrestrial vertebrates", "reptile", "amphibian",
+                     "mammal", "rodent"),
+                    ("ăn thịt", "bò sát", "lưỡng cư", "thú nhỏ", "chuột", "ếch")),
+    "invertebrates": ("Other invertebrates", "Động vật không xương sống khác",
+                      ("terrestrial non-insect arthropods", "arthropod", "worm", "mollusk", "mollusc", "snail",
+                       "crustacean", "krill", "squid", "spider"),
+                      ("giun", "ốc", "nhuyễn thể", "giáp xác", "tôm", "cua", "nhện")),
+    "fruit": ("Fruit", "Quả", ("frugivore", "fruit"), ("ăn quả", "ăn trái", "trái cây", "hoa quả", "quả mọng")),
+    "seeds": ("Seeds", "Hạt", ("granivore", "seeds, grains, and nuts", "seed", "grain", "nut"),
+              ("ăn hạt", "hạt", "ngũ cốc")),
+    "nectar": ("Nectar", "Mật hoa", ("nectarivore", "nectar", "pollen"), ("mật hoa", "hút mật")),
+    "plants": ("Plants", "Thực vật", ("herbivore", "folivore", "leaves", "leaf", "flower", "algae", "grass"),
+               ("ăn lá", "ăn cỏ", "thực vật")),
+    "omnivore": ("Omnivore", "Ăn tạp", ("omnivore", "omnivorous"), ("ăn tạp",)),
+}
+
+# Hạng IUCN: code -> (tên, tên tiếng Việt, mức đe doạ); DD / NE không xếp mức
+STATUSES = {
+    "LC": ("Least Concern", "Ít quan tâm", 0),
+    "NT": ("Near Threatened", "Sắp bị đe dọa", 1),
+    "VU": ("Vulnerable", "Sắp nguy cấp", 2),
+    "EN": ("Endangered", "Nguy cấp", 3),
+    "CR": ("Critically Endangered", "Cực kỳ nguy cấp", 4),
+    "EW": ("Extinct in the Wild", "Tuyệt chủng trong tự nhiên", 5),
+    "EX": ("Extinct", "Tuyệt chủng", 6),
+    "DD": ("Data Deficient", "Thiếu dữ liệu", None),
+    "NE": ("Not Evaluated", "Chưa đánh giá", None),
+}
+
+# Cụm từ trong câu hỏi -> các hạng thoả mãn ("nguy cấp" hiểu là từ Nguy cấp trở lên)
+STATUS_PHRASES = {
+    "cực kỳ nguy cấp": ("CR",), "critically endangered": ("CR",),
+    "sắp nguy cấp": ("VU",), "vulnerable": ("VU",),
+    "nguy cấp": ("EN", "CR"), "endangered": ("EN", "CR"),
+    "sắp bị đe dọa": ("NT",), "near threatened": ("NT",),
+    "bị đe dọa": ("VU", "EN", "CR"), "có nguy cơ tuyệt chủng": ("VU", "EN", "CR"),
+    "threatened": ("VU", "EN", "CR"), "quý hiếm": ("VU", "EN", "CR"),
+    "ít quan tâm": ("LC",), "least concern": ("LC",),
+    "tuyệt chủng trong tự nhiên": ("EW",), "extinct in the wild": ("EW",),
+    "đã tuyệt chủng": ("EX", "EW"), "extinct": ("EX", "EW"),
+}
+
+# Câu hỏi hỏi về một TẬP loài ("các loài chim ...", "những loài nào ...", "which birds ...")
+SET_QUERY_PATTERN = re.compile(
+    r"(?<!\w)(các|những|mọi|tất cả|bao nhiêu|liệt kê)\s+(các\s+)?(loài|con|giống)(?!\w)|"
+    r"\b(which|what|list|all|how many)\b[^?]*\b(birds|bird species)\b|"
+    r"\b(birds|species)\s+(that|which|in|of|living|found)\b",
+    re.IGNORECASE
+)
+
+# Dấu thanh kiểu cũ -> kiểu mới ("doạ" -> "dọa", "hoà" -> "hòa") để khớp cả hai cách gõ
+_TONE_STYLE = {"oà": "òa", "oá": "óa", "oả": "ỏa", "oã": "õa", "oạ": "ọa",
+               "oè": "òe", "oé": "óe", "oẻ": "ỏe", "oẽ": "õe", "oẹ": "ọe",
+               "uỳ": "ùy", "uý": "úy", "uỷ": "ủy", "uỹ": "ũy", "uỵ": "ụy"}
+_TONE_PATTERN = re.compile("|".join(_TONE_STYLE))
+
+
+def normalize(text: str) -> str:
+    """Chữ thường, Unicode NFC, một dấu cách, dấu thanh kiểu mới."""
+    text = unicodedata.normalize("NFC", " ".join(str(text).lower().split()))
+    return _TONE_PATTERN.sub(lambda m: _TONE_STYLE[m.group(0)], text)
+
+
+class Vocabulary:
+    """Cụm từ -> giá trị; khớp theo từ (cả dạng số nhiều -s / -es), cụm dài trước, không chồng nhau."""
+    def __init__(self, phrases: Dict[str, object] = None):
+        self._phrases = {}
+        self._pattern = None
+        self.add(phrases or {})
+
+    def add(self, phrases: Dict[str, object]):
+        self._phrases.update((normalize(p), v) for p, v in phrases.items() if p)
+        if self._phrases:
+            alternatives = "|".join(re.escape(p) for p in sorted(self._phrases, key=len, reverse=True))
+            self._pattern = re.compile(rf"(?<!\w)({alternatives})(?:s|es)?(?!\w)")
+
+    def find(self, text: str) -> List:
+        """Các giá trị khớp trong text, theo thứ tự xuất hiện, không trùng."""
+        if not text or self._pattern is None:
+            return []
+        values = []
+        for match in self._pattern.finditer(normalize(text)):
+            value = self._phrases[match.group(1)]
+            if value not in values:
+                values.append(value)
+        return values
+
+
+def _vocabulary(entries: Dict[str, tuple]) -> Vocabulary:
+    return Vocabulary({term: key for key, (_, _, en, vi) in entries.items() for term in en + vi})
+
+
+HABITAT_VOCABULARY = _vocabulary(HABITATS)
+DIET_VOCABULARY = _vocabulary(DIETS)
+STATUS_VOCABULARY = Vocabulary(STATUS_PHRASES)
+
+
+def _nodes(keys: Iterable[str], entries: Dict[str, tuple]) -> List[Dict]:
+    return [{"key": key, "name": entries[key][0], "name_vi": entries[key][1]} for key in keys]
+
+
+def habitat_nodes(text: str) -> List[Dict]:
+    """'Open woodland, Gardens, Urban areas' -> [{key: 'forest', ...}, {key: 'urban', ...}]."""
+    return _nodes(HABITAT_VOCABULARY.find(text), HABITATS)
+
+
+def diet_nodes(text: str) -> List[Dict]:
+    """'Piscivore (Small fish, Aquatic insects)' -> [{key: 'fish', ...}, {key: 'insects', ...}]."""
+    return _nodes(DIET_VOCABULARY.find(text), DIETS)
+
+
+def status_node(status_text: str) -> Optional[Dict]:
+    """'Endangered (Nguy cấp)' hoặc 'EN' -> {code: 'EN', name, name_vi, rank}; không nhận ra -> None."""
+    if not status_text:
+        return None
+    text = status_text.strip()
+    code = text.upper() if text.upper() in STATUSES else None
+    if code is None:
+        # Tên dài trước: "Critically Endangered" trước "Endangered", "Extinct in the Wild" trước "Extinct"
+        for candidate, (name, _, _) in sorted(STATUSES.items(), key=lambda item: len(item[1][0]), reverse=True):
+            if text.lower().startswith(name.lower()):
+                code = candidate
+                break
+    if code is None:
+        return None
+    name, name_vi, rank = STATUSES[code]
+    return {"code": code, "name": name, "name_vi": name_vi, "rank": rank}
+
+
+class FacetParser:
+    """
+    Nhận diện điều kiện theo tập trong câu hỏi, không tốn LLM:
+    sinh cảnh, thức ăn, mức bảo tồn (từ điển cố định) và họ / bộ (tên lấy từ Graph, add_taxa).
+    Output của parse: {habitats, diets, statuses, families, orders} (tham số của find_birds),
+    hoặc None nếu câu hỏi không hỏi về một tập loài / không có điều kiện nào.
+    """
+    def __init__(self, taxa: Iterable[Dict] = ()):
+        self._taxa = Vocabulary()
+        self._lock = threading.Lock()
+        self.add_taxa(taxa)
+
+    def add_taxa(self, taxa: Iterable[Dict]):
+        """taxa: [{rank: 'family' | 'order', name: 'Alcedinidae', name_vi: 'Họ Bói cá'}]."""
+        phrases = {}
+        for taxon in taxa:
+            if not taxon or not taxon.get("name"):
+                continue
+            value = ("families" if taxon.get("rank") == "family" else "orders", taxon["name"])
+            phrases[taxon["name"]] = value
+            label = taxon.get("name_vi")
+            if label:
+                prefix = "họ" if value[0] == "families" else "bộ"
+                phrases[label if normalize(label).startswith(prefix + " ") else f"{prefix} {label}"] = value
+        if phrases:
+            with self._lock:
+                self._taxa.add(phrases)
+
+    def parse(self, question: str) -> Optional[Dict]:
+        if not question or not SET_QUERY_PATTERN.search(question):
+            return None
+        facets = {
+            "habitats": HABITAT_VOCABULARY.find(question),
+            "diets": DIET_VOCABULARY.find(question),
+            "statuses": sorted({code for codes in STATUS_VOCABULARY.find(question) for code in codes}),
+            "families": [],
+            "orders": [],
+        }
+        for kind, name in self._taxa.find(question):
+            facets[kind].append(name)
+        return facets if any(facets.values()) else None
@@ -0,0 +1,141 @@
+import hashlib
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Callable, List, Optional
+
+import numpy as np
+
+
+class EmbeddingService:
+    """
+    Lớp bọc model embedding (HuggingFaceEmbeddings):
+    - Cache vector theo hash nội dung -> summary không đổi thì không bao giờ embed lại.
+      Hash gồm cả namespace (model + backend): đổi model không dùng lại vector của model cũ.
+    - Vector lưu dạng float32 (numpy) trong RAM và BLOB float32 trong SQLite.
+    - embed_documents gom các text chưa có trong cache và chạy theo batch.
+    Dùng chung cho ingest (embed summary) và truy vấn (embed câu hỏi). Chỉ vector tài liệu
+    được ghi xuống SQLite; vector câu hỏi chỉ giữ trong LRU bộ nhớ (mỗi câu hỏi mới không
+    tốn một lần commit, và bảng trên đĩa chỉ lớn theo số mô tả loài).
+    """
+    def __init__(self, model=None, model_factory: Optional[Callable] = None,
+                 cache_path: Optional[str] = None, batch_size: int = 32,
+                 max_memory_entries: int = 10000, namespace: str = ""):
+        # model_factory: tải model lười ở lần embed đầu tiên (hoặc khi gọi warm_up)
+        self._model = model
+        self._model_factory = model_factory
+        self._model_lock = threading.Lock()
+        self.namespace = namespace
+        self.batch_size = batch_size
+        self.max_memory_entries = max_memory_entries
+        self._memory = OrderedDict()   # hash -> np.ndarray(float32)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+        self._conn = None
+        if cache_path:
+            if os.path.dirname(cache_path):
+                os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+            self._conn = sqlite3.connect(cache_path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings (hash TEXT PRIMARY KEY, dim INTEGER, vector BLOB)"
+            )
+            self._conn.commit()
+
+    @property
+    def model(self):
+        if self._model is None:
+            with self._model_lock:
+                if self._model is None:
+                    self._model = self._model_factory()
+        return self._model
+
+    def warm_up(self):
+        """Tải model ngay (vd trong thread khởi động) để request đầu không phải chờ."""
+        return self.model
+
+    def content_hash(self, text: str) -> str:
+        return hashlib.sha1(f"{self.namespace}\0{text}".encode("utf-8")).hexdigest()
+
+    def _remember(self, key: str, vector: np.ndarray):
+        """Gọi khi đang giữ lock."""
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+
+    def _lookup(self, keys: List[str], persisted: bool = True) -> dict:
+        """persisted=False: chỉ tra LRU bộ nhớ (vector câu hỏi không bao giờ có trong SQLite)."""
+        found = {}
+        with self._lock:
+            for key in keys:
+                if key in self._memory:
+                    self._memory.move_to_end(key)
+                    found[key] = self._memory[key]
+            missing = [k for k in keys if k not in found]
+            if missing and persisted and self._conn is not None:
+                for i in range(0, len(missing), 500):
+                    chunk = missing[i:i + 500]
+                    rows = self._conn.execute(
+                        f"SELECT hash, vector FROM embeddings WHERE hash IN ({','.join('?' * len(chunk))})",
+                        chunk
+                    ).fetchall()
+                    for key, blob in rows:
+                        vector = np.frombuffer(blob, dtype=np.float32)
+                        found[key] = vector
+                        self._remember(key, vector)
+        return found
+
+    def _store(self, items: dict, persist: bool = True):
+        with self._lock:
+            for key, vector in items.items():
+                self._remember(key, vector)
+            if persist and self._conn is not None:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO embeddings (hash, dim, vector) VALUES (?, ?, ?)",
+                    [(key, len(v), v.tobytes()) for key, v in items.items()]
+                )
+                self._conn.commit()
+
+    def embed_documents(self, texts: List[str]) -> List[np.ndarray]:
+        keys = [self.content_hash(t) for t in texts]
+        found = self._lookup(list(dict.fromkeys(keys)))
+
+        # Chỉ embed các text chưa có trong cache (mỗi nội dung một lần), theo batch
+        todo = {k: t for k, t in zip(keys, texts) if k not in found}
+        with self._lock:
+            self.hits += len(texts) - len(todo)
+            self.misses += len(todo)
+        todo_keys = list(todo)
+        for i in range(0, len(todo_keys), self.batch_size):
+            batch = todo_keys[i:i + self.batch_size]
+            vectors = self.model.embed_documents([todo[k] for k in batch])
+            computed = {k: np.asarray(v, dtype=np.float32) for k, v in zip(batch, vectors)}
+            self._store(computed)
+            found.update(computed)
+
+        return [found[k] for k in keys]
+
+    def embed_query(self, text: str) -> np.ndarray:
+        key = self.content_hash(text)
+        cached = self._lookup([key], persisted=False)
+        with self._lock:
+            if key in cached:
+                self.hits += 1
+                return cached[key]
+            self.misses += 1
+        vector = np.asarray(self.model.embed_query(text), dtype=np.float32)
+        self._store({key: vector}, persist=False)
+        return vector
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "memory_entries": len(self._memory),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
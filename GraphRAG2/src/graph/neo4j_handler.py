@@ -1,20 +1,320 @@
+import threading
+
 from neo4j import GraphDatabase
-from langchain_huggingface import HuggingFaceEmbeddings
 from src.config import Config
+from src.facets import diet_nodes, habitat_nodes, status_node
+from src.graph.embedding_service import EmbeddingService
+from src.utils import TTLCache
+
+
+def load_embedding_model():
+    """
+    Tải model Config.EMBEDDING_MODEL (mặc định all-MiniLM-L6-v2). Import ở đây (không phải đầu file) vì
+    sentence-transformers/torch rất nặng, chỉ nên tải khi thật sự cần.
+    EMBEDDING_BACKEND: 'torch' (mặc định), 'onnx', hoặc 'onnx-int8' (ONNX lượng tử hoá).
+    """
+    from langchain_huggingface import HuggingFaceEmbeddings
+
+    model_kwargs = {}
+    if Config.EMBEDDING_BACKEND == "onnx":
+        model_kwargs = {"backend": "onnx"}
+    elif Config.EMBEDDING_BACKEND == "onnx-int8":
+        model_kwargs = {"backend": "onnx", "model_kwargs": {"file_name": Config.EMBEDDING_ONNX_FILE}}
+
+    print(f"   ⏳ Loading Embedding Model ({Config.EMBEDDING_MODEL}, {Config.EMBEDDING_BACKEND})...")
+    return HuggingFaceEmbeddings(model_name=Config.EMBEDDING_MODEL, model_kwargs=model_kwargs)
+
+
+def embedding_namespace() -> str:
+    """Model + backend đang dùng: tách cache vector của các model / backend khác nhau."""
+    backend = Config.EMBEDDING_BACKEND
+    if backend == "onnx-int8":
+        backend = f"{backend}:{Config.EMBEDDING_ONNX_FILE}"
+    return f"{Config.EMBEDDING_MODEL}|{backend}"
+
+# Các cột context dùng chung cho read_bird, semantic_search và BirdEnrichment.commit
+# (biến b, w, i, e phải được MATCH trước đó, audio = list node Audio theo rank, xem AUDIO_COLLECT)
+CONTEXT_FIELDS = """
+               b.common_name as Name,
+               b.scientific_name as ScientificName,
+               b.image_url as ImageURL,  // <--- Lấy ảnh
+               b.mass as Mass,           // <--- Lấy cân nặng
+               w.summary as Description,
+               audio[0].url as AudioURL,
+               i.status as ConservationStatus,
+               e.diet as Diet,
+               e.habitat as Habitat,
+               head([(b)-[:IN_FAMILY]->(f:Family) | coalesce(f.name_vi, f.name)]) as Family
+"""
+CONTEXT_PROJECTION = "\n        RETURN " + CONTEXT_FIELDS
+
+# Mỗi loài có nhiều node Audio (các bản ghi Xeno-canto tốt nhất, rank 0 = tốt nhất):
+# gom thành list `audio` theo rank, giữ nguyên các biến {carry} để dùng tiếp.
+AUDIO_COLLECT = """
+        OPTIONAL MATCH (b)-[:HAS_SOUND]->(a:Audio)
+        WITH {carry}, a ORDER BY a.rank
+        WITH {carry}, collect(a) AS audio"""
+
+# Ghi toàn bộ dữ liệu làm giàu của một hoặc nhiều loài trong MỘT câu Cypher.
+# Mỗi row: {sci, common, image_url, mass, wikidata_id, wikidata_revid,
+#            family: [..], wiki: [..], audio: [..], status: [..], ecology: [..]}
+# Các list rỗng -> FOREACH bỏ qua phần nào không có dữ liệu. audio có thể nhiều phần tử:
+# bộ bản ghi mới thay hẳn bộ cũ (xoá node Audio không còn trong danh sách, kể cả link tìm kiếm cũ).
+# Mỗi node ghi kèm nguồn gốc để làm mới sau này (src/refresh.py): fetched_at (ms) + revision
+# của nguồn (Wikidata lastrevid, Wikipedia revid, phiên bản Red List, ETag của trang ADW).
+# wiki có summary = None: chỉ cập nhật revision, giữ nguyên summary + embedding.
+# Mô hình nhiều bước cho truy vấn theo tập (find_birds), mỗi lần ghi thay hẳn liên kết cũ:
+#   (Bird)-[:IN_FAMILY]->(Family)-[:IN_ORDER]->(Order)     từ Wikidata P171
+#   (Bird)-[:IN_HABITAT]->(Habitat), (Bird)-[:EATS]->(Diet) chuẩn hoá từ dữ liệu sinh thái (src/facets.py)
+#   (Bird)-[:HAS_CATEGORY]->(Status)                       hạng IUCN
+ENRICH_QUERY = """
+        UNWIND $rows AS row
+        MERGE (b:Bird {scientific_name: row.sci})
+        ON CREATE SET b.checked_at = timestamp()
+        SET b.common_name = COALESCE(b.common_name, row.common),
+            b.image_url = COALESCE(row.image_url, b.image_url),
+            b.mass = COALESCE(row.mass, b.mass),
+            b.wikidata_id = COALESCE(row.wikidata_id, b.wikidata_id),
+            b.wikidata_revid = COALESCE(row.wikidata_revid, b.wikidata_revid),
+            b.fetched_at = CASE WHEN row.wikidata_id IS NULL THEN b.fetched_at ELSE timestamp() END
+        FOREACH (x IN row.family |
+            MERGE (f:Family {name: x.name})
+            SET f.name_vi = COALESCE(x.name_vi, f.name_vi)
+            FOREACH (old IN [(b)-[link:IN_FAMILY]->(:Family) | link] | DELETE old)
+            MERGE (b)-[:IN_FAMILY]->(f)
+            FOREACH (y IN x.order |
+                MERGE (o:Order {name: y.name})
+                SET o.name_vi = COALESCE(y.name_vi, o.name_vi)
+                MERGE (f)-[:IN_ORDER]->(o)))
+        FOREACH (x IN row.wiki |
+            MERGE (w:WikiInfo {bird_id: row.sci})
+            SET w.summary = COALESCE(x.summary, w.summary),
+                w.embedding = COALESCE(x.embedding, w.embedding),
+                w.lang = COALESCE(x.lang, w.lang), w.pageid = COALESCE(x.pageid, w.pageid),
+                w.revid = COALESCE(x.revid, w.revid), w.fetched_at = timestamp()
+            MERGE (b)-[:HAS_INFO]->(w))
+        FOREACH (old IN CASE WHEN size(row.audio) > 0
+                             THEN [(b)-[:HAS_SOUND]->(o:Audio)
+                                   WHERE NOT coalesce(o.recording_id, '') IN [x IN row.audio | x.id] | o]
+                             ELSE [] END |
+            DETACH DELETE old)
+        FOREACH (x IN row.audio |
+            MERGE (a:Audio {recording_id: x.id})
+            SET a.bird_id = row.sci, a.url = x.url, a.quality = x.quality, a.rank = x.rank,
+                a.lat = x.lat, a.lon = x.lon, a.length = x.length, a.loc = x.loc
+            MERGE (b)-[:HAS_SOUND]->(a))
+        FOREACH (x IN row.status |
+            MERGE (i:IUCN {bird_id: row.sci})
+            SET i.status = x.status, i.version = COALESCE(x.version, i.version), i.fetched_at = timestamp()
+            MERGE (b)-[:HAS_STATUS]->(i)
+            FOREACH (old IN [(b)-[link:HAS_CATEGORY]->(:Status) | link] | DELETE old)
+            FOREACH (c IN x.category |
+                MERGE (s:Status {code: c.code})
+                ON CREATE SET s.name = c.name, s.name_vi = c.name_vi, s.rank = c.rank
+                MERGE (b)-[:HAS_CATEGORY]->(s)))
+        FOREACH (x IN row.ecology |
+            MERGE (e:Ecology {bird_id: row.sci})
+            SET e.diet = x.diet, e.habitat = x.habitat, e.migration = x.migration,
+                e.etag = x.etag, e.last_modified = x.last_modified, e.fetched_at = timestamp()
+            MERGE (b)-[:HAS_ECOLOGY]->(e)
+            FOREACH (old IN [(b)-[link:IN_HABITAT|EATS]->() | link] | DELETE old)
+            FOREACH (h IN x.habitats |
+                MERGE (hab:Habitat {key: h.key})
+                ON CREATE SET hab.name = h.name, hab.name_vi = h.name_vi
+                MERGE (b)-[:IN_HABITAT]->(hab))
+            FOREACH (d IN x.diets |
+                MERGE (diet:Diet {key: d.key})
+                ON CREATE SET diet.name = d.name, diet.name_vi = d.name_vi
+                MERGE (b)-[:EATS]->(diet)))
+"""
+
+# Đọc gộp: cờ "đã có dữ liệu gì" + context đầy đủ của một hoặc nhiều loài trong MỘT query.
+# OPTIONAL MATCH (mỗi quan hệ một lần mở rộng) thay cho các predicate EXISTS(),
+# vì các node đó đằng nào cũng phải đọc để lấy context.
+READ_BIRDS_QUERY = """
+        UNWIND $scis AS sci
+        MATCH (b:Bird {scientific_name: sci})
+        OPTIONAL MATCH (b)-[:HAS_INFO]->(w:WikiInfo)
+        OPTIONAL MATCH (b)-[:HAS_STATUS]->(i:IUCN)
+        OPTIONAL MATCH (b)-[:HAS_ECOLOGY]->(e:Ecology)""" + AUDIO_COLLECT.format(carry="b, w, i, e") + """
+        RETURN w IS NOT NULL AS has_wiki,
+               size(audio) > 0 AS has_audio,
+               i IS NOT NULL AS has_status,
+               e IS NOT NULL AS has_ecology,
+""" + CONTEXT_FIELDS
+READ_FLAGS = ("has_wiki", "has_audio", "has_status", "has_ecology")
+
+ENRICH_RETURN_CONTEXT = """
+        WITH b
+        OPTIONAL MATCH (b)-[:HAS_INFO]->(w:WikiInfo)
+        OPTIONAL MATCH (b)-[:HAS_STATUS]->(i:IUCN)
+        OPTIONAL MATCH (b)-[:HAS_ECOLOGY]->(e:Ecology)""" + AUDIO_COLLECT.format(carry="b, w, i, e") + CONTEXT_PROJECTION
+
+# Truy vấn theo tập (find_birds): mỗi điều kiện một MATCH từ node có ràng buộc unique (tra bằng index)
+# về Bird; nhiều giá trị trong một điều kiện = HOẶC, các điều kiện = VÀ. Planner chọn điểm xuất phát
+# chọn lọc nhất (vd họ / hạng IUCN) rồi chỉ kiểm tra liên kết của các loài đó, không quét mọi Bird.
+FACET_MATCHES = {
+    "families": "MATCH (b:Bird)-[:IN_FAMILY]->(f:Family) WHERE f.name IN $families",
+    "orders": "MATCH (b:Bird)-[:IN_FAMILY]->(:Family)-[:IN_ORDER]->(o:Order) WHERE o.name IN $orders",
+    "statuses": "MATCH (b:Bird)-[:HAS_CATEGORY]->(s:Status) WHERE s.code IN $statuses",
+    "habitats": "MATCH (b:Bird)-[:IN_HABITAT]->(h:Habitat) WHERE h.key IN $habitats",
+    "diets": "MATCH (b:Bird)-[:EATS]->(d:Diet) WHERE d.key IN $diets",
+}
+# Loài bị đe doạ nhiều nhất trước; chỉ đọc context của $limit loài đầu, vẫn trả tổng số loài khớp
+FIND_BIRDS_RETURN = """
+        WITH DISTINCT b
+        OPTIONAL MATCH (b)-[:HAS_CATEGORY]->(st:Status)
+        WITH b, st ORDER BY coalesce(st.rank, -1) DESC, b.common_name
+        WITH collect(b) AS birds
+        WITH size(birds) AS total, birds[..$limit] AS birds
+        UNWIND range(0, size(birds) - 1) AS position
+        WITH total, position, birds[position] AS b
+        OPTIONAL MATCH (b)-[:HAS_INFO]->(w:WikiInfo)
+        OPTIONAL MATCH (b)-[:HAS_STATUS]->(i:IUCN)
+        OPTIONAL MATCH (b)-[:HAS_ECOLOGY]->(e:Ecology)""" + AUDIO_COLLECT.format(carry="total, position, b, w, i, e") + """
+        RETURN total AS Total, position AS Position, """ + CONTEXT_FIELDS + """
+        ORDER BY Position
+"""
+
+
+class BirdEnrichment:
+    """
+    Unit of work: gom mọi dữ liệu làm giàu của một loài (ảnh, cân nặng, wiki,
+    âm thanh, IUCN, sinh thái) rồi ghi trong một transaction duy nhất.
+    """
+    def __init__(self, handler, scientific_name, common_name=None):
+        self.handler = handler
+        self.row = {
+            "sci": scientific_name, "common": common_name,
+            "image_url": None, "mass": None, "wikidata_id": None, "wikidata_revid": None,
+            "family": [], "wiki": [], "audio": [], "status": [], "ecology": []
+        }
+
+    def set_details(self, image_url, mass, wikidata_id=None, revid=None, family=None, order=None):
+        """family / order: {name (tên khoa học), name_vi} từ Wikidata P171 (bộ chỉ ghi khi biết họ)."""
+        self.row["image_url"] = image_url
+        self.row["mass"] = mass
+        self.row["wikidata_id"] = wikidata_id
+        self.row["wikidata_revid"] = revid
+        if family and family.get("name"):
+            self.row["family"] = [dict(family, order=[order] if order and order.get("name") else [])]
+        return self
+
+    def set_wiki(self, summary, embedding=None, revision=None):
+        """
+        embedding: vector đã tính sẵn (vd embed theo batch khi ingest); None -> tự embed.
+        revision: trang nguồn {lang, pageid, revid} (WikipediaFetcher.get_page).
+        """
+        if summary:
+            vector = embedding if embedding is not None else self.handler.embeddings.embed_documents([summary])[0]
+            # Vector float32 (numpy) -> list để driver Neo4j gửi đi được
+            self.row["wiki"] = [dict(self._revision(revision), summary=summary,
+                                     embedding=[float(x) for x in vector])]
+        return self
+
+    def set_wiki_revision(self, revision):
+        """Trang đã có revision mới nhưng đoạn mở đầu không đổi: chỉ ghi revision, không embed lại."""
+        self.row["wiki"] = [dict(self._revision(revision), summary=None, embedding=None)]
+        return self
+
+    @staticmethod
+    def _revision(revision):
+        revision = revision or {}
+        return {"lang": revision.get("lang"), "pageid": revision.get("pageid"), "revid": revision.get("revid")}
+
+    def set_audio(self, recordings):
+        """
+        recordings: list bản ghi của XenoCantoFetcher.get_audio (tốt nhất trước), hoặc một URL
+        (một bản ghi duy nhất, tương thích cách gọi cũ). Bộ bản ghi mới thay hẳn bộ cũ khi commit.
+        """
+        if isinstance(recordings, str):
+            recordings = [{"id": recordings, "url": recordings}]
+        audio = []
+        for rank, rec in enumerate(recordings or []):
+            if rec.get("url"):
+                audio.append({"id": str(rec.get("id") or rec["url"]), "url": rec["url"], "rank": rank,
+                              "quality": rec.get("quality"), "lat": rec.get("lat"), "lon": rec.get("lon"),
+                              "length": rec.get("length"), "loc": rec.get("loc")})
+        if audio:
+            self.row["audio"] = audio
+        return self
+
+    def set_status(self, status_text, version=None):
+        """version: phiên bản Red List lúc tải (IUCNFetcher.get_version), nếu biết."""
+        if status_text:
+            category = status_node(status_text)
+            self.row["status"] = [{"status": status_text, "version": version,
+                                   "category": [category] if category else []}]
+        return self
+
+    def set_ecology(self, data):
+        if data:
+            self.row["ecology"] = [{
+                "diet": data.get('diet'),
+                "habitat": data.get('habitat'),
+                "migration": data.get('migration'),
+                "etag": data.get('etag'),
+                "last_modified": data.get('last_modified'),
+                # Khoá chuẩn hoá cho node Habitat / Diet
+                "habitats": habitat_nodes(data.get('habitat')),
+                "diets": diet_nodes(data.get('diet'))
+            }]
+        return self
+
+    def commit(self, return_context=False):
+        """
+        Ghi trong 1 round trip. Nếu return_context=True, trả luôn context đầy đủ
+        (giống get_full_context) trong cùng câu query đó.
+        """
+        query = ENRICH_QUERY + (ENRICH_RETURN_CONTEXT if return_context else "")
+        with self.handler.driver.session() as session:
+            records = session.execute_write(
+                lambda tx: [r.data() for r in tx.run(query, rows=[self.row])]
+            )
+        self.handler._notify_write([self.row["sci"]])
+        if return_context:
+            if not records:
+                return "No data found in graph."
+            # Context vừa đọc trong transaction ghi -> nạp luôn vào read-through cache
+            self.handler._cache_context(self.row["sci"], records[0])
+            return records[0]
+
 
 class Neo4jHandler:
-    def __init__(self):
-        # Kết nối Neo4j
-        self.driver = GraphDatabase.driver(
+    def __init__(self, driver=None, embeddings=None, init_indices=True):
+        # Kết nối Neo4j (cho phép truyền driver/embeddings có sẵn, ví dụ khi benchmark)
+        self.driver = driver or GraphDatabase.driver(
             Config.NEO4J_URI, 
             auth=(Config.NEO4J_USER, Config.NEO4J_PASSWORD)
         )
         
-        # SỬ DỤNG MODEL MIỄN PHÍ
-        print("   ⏳ Loading Embedding Model (all-MiniLM-L6-v2)...")
-        self.embeddings = HuggingFaceEmbeddings(model_name="all-MiniLM-L6-v2")
+        # SỬ DỤNG MODEL MIỄN PHÍ, tải lười: chỉ load khi embed lần đầu
+        # (hoặc khi gọi embeddings.warm_up() ở background lúc khởi động).
+        # Batch + cache theo hash nội dung, dùng chung cho ingest và truy vấn
+        if not isinstance(embeddings, EmbeddingService):
+            embeddings = EmbeddingService(
+                embeddings,
+                model_factory=load_embedding_model,
+                namespace=embedding_namespace(),
+                cache_path=Config.EMBEDDING_CACHE_PATH,
+                batch_size=Config.EMBEDDING_BATCH_SIZE
+            )
+        self.embeddings = embeddings
+
+        # Hàm được gọi sau mỗi lần ghi thành công, với danh sách tên khoa học vừa ghi
+        # (vd xoá cache câu trả lời của các loài đó)
+        self._write_listeners = []
+
+        # Read-through cache của read_bird: sci -> (status, context). Xoá khi chính
+        # process này ghi loài đó; TTL ngắn cho các lần ghi từ process khác (vd ingest).
+        self.context_cache = TTLCache(maxsize=Config.CONTEXT_CACHE_SIZE, ttl=Config.CONTEXT_CACHE_TTL)
+        # sci -> số lần ghi: kết quả đọc xen giữa một lần ghi không được đưa vào cache
+        self._write_generations = {}
+        self._generation_lock = threading.Lock()
         
-        self._init_indices()
+        # init_indices=False: người gọi tự chạy _init_indices (vd song song lúc khởi động)
+        if init_indices:
+            self._init_indices()
 
     def _init_indices(self):
         # Tạo Vector Index với 384 dimensions
@@ -26,124 +326,256 @@ class Neo4jHandler:
             `vector.similarity_function`: 'cosine'
         }}
         """
+        # Ràng buộc unique trên tên khoa học = index cho MATCH/MERGE (b:Bird {scientific_name})
+        constraint = """
+        CREATE CONSTRAINT bird_scientific_name IF NOT EXISTS
+        FOR (b:Bird) REQUIRE b.scientific_name IS UNIQUE
+        """
+        # Mỗi bản ghi Xeno-canto là một node Audio (MERGE theo recording_id)
+        audio_constraint = """
+        CREATE CONSTRAINT audio_recording_id IF NOT EXISTS
+        FOR (a:Audio) REQUIRE a.recording_id IS UNIQUE
+        """
+        # Chọn loài cần làm mới theo thời điểm kiểm tra gần nhất (src/refresh.py)
+        checked_index = """
+        CREATE INDEX bird_checked_at IF NOT EXISTS
+        FOR (b:Bird) ON (b.checked_at)
+        """
+        # Node phân loại / điều kiện theo tập (find_birds): ràng buộc unique = index tra theo khoá
+        facet_constraints = [
+            f"CREATE CONSTRAINT {name} IF NOT EXISTS FOR (n:{label}) REQUIRE n.{key} IS UNIQUE"
+            for name, label, key in (("family_name", "Family", "name"), ("order_name", "Order", "name"),
+                                     ("habitat_key", "Habitat", "key"), ("diet_key", "Diet", "key"),
+                                     ("status_code", "Status", "code"))
+        ]
         with self.driver.session() as session:
             session.run(query)
+            session.run(constraint)
+            session.run(audio_constraint)
+            session.run(checked_index)
+            for facet_constraint in facet_constraints:
+                session.run(facet_constraint)
 
     def close(self):
         self.driver.close()
 
+    def add_write_listener(self, listener):
+        """listener(scientific_names) được gọi sau mỗi transaction ghi dữ liệu loài."""
+        self._write_listeners.append(listener)
+
+    def _notify_write(self, scientific_names):
+        with self._generation_lock:
+            for sci in scientific_names:
+                self._write_generations[sci] = self._write_generations.get(sci, 0) + 1
+                self.context_cache.invalidate(sci)
+        for listener in self._write_listeners:
+            listener(scientific_names)
+
+    def _cache_context(self, scientific_name, context):
+        """Nạp context vừa đọc trong transaction ghi (BirdEnrichment.commit) vào cache."""
+        flags = {
+            "has_wiki": context.get('Description') is not None,
+            "has_audio": context.get('AudioURL') is not None,
+            "has_status": context.get('ConservationStatus') is not None,
+            "has_ecology": context.get('Diet') is not None or context.get('Habitat') is not None,
+        }
+        self.context_cache.set(scientific_name, (self._status(context, flags), context))
+
+    @staticmethod
+    def _status(context, flags):
+        """Cờ kiểu check_data_status từ context + cờ has_* của các node phụ."""
+        return dict(flags, exists=True, common_name=context.get('Name'),
+                    has_image=context.get('ImageURL') is not None,   # Kiểm tra ảnh
+                    has_mass=context.get('Mass') is not None)        # Kiểm tra cân nặng
+
+    def _read_birds(self, scientific_names):
+        """Một round trip Neo4j. Output: {sci: (status, context)} cho các loài có trong Graph."""
+        with self.driver.session() as session:
+            records = [rec.data() for rec in session.run(READ_BIRDS_QUERY, scis=list(scientific_names))]
+        results = {}
+        for data in records:
+            flags = {key: data.pop(key) for key in READ_FLAGS}
+            results.setdefault(data["ScientificName"], (self._status(data, flags), data))
+        return results
+
+    def read_birds(self, scientific_names):
+        """
+        Đọc gộp kiểm tra + context của nhiều loài: Output {sci: (status, context)}, status
+        giống check_data_status, context giống get_full_context (None nếu loài chưa có).
+        Qua read-through cache: chỉ các loài chưa có trong cache được đọc, trong MỘT query UNWIND.
+        """
+        results, missing = {}, []
+        for sci in dict.fromkeys(scientific_names):
+            cached = self.context_cache.get(sci)
+            if cached is not None:
+                results[sci] = cached
+            else:
+                missing.append(sci)
+        if not missing:
+            return results
+
+        with self._generation_lock:
+            generations = {sci: self._write_generations.get(sci, 0) for sci in missing}
+        found = self._read_birds(missing)
+        with self._generation_lock:
+            for sci in missing:
+                results[sci] = found.get(sci, ({"exists": False}, None))
+                if self._write_generations.get(sci, 0) == generations[sci]:
+                    self.context_cache.set(sci, results[sci])
+        return results
+
+    def read_bird(self, scientific_name):
+        """
+        Đọc gộp kiểm tra + context của một loài: Output (status, context).
+        Loài đã đủ dữ liệu và đã đọc gần đây thì không tốn round trip nào.
+        """
+        return self.read_birds([scientific_name])[scientific_name]
+
     def check_data_status(self, scientific_name):
         """Kiểm tra xem dữ liệu đã có những gì (bao gồm Ảnh và Cân nặng)"""
+        return self.read_bird(scientific_name)[0]
+
+    def get_known_common_names(self):
+        """Danh sách tên thường của các loài đã có trong Graph."""
         query = """
-        MATCH (b:Bird {scientific_name: $sci})
-        RETURN b,
-               EXISTS((b)-[:HAS_INFO]->(:WikiInfo)) as has_wiki,
-               EXISTS((b)-[:HAS_SOUND]->(:Audio)) as has_audio,
-               EXISTS((b)-[:HAS_ECOLOGY]->(:Ecology)) as has_ecology,
-               EXISTS((b)-[:HAS_STATUS]->(:IUCN)) as has_status,
-               b.image_url IS NOT NULL as has_image,  // Kiểm tra ảnh
-               b.mass IS NOT NULL as has_mass         // Kiểm tra cân nặng
+        MATCH (b:Bird) WHERE b.common_name IS NOT NULL
+        RETURN collect(DISTINCT toLower(b.common_name)) AS names
         """
         with self.driver.session() as session:
-            res = session.run(query, sci=scientific_name).single()
-            
-            if not res:
-                return {"exists": False}
-            
-            return {
-                "exists": True,
-                "common_name": res['b'].get('common_name'),
-                "has_wiki": res['has_wiki'],
-                "has_audio": res['has_audio'],
-                "has_status": res['has_status'],
-                "has_ecology": res['has_ecology'],
-                "has_image": res['has_image'], # MỚI
-                "has_mass": res['has_mass']    # MỚI
-            }
+            rec = session.run(query).single()
+            return rec['names'] if rec else []
+
+    def begin_enrichment(self, scientific_name, common_name=None):
+        """Bắt đầu một unit of work cho loài; gọi .commit() để ghi tất cả một lần."""
+        return BirdEnrichment(self, scientific_name, common_name)
 
+    def commit_batch(self, units):
+        """Ghi nhiều BirdEnrichment trong một transaction (một câu UNWIND)."""
+        rows = [unit.row for unit in units]
+        if not rows:
+            return
+        with self.driver.session() as session:
+            session.execute_write(lambda tx: tx.run(ENRICH_QUERY, rows=rows).consume())
+        self._notify_write([row["sci"] for row in rows])
+
+    # Các hàm update_* lẻ giữ lại cho tương thích; mỗi hàm là một unit of work nhỏ.
     def update_details(self, scientific_name, image_url, mass):
         """
         HÀM MỚI: Cập nhật thông tin chi tiết (Ảnh + Cân nặng) từ Wikidata
         """
         if not image_url and not mass: return
-
-        query = """
-        MERGE (b:Bird {scientific_name: $sci})
-        SET b.image_url = COALESCE($url, b.image_url),
-            b.mass = COALESCE($mass, b.mass)
-        """
-        with self.driver.session() as session:
-            session.run(query, sci=scientific_name, url=image_url, mass=mass)
+        self.begin_enrichment(scientific_name).set_details(image_url, mass).commit()
 
     def update_wiki(self, scientific_name, common_name, summary):
         if not summary: return
-        vector = self.embeddings.embed_query(summary)
-        query = """
-        MERGE (b:Bird {scientific_name: $sci})
-        SET b.common_name = COALESCE(b.common_name, $common)
-        MERGE (w:WikiInfo {bird_id: $sci})
-        SET w.summary = $summary, w.embedding = $vector
-        MERGE (b)-[:HAS_INFO]->(w)
-        """
-        with self.driver.session() as session:
-            session.run(query, sci=scientific_name, common=common_name, summary=summary, vector=vector)
+        self.begin_enrichment(scientific_name, common_name).set_wiki(summary).commit()
 
     def update_audio(self, scientific_name, audio_url):
         if not audio_url: return
+        self.begin_enrichment(scientific_name).set_audio(audio_url).commit()
+
+    def update_status(self, scientific_name, status_text):
+        if not status_text: return
+        self.begin_enrichment(scientific_name).set_status(status_text).commit()
+
+    def update_ecology(self, scientific_name, data):
+        if not data: return
+        self.begin_enrichment(scientific_name).set_ecology(data).commit()
+
+    def refresh_candidates(self, limit, checked_before, popularity=None):
+        """
+        Các loài cần kiểm tra lại (src/refresh.py): lần kiểm tra gần nhất trước checked_before (ms).
+        Loài được hỏi nhiều (popularity: {sci: điểm}) trước, rồi loài lâu chưa kiểm tra nhất.
+        Output: list {sci, common, wikidata_id, wikidata_revid, wiki_*, has_status, iucn_version, ...}.
+        """
         query = """
-        MATCH (b:Bird {scientific_name: $sci})
-        MERGE (a:Audio {bird_id: $sci})
-        SET a.url = $url
-        MERGE (b)-[:HAS_SOUND]->(a)
+        MATCH (b:Bird)
+        WHERE b.checked_at IS NULL OR b.checked_at < $checked_before
+        WITH b ORDER BY coalesce($popularity[b.scientific_name], 0) DESC, coalesce(b.checked_at, 0)
+        LIMIT $limit
+        OPTIONAL MATCH (b)-[:HAS_INFO]->(w:WikiInfo)
+        OPTIONAL MATCH (b)-[:HAS_STATUS]->(i:IUCN)
+        OPTIONAL MATCH (b)-[:HAS_ECOLOGY]->(e:Ecology)
+        RETURN b.scientific_name AS sci, b.common_name AS common,
+               b.wikidata_id AS wikidata_id, b.wikidata_revid AS wikidata_revid,
+               w.summary AS wiki_summary, w.lang AS wiki_lang,
+               w.pageid AS wiki_pageid, w.revid AS wiki_revid,
+               i IS NOT NULL AS has_status, i.status AS iucn_status, i.version AS iucn_version,
+               e IS NOT NULL AS has_ecology, e.etag AS ecology_etag, e.last_modified AS ecology_last_modified,
+               e.diet AS ecology_diet, e.habitat AS ecology_habitat, e.migration AS ecology_migration,
+               EXISTS { (b)-[:IN_FAMILY]->(:Family) } AS has_family,
+               EXISTS { (b)-[:HAS_CATEGORY]->(:Status) } AS has_category,
+               EXISTS { (b)-[:IN_HABITAT|EATS]->() } AS has_facets
         """
         with self.driver.session() as session:
-            session.run(query, sci=scientific_name, url=audio_url)
+            return [rec.data() for rec in session.run(
+                query, limit=limit, checked_before=checked_before, popularity=popularity or {})]
 
-    def update_status(self, scientific_name, status_text):
-        if not status_text: return
+    def find_birds(self, facets, limit=15):
+        """
+        Truy vấn theo tập trong MỘT câu Cypher. facets: {habitats, diets, statuses, families, orders}
+        (FacetParser.parse). Output: (tổng số loài khớp, context của tối đa `limit` loài, giống
+        get_full_context, loài bị đe doạ nhiều nhất trước).
+        """
+        matches = [FACET_MATCHES[name] for name in FACET_MATCHES if facets.get(name)]
+        if not matches:
+            return 0, []
+        query = "\n        ".join(matches) + FIND_BIRDS_RETURN
+        params = {name: list(facets.get(name) or []) for name in FACET_MATCHES}
+        with self.driver.session() as session:
+            records = [rec.data() for rec in session.run(query, limit=limit, **params)]
+        total = records[0]["Total"] if records else 0
+        contexts = []
+        for data in records:
+            data.pop("Total")
+            data.pop("Position")
+            contexts.append(data)
+        return total, contexts
+
+    def get_taxa(self):
+        """Mọi họ / bộ trong Graph: [{rank: 'family' | 'order', name, name_vi}] (cho FacetParser)."""
         query = """
-        MATCH (b:Bird {scientific_name: $sci})
-        MERGE (i:IUCN {bird_id: $sci})
-        SET i.status = $status
-        MERGE (b)-[:HAS_STATUS]->(i)
+        MATCH (f:Family) RETURN 'family' AS rank, f.name AS name, f.name_vi AS name_vi
+        UNION ALL
+        MATCH (o:Order) RETURN 'order' AS rank, o.name AS name, o.name_vi AS name_vi
         """
         with self.driver.session() as session:
-            session.run(query, sci=scientific_name, status=status_text)
+            return [rec.data() for rec in session.run(query)]
 
-    def update_ecology(self, scientific_name, data):
-        if not data: return
+    def mark_checked(self, scientific_names):
+        """Ghi thời điểm kiểm tra (kể cả khi nguồn không đổi) cho một batch loài, một round trip."""
+        if not scientific_names:
+            return
         query = """
-        MATCH (b:Bird {scientific_name: $sci})
-        MERGE (e:Ecology {bird_id: $sci})
-        SET e.diet = $diet, e.habitat = $habitat, e.migration = $mig
-        MERGE (b)-[:HAS_ECOLOGY]->(e)
+        UNWIND $scis AS sci
+        MATCH (b:Bird {scientific_name: sci})
+        SET b.checked_at = timestamp()
         """
         with self.driver.session() as session:
-            session.run(query, sci=scientific_name, 
-                        diet=data.get('diet'), 
-                        habitat=data.get('habitat'), 
-                        mig=data.get('migration'))
+            session.execute_write(lambda tx: tx.run(query, scis=list(scientific_names)).consume())
 
     def get_full_context(self, scientific_name):
         """Lấy toàn bộ dữ liệu (bao gồm cả Mass và Image) để gửi cho LLM"""
+        context = self.read_bird(scientific_name)[1]
+        return context if context is not None else "No data found in graph."
+
+    def semantic_search(self, question, k=5, vector=None):
+        """
+        Truy vấn vector index bird_desc_index bằng embedding của câu hỏi
+        (vector: embedding đã tính sẵn, None -> tự embed).
+        Output: list context (cùng cột với get_full_context) kèm 'Score', giảm dần theo score.
+        """
+        if vector is None:
+            vector = self.embeddings.embed_query(question)
+        vector = [float(x) for x in vector]
         query = """
-        MATCH (b:Bird {scientific_name: $sci})
-        OPTIONAL MATCH (b)-[:HAS_INFO]->(w:WikiInfo)
-        OPTIONAL MATCH (b)-[:HAS_SOUND]->(a:Audio)
+        CALL db.index.vector.queryNodes('bird_desc_index', $k, $vector)
+        YIELD node AS w, score
+        MATCH (b:Bird)-[:HAS_INFO]->(w)
         OPTIONAL MATCH (b)-[:HAS_STATUS]->(i:IUCN)
-        OPTIONAL MATCH (b)-[:HAS_ECOLOGY]->(e:Ecology)
-        RETURN b.common_name as Name,
-               b.scientific_name as ScientificName,
-               b.image_url as ImageURL,  // <--- Lấy ảnh
-               b.mass as Mass,           // <--- Lấy cân nặng
-               w.summary as Description,
-               a.url as AudioURL,
-               i.status as ConservationStatus,
-               e.diet as Diet,
-               e.habitat as Habitat
+        OPTIONAL MATCH (b)-[:HAS_ECOLOGY]->(e:Ecology)""" + AUDIO_COLLECT.format(carry="score, b, w, i, e") + """
+        RETURN score as Score, """ + CONTEXT_FIELDS + """
+        ORDER BY Score DESC
         """
         with self.driver.session() as session:
-            rec = session.run(query, sci=scientific_name).single()
-            if not rec:
-                return "No data found in graph."
-            return rec.data()
\ No newline at end of file
+            return [rec.data() for rec in session.run(query, k=k, vector=vector)]
@@ -0,0 +1,196 @@
+# Bulk pre-ingestion: nạp sẵn dữ liệu cho cả một danh sách loài (vd checklist chim Việt Nam)
+# để lượt chat thật gần như không bao giờ phải đi đường "lạnh".
+# Chạy: python -m src.ingest checklist.txt --workers 8 --batch-size 32
+#   - checklist: mỗi dòng "tên thường" hoặc "tên thường,tên khoa học"; dòng '#' bị bỏ qua
+#   - chạy lại với cùng --checkpoint sẽ bỏ qua các loài đã nạp xong
+import argparse
+import json
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import List, Optional, Tuple
+
+from src.config import Config
+from src.graph.neo4j_handler import Neo4jHandler
+from src.data_loaders.wikidata import WikidataFetcher
+from src.data_loaders.wikipedia import WikipediaFetcher
+from src.data_loaders.xenocanto import XenoCantoFetcher
+from src.data_loaders.iucn import IUCNFetcher
+from src.data_loaders.birdspedia import BirdspediaFetcher
+
+
+def read_species_list(path: str) -> List[Tuple[str, Optional[str]]]:
+    species = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            parts = [p.strip() for p in line.replace("\t", ",").split(",")]
+            species.append((parts[0], parts[1] if len(parts) > 1 and parts[1] else None))
+    return species
+
+
+class Checkpoint:
+    """File JSONL ghi lại từng loài đã xử lý; loài ok=True được bỏ qua khi chạy lại."""
+    def __init__(self, path: str):
+        self.path = path
+        self.done = set()
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        rec = json.loads(line)
+                    except ValueError:
+                        continue  # dòng ghi dở khi process bị kill
+                    if rec.get("ok"):
+                        self.done.add(rec["name"])
+        elif os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    def mark(self, records: List[dict]):
+        with open(self.path, "a", encoding="utf-8") as f:
+            for rec in records:
+                f.write(json.dumps(rec, ensure_ascii=False) + "\n")
+                if rec.get("ok"):
+                    self.done.add(rec["name"])
+            f.flush()
+            os.fsync(f.fileno())
+
+
+class BulkIngestor:
+    def __init__(self, graph: Neo4jHandler, workers: int = 8, batch_size: int = 32):
+        self.graph = graph
+        self.wikidata = WikidataFetcher()
+        self.wiki = WikipediaFetcher()
+        self.xenocanto = XenoCantoFetcher()
+        self.iucn = IUCNFetcher()
+        self.birdspedia = BirdspediaFetcher()
+        self.workers = workers
+        self.batch_size = batch_size
+
+    def fetch_species(self, common_name: str, sci_name: Optional[str]) -> Optional[dict]:
+        """
+        Chạy trong worker: tải mọi nguồn cho một loài (chưa embed, chưa ghi).
+        Rate limit theo host do client HTTP dùng chung đảm nhận (Config.HTTP_RATE_LIMITS).
+        """
+        details = self.wikidata.get_bird_data(common_name if not sci_name else sci_name) or {}
+        sci_name = sci_name or details.get("scientific_name")
+        if not sci_name:
+            return None
+
+        page = self.wiki.get_page(common_name, lang='vi') or {}
+        status = self.iucn.get_conservation_status(sci_name)
+        audio = self.xenocanto.get_audio(sci_name)
+        ecology = self.birdspedia.fetch_ecology_data(sci_name)
+
+        return {
+            "name": common_name, "sci": sci_name, "details": details,
+            "summary": page.get("summary"), "page": page, "status": status, "audio": audio, "ecology": ecology
+        }
+
+    def _flush(self, fetched: List[dict], checkpoint: Checkpoint):
+        """Embed summary theo batch rồi ghi cả batch bằng một câu UNWIND."""
+        ok = [r for r in fetched if r.get("sci")]
+        with_summary = [r for r in ok if r["summary"]]
+        vectors = self.graph.embeddings.embed_documents([r["summary"] for r in with_summary]) if with_summary else []
+        embedding_of = {id(r): v for r, v in zip(with_summary, vectors)}
+
+        # Loài định danh qua gazetteer chưa có họ / bộ: một câu SPARQL (P171) cho cả batch
+        qids = [r["details"]["wikidata_id"] for r in ok
+                if r["details"].get("wikidata_id") and not r["details"].get("family")]
+        taxonomy = {}
+        if qids:
+            try:
+                taxonomy = self.wikidata.fetch_details(qids)
+            except Exception as e:
+                print(f"⚠️ [Ingest] Taxonomy lookup failed for {len(qids)} species: {e}")
+
+        units = []
+        for r in ok:
+            details = dict(r["details"])
+            taxon = taxonomy.get(details.get("wikidata_id"), {})
+            details["family"] = details.get("family") or taxon.get("family")
+            details["order"] = details.get("order") or taxon.get("order")
+            unit = self.graph.begin_enrichment(r["sci"], r["name"])
+            unit.set_details(details.get("image_url"), details.get("mass"),
+                             wikidata_id=details.get("wikidata_id"), revid=details.get("revid"),
+                             family=details["family"], order=details["order"])
+            unit.set_wiki(r["summary"], embedding=embedding_of.get(id(r)), revision=r["page"])
+            unit.set_status(r["status"])
+            unit.set_audio(r["audio"])
+            unit.set_ecology(r["ecology"])
+            units.append(unit)
+        self.graph.commit_batch(units)
+
+        checkpoint.mark([{"name": r["name"], "sci": r.get("sci"), "ok": bool(r.get("sci"))} for r in fetched])
+
+    def run(self, species: List[Tuple[str, Optional[str]]], checkpoint: Checkpoint) -> dict:
+        todo = [s for s in species if s[0] not in checkpoint.done]
+        print(f"📋 [Ingest] {len(species)} species, {len(species) - len(todo)} already done, {len(todo)} to go")
+
+        started = time.perf_counter()
+        processed = failed = 0
+        pending = []
+        max_in_flight = self.workers * 2
+
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="ingest") as pool:
+            queue = iter(todo)
+            in_flight = {}
+
+            def submit_next():
+                item = next(queue, None)
+                if item is not None:
+                    in_flight[pool.submit(self.fetch_species, *item)] = item
+
+            for _ in range(max_in_flight):
+                submit_next()
+
+            while in_flight:
+                finished, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    name, _ = in_flight.pop(future)
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        print(f"   [Ingest Error] '{name}': {e}")
+                        result = None
+                    if result is None:
+                        failed += 1
+                        result = {"name": name}
+                    pending.append(result)
+                    submit_next()
+
+                if len(pending) >= self.batch_size or (not in_flight and pending):
+                    self._flush(pending, checkpoint)
+                    processed += len(pending)
+                    pending = []
+                    elapsed = time.perf_counter() - started
+                    print(f"   ⚡ [Ingest] {processed}/{len(todo)} species | "
+                          f"{processed / elapsed * 60:.1f} species/min | {failed} unresolved")
+
+        elapsed = time.perf_counter() - started
+        stats = {
+            "processed": processed,
+            "failed": failed,
+            "seconds": round(elapsed, 1),
+            "species_per_minute": round(processed / elapsed * 60, 1) if elapsed else 0.0,
+        }
+        print(f"✅ [Ingest] Done: {stats}")
+        return stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Bulk pre-ingest a species checklist into the graph")
+    parser.add_argument("species_file")
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--checkpoint", default=os.path.join(".cache", "ingest_checkpoint.jsonl"))
+    args = parser.parse_args()
+
+    graph = Neo4jHandler()
+    try:
+        ingestor = BulkIngestor(graph, workers=args.workers, batch_size=args.batch_size)
+        ingestor.run(read_species_list(args.species_file), Checkpoint(args.checkpoint))
+    finally:
+        graph.close()
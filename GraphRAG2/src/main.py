@@ -1,11 +1,14 @@
+import asyncio
 import os
+import re
 import sys
+import time
 import json
-from typing import Dict, List, Any
+from concurrent.futures import ThreadPoolExecutor
+from typing import AsyncIterator, Dict, Iterator, List, Any
 
 # Import LangChain
 from langchain_groq import ChatGroq
-from langchain_core.prompts import PromptTemplate
 from langchain_core.messages import HumanMessage, AIMessage, SystemMessage
 
 # Import Config
@@ -20,198 +23,642 @@ from src.data_loaders.wikipedia import WikipediaFetcher
 from src.data_loaders.xenocanto import XenoCantoFetcher
 from src.data_loaders.iucn import IUCNFetcher
 from src.data_loaders.birdspedia import BirdspediaFetcher
+from src.data_loaders.concurrent_fetch import ConcurrentFetchStage
+
+# Lịch sử hội thoại theo session
+from src.session_store import create_session_store
+from src.query_classifier import RewriteClassifier
+from src.query_analysis import QueryAnalysis, analyze_query
+from src.answer_cache import SemanticAnswerCache
+from src.facets import FacetParser
+from src.metrics import PROMPT_TOKENS_SAVED
+from src.prompting import PromptAssembler
+from src.refresh import PopularityCounter, RefreshScheduler
+from src.tracing import Trace
+
+# Câu hỏi hỏi về NHIỀU loài (trả lời bằng top-k kết quả vector)
+MULTI_BIRD_PATTERN = re.compile(
+    r"(những|các)\s+(loài|con)\s+(chim\s+)?(nào|gì)|loài\s+chim\s+nào|chim\s+nào|"
+    r"\b(which|what)\s+birds?\b|\bbirds\s+that\b",
+    re.IGNORECASE
+)
+
+# Câu hỏi so sánh / phân biệt nhiều loài (cần LLM nhận diện nếu chưa biết đủ tên loài)
+COMPARE_PATTERN = re.compile(
+    r"so\s+sánh|khác\s+nhau|giống\s+nhau|khác\s+gì|phân\s+biệt|"
+    r"\b(compare|comparison|versus|vs\.?|difference|differ)\b",
+    re.IGNORECASE
+)
 
 class BirdGraphRAG:
-    def __init__(self):
+    def __init__(self, graph=None, llm=None):
+        """graph / llm: truyền bản có sẵn (vd graph trong bộ nhớ + LLM giả khi benchmark offline)."""
         print("🚀 Initializing BirdGraphRAG System...")
+        started = time.perf_counter()
+
+        # Các thành phần nặng khởi tạo song song: kết nối Neo4j + tạo index,
+        # tải model embedding, nạp gazetteer / cache của fetchers.
+        # (Tạo driver không mở kết nối nên Neo4jHandler dựng ngay được.)
+        self.graph = graph or Neo4jHandler(init_indices=False)
+        init_pool = ThreadPoolExecutor(max_workers=3, thread_name_prefix="init")
+        futures = [init_pool.submit(self.graph._init_indices), init_pool.submit(self._init_fetchers)]
+        # Model embedding: tải ngay nếu EMBEDDING_PRELOAD, nếu không thì ở lần embed đầu tiên
+        if Config.EMBEDDING_PRELOAD:
+            futures.append(init_pool.submit(self.graph.embeddings.warm_up))
         
         # 1. Khởi tạo LLM
-        self.llm = ChatGroq(
+        self.llm = llm or ChatGroq(
             model="llama-3.3-70b-versatile",
             temperature=0,
             api_key=os.getenv("GROQ_API_KEY")
         )
+        # Bản bật JSON mode cho lời gọi phân tích câu hỏi (structured output)
+        self.analysis_llm = self.llm.bind(response_format={"type": "json_object"})
         
-        # 2. Kết nối Database
-        self.graph = Neo4jHandler()
+        # 2 + 3. Chờ Database (index) và các bộ nạp dữ liệu (Fetchers) sẵn sàng
+        for future in futures:
+            future.result()
+        init_pool.shutdown()
+        # Mỗi lượt chat có thể chạy tới 5 nguồn cùng lúc -> pool rộng theo số lượt đồng thời
+        self.fetch_stage = ConcurrentFetchStage(
+            timeouts=Config.FETCH_TIMEOUTS,
+            deadline=Config.FETCH_DEADLINE,
+            max_workers=max(16, 5 * Config.MAX_CONCURRENT_TURNS)
+        )
+        # Thread chạy pipeline đồng bộ cho server async (aprocess_turn / astream_turn)
+        self.turn_executor = ThreadPoolExecutor(
+            max_workers=Config.MAX_CONCURRENT_TURNS, thread_name_prefix="turn"
+        )
         
-        # 3. Khởi tạo các bộ nạp dữ liệu (Fetchers)
+        # 4. Bộ nhớ hội thoại (Chat Memory) theo từng session
+        self.sessions = create_session_store()
+        # Dựng prompt trong ngân sách token (context gọn, lịch sử nén)
+        self.prompts = PromptAssembler(
+            token_budget=Config.PROMPT_TOKEN_BUDGET,
+            history_budget=Config.HISTORY_TOKEN_BUDGET,
+            history_message_tokens=Config.HISTORY_MESSAGE_TOKENS
+        )
+
+        # 5. Bộ phân loại cục bộ: chỉ gọi LLM viết lại câu hỏi khi thật sự cần
+        self.rewrite_classifier = RewriteClassifier(self.wikidata.common_map.keys())
+        try:
+            self.rewrite_classifier.add_names(self.graph.get_known_common_names())
+        except Exception as e:
+            print(f"   [Classifier Warning] Could not load species names from graph: {e}")
+        # Nhận diện điều kiện theo tập (sinh cảnh, thức ăn, bảo tồn, họ / bộ đã có trong Graph)
+        self.facet_parser = FacetParser()
+        try:
+            self.facet_parser.add_taxa(self.graph.get_taxa())
+        except Exception as e:
+            print(f"   [Facets Warning] Could not load families / orders from graph: {e}")
+
+        # 6. Cache câu trả lời ngữ nghĩa (dùng chung model embedding),
+        #    tự xoá khi Graph ghi vào loài tương ứng
+        self.answer_cache = None
+        if Config.ANSWER_CACHE_ENABLED:
+            self.answer_cache = SemanticAnswerCache(
+                self.graph.embeddings,
+                threshold=Config.ANSWER_CACHE_THRESHOLD,
+                max_entries=Config.ANSWER_CACHE_MAX_ENTRIES,
+                ttl=Config.ANSWER_CACHE_TTL
+            )
+            self.graph.add_write_listener(self.answer_cache.invalidate)
+
+        # 7. Làm mới nền dữ liệu cũ (start_refresh): loài được hỏi nhiều được kiểm tra trước
+        self.popularity = PopularityCounter(Config.REFRESH_POPULARITY_HALF_LIFE)
+        self.refresher = None
+        
+        print(f"✅ System Ready! ({time.perf_counter() - started:.1f}s)\n")
+
+    def _init_fetchers(self):
         self.wikidata = WikidataFetcher()
         self.wiki = WikipediaFetcher()
         self.xenocanto = XenoCantoFetcher()
         self.iucn = IUCNFetcher()
         self.birdspedia = BirdspediaFetcher()
-        
-        # 4. Bộ nhớ hội thoại (Chat Memory)
-        self.chat_history = [] 
-        
-        print("✅ System Ready!\n")
 
-    def _contextualize_query(self, raw_query: str) -> str:
+    def _analyze_query(self, raw_query: str, history: List, trace: Trace,
+                       stage: str = "contextualize") -> QueryAnalysis:
         """
-        Viết lại câu hỏi dựa trên lịch sử chat để xử lý đại từ (Nó, loài này...)
+        MỘT lời gọi LLM (JSON) thay cho 3 lời gọi tuần tự trước đây: viết lại câu hỏi
+        theo lịch sử (xử lý đại từ Nó, loài này...), nhận diện tên loài và đoán tên khoa học.
+        stage: tên span ('contextualize' khi có lịch sử, 'extract' khi chỉ nhận diện loài).
         """
-        if not self.chat_history:
-            return raw_query
+        # 3 cặp hội thoại gần nhất, nén vào ngân sách token (bỏ ảnh/link, tóm lược câu trả lời cũ)
+        history_str, history_stats = self.prompts.compress_history(history[-6:])
+        PROMPT_TOKENS_SAVED.inc(history_stats["raw_history_tokens"] - history_stats["history_tokens"], part="history")
 
-        # Lấy 3 cặp hội thoại gần nhất
-        history_str = "\n".join([f"{msg.type.upper()}: {msg.content}" for msg in self.chat_history[-6:]])
+        started = time.perf_counter()
+        with trace.span(stage, method="llm", **history_stats) as span:
+            try:
+                analysis = analyze_query(
+                    self.analysis_llm, raw_query, history_str,
+                    max_retries=Config.ANALYSIS_MAX_RETRIES,
+                    on_call=lambda prompt, output: trace.record_llm(stage, span, prompt, output)
+                )
+            except ValueError as e:
+                print(f"   [Analysis Error] {e}")
+                analysis = QueryAnalysis(standalone_question=raw_query)
+        if history:
+            self.rewrite_classifier.record(skipped=False, llm_seconds=time.perf_counter() - started)
 
-        prompt = PromptTemplate.from_template("""
-        Combine the chat history and the latest user question into a standalone question.
-        Ensure that pronouns (it, he, she, this bird) are replaced with the specific bird name from the history.
-        Do NOT answer the question. Return ONLY the rewritten question.
-        
-        Chat History:
-        {history}
-        
-        Latest Question: {question}
-        
-        Standalone Question:
-        """)
-        
-        chain = prompt | self.llm
-        rewritten = chain.invoke({"history": history_str, "question": raw_query}).content.strip()
-        
-        if rewritten != raw_query:
-            print(f"🔄 [Context] Rewritten: '{raw_query}' -> '{rewritten}'")
-        return rewritten
+        if analysis.standalone_question != raw_query:
+            print(f"🔄 [Context] Rewritten: '{raw_query}' -> '{analysis.standalone_question}'")
+        return analysis
 
-    def _extract_entity(self, query: str) -> str:
-        # Prompt: Ép buộc trả về tên thông thường
-        prompt = f"""
-        Identify the bird common name in the query: "{query}".
-        Return ONLY the common name (e.g., 'Chim sẻ', 'Kingfisher').
-        Do NOT translate to scientific name.
-        If no bird is mentioned, return 'None'.
-        """
-        res = self.llm.invoke(prompt)
-        return res.content.strip().strip('"')
+    def _fetch_tasks(self, scientific_name: str, common_name: str, status: Dict) -> Dict[str, Any]:
+        """Chiến lược Lazy Loading: chỉ tạo task cho những gì còn thiếu trong Graph."""
+        tasks = {}
 
-    def _lazy_load_data(self, scientific_name: str, common_name: str, status: Dict):
-        """
-        Chiến lược Lazy Loading: Chỉ tải những gì còn thiếu trong Graph.
-        """
-        
-        # 0. HÌNH ẢNH & CÂN NẶNG (MỚI)
+        # 0. HÌNH ẢNH & CÂN NẶNG
         # Kiểm tra nếu thiếu Ảnh HOẶC thiếu Cân nặng thì đi lấy từ Wikidata
         if not status.get('has_image') or not status.get('has_mass'):
             print(f"   📥 [Fetch] Details (Image/Mass) for '{common_name}'...")
-            
-            # Gọi hàm get_bird_data mới (trả về cả tên, ảnh, cân nặng)
-            wiki_data = self.wikidata.get_bird_data(common_name)
-            
-            if wiki_data:
-                # Gọi hàm update_details mới trong Neo4j
-                self.graph.update_details(
-                    scientific_name, 
-                    wiki_data.get('image_url'), 
-                    wiki_data.get('mass')
-                )
+            tasks['wikidata'] = lambda: self.wikidata.get_bird_data(common_name)
 
         # 1. Wiki (Mô tả)
         if not status.get('has_wiki'):
             print(f"   📥 [Fetch] Wikipedia for '{common_name}'...")
-            summary = self.wiki.get_summary(common_name, lang='vi')
-            if summary:
-                self.graph.update_wiki(scientific_name, common_name, summary)
-        
+            tasks['wikipedia'] = lambda: self.wiki.get_page(common_name, lang='vi')
+
         # 2. IUCN (Bảo tồn)
         if not status.get('has_status'):
             print(f"   📥 [Fetch] IUCN Status for '{scientific_name}'...")
-            iucn_status = self.iucn.get_conservation_status(scientific_name)
-            if iucn_status:
-                self.graph.update_status(scientific_name, iucn_status)
+            tasks['iucn'] = lambda: self.iucn.get_conservation_status(scientific_name)
 
         # 3. Xeno-canto (Âm thanh)
         if not status.get('has_audio'):
             print(f"   📥 [Fetch] Audio for '{scientific_name}'...")
-            audio_data = self.xenocanto.get_audio(scientific_name)
-            if audio_data:
-                self.graph.update_audio(scientific_name, audio_data['url'])
+            tasks['xenocanto'] = lambda: self.xenocanto.get_audio(scientific_name)
 
         # 4. Birdspedia (Sinh thái)
         if not status.get('has_ecology'):
             print(f"   📥 [Fetch] Ecology info from Birdspedia...")
-            eco_data = self.birdspedia.fetch_ecology_data(scientific_name)
-            if eco_data:
-                self.graph.update_ecology(scientific_name, eco_data)
+            tasks['birdspedia'] = lambda: self.birdspedia.fetch_ecology_data(scientific_name)
+
+        return tasks
+
+    def _build_enrichment(self, scientific_name: str, common_name: str, results: Dict, embedding=None):
+        """Gom kết quả fetch (kể cả khi chỉ có một phần) vào một unit of work."""
+        unit = self.graph.begin_enrichment(scientific_name, common_name)
+
+        wiki_data = results.get('wikidata')
+        if wiki_data:
+            unit.set_details(wiki_data.get('image_url'), wiki_data.get('mass'),
+                             wikidata_id=wiki_data.get('wikidata_id'), revid=wiki_data.get('revid'),
+                             family=wiki_data.get('family'), order=wiki_data.get('order'))
+            self.facet_parser.add_taxa([dict(wiki_data.get('family') or {}, rank='family'),
+                                        dict(wiki_data.get('order') or {}, rank='order')])
+
+        page = results.get('wikipedia') or {}
+        unit.set_wiki(page.get('summary'), embedding=embedding, revision=page)
+        unit.set_status(results.get('iucn'))
+        unit.set_audio(results.get('xenocanto'))
+        unit.set_ecology(results.get('birdspedia'))
+        return unit
+
+    def _lazy_load_data(self, scientific_name: str, common_name: str, status: Dict, trace: Trace):
+        """
+        Các nguồn độc lập được gọi song song; nguồn nào trễ deadline thì bỏ qua,
+        phần đã tải được vẫn ghi vào Graph.
+        Output: (context đầy đủ sau khi ghi hoặc None nếu không cần tải gì,
+                 danh sách nguồn trễ deadline / lỗi).
+        """
+        tasks = self._fetch_tasks(scientific_name, common_name, status)
+        if not tasks:
+            return None, []
+
+        # Mỗi nguồn một span fetch.<nguồn>; span lazy_fetch bao cả stage (kể cả nguồn trễ hạn)
+        tasks = {name: trace.wrap(f"fetch.{name}", fn) for name, fn in tasks.items()}
+        with trace.span("lazy_fetch", sources=sorted(tasks)) as span:
+            results = self.fetch_stage.run(tasks)
+            missed = span["missed"] = sorted(set(tasks) - set(results))
+
+        embedding = None
+        if (results.get('wikipedia') or {}).get('summary'):
+            with trace.span("embedding", texts=1):
+                embedding = self.graph.embeddings.embed_documents([results['wikipedia']['summary']])[0]
+        unit = self._build_enrichment(scientific_name, common_name, results, embedding)
+
+        # Ghi trong 1 transaction, lấy luôn context đầy đủ trong cùng round trip.
+        with trace.span("graph_write"):
+            return unit.commit(return_context=True), missed
+
+    def _lazy_load_many(self, species: List[tuple], trace: Trace) -> bool:
+        """
+        Lazy loading cho nhiều loài cùng lúc (câu so sánh): mọi nguồn của mọi loài chạy
+        trong MỘT stage song song, summary được embed theo batch, ghi bằng một commit_batch.
+        species: [(tên khoa học, tên thường, status)]. Output: True nếu có ghi vào Graph.
+        """
+        tasks = {}
+        for sci, common, status in species:
+            for source, fn in self._fetch_tasks(sci, common, status).items():
+                tasks[f"{source}@{sci}"] = trace.wrap(f"fetch.{source}", fn)
+        if not tasks:
+            return False
+
+        with trace.span("lazy_fetch", sources=len(tasks), species=len(species)) as span:
+            results = self.fetch_stage.run(tasks)
+            span["missed"] = sorted(set(tasks) - set(results))
+
+        per_species = {}
+        for key, value in results.items():
+            source, sci = key.split("@", 1)
+            per_species.setdefault(sci, {})[source] = value
+
+        summaries = [(sci, r['wikipedia']['summary']) for sci, r in per_species.items()
+                     if (r.get('wikipedia') or {}).get('summary')]
+        embeddings = {}
+        if summaries:
+            with trace.span("embedding", texts=len(summaries)):
+                vectors = self.graph.embeddings.embed_documents([text for _, text in summaries])
+            embeddings = {sci: vector for (sci, _), vector in zip(summaries, vectors)}
+
+        units = [self._build_enrichment(sci, common, per_species.get(sci, {}), embeddings.get(sci))
+                 for sci, common, _ in species if any(key.endswith(f"@{sci}") for key in tasks)]
+        with trace.span("graph_write", species=len(units)):
+            self.graph.commit_batch(units)
+        return True
+
+    def _hit_matches_name(self, hit: Dict, name: str) -> bool:
+        """Loài tìm được bằng vector có đúng là loài được nêu tên trong câu hỏi không."""
+        if (hit['Name'] or "").strip().lower() == name.strip().lower():
+            return True
+        # Qua resolution cache của Wikidata: bước 3 dùng lại kết quả này, không gọi lại
+        data = self.wikidata.get_bird_data(name)
+        return bool(data) and data['scientific_name'] == hit['ScientificName']
+
+    def _status_from_context(self, context: Dict) -> Dict:
+        """Suy ra các cờ giống check_data_status từ một record context có sẵn."""
+        return {
+            "exists": True,
+            "common_name": context.get('Name'),
+            "has_wiki": context.get('Description') is not None,
+            "has_audio": context.get('AudioURL') is not None,
+            "has_status": context.get('ConservationStatus') is not None,
+            "has_ecology": context.get('Diet') is not None or context.get('Habitat') is not None,
+            "has_image": context.get('ImageURL') is not None,
+            "has_mass": context.get('Mass') is not None
+        }
+
+    def _semantic_lookup(self, query: str, trace: Trace) -> List[Dict]:
+        """Tìm loài đã lưu trong Graph bằng vector index (bird_desc_index)."""
+        try:
+            with trace.span("embedding", texts=1):
+                vector = self.graph.embeddings.embed_query(query)
+            with trace.span("vector_search") as span:
+                hits = self.graph.semantic_search(query, k=Config.VECTOR_TOP_K, vector=vector)
+                span["hits"] = len(hits)
+        except Exception as e:
+            print(f"   [Vector Search Error] {e}")
+            return []
+        if hits:
+            print(f"   🧭 [Vector] Top match: {hits[0]['Name']} ({hits[0]['Score']:.3f})")
+        return hits
+
+    def _answer_facets(self, session_id: str, user_input: str, standalone_query: str,
+                       facets: Dict, trace: Trace) -> Iterator[Dict]:
+        """
+        Câu hỏi theo tập: MỘT truy vấn Cypher qua các node Habitat / Diet / Status / Family / Order,
+        không embed, không gọi LLM cho từng loài. Output: các sự kiện như stream_turn,
+        hoặc không phát gì nếu Graph chưa có loài nào khớp (để bước vector search thử tiếp).
+        """
+        with trace.span("facet_search", **{name: len(values) for name, values in facets.items() if values}) as span:
+            total, matches = self.graph.find_birds(facets, limit=Config.FACET_MAX_BIRDS)
+            span["hits"] = total
+        if not matches:
+            return
+        print(f"   🐦 Facet answer: {total} matching species ({facets})")
+        for context in matches:
+            self.popularity.record(context['ScientificName'])
+        yield {"event": "stage", "stage": "resolved_species", "total": total,
+               "species": [{"common_name": c['Name'], "scientific_name": c['ScientificName']} for c in matches]}
+        yield {"event": "stage", "stage": "context_ready"}
+        yield from self._stream_answer(session_id, user_input,
+                                       self._build_rag_prompt(matches, standalone_query, trace), trace)
+
+    def _extract_species_names(self, query: str, analysis: QueryAnalysis, trace: Trace):
+        """
+        Mọi loài được nhắc trong câu hỏi (câu so sánh). Ưu tiên tên đã biết (không tốn LLM);
+        chỉ gọi LLM khi câu hỏi có dạng so sánh mà chưa tìm đủ 2 tên.
+        Output: (danh sách tên thường, analysis có thể vừa được tạo).
+        """
+        with trace.span("extract", method="known_names") as span:
+            names = self.rewrite_classifier.find_all_known_species(query)
+            span["found"] = len(names)
+        if len(names) < 2 and COMPARE_PATTERN.search(query):
+            if analysis is None:
+                analysis = self._analyze_query(query, [], trace, stage="extract")
+            for bird in analysis.birds:
+                if bird.common_name.lower() not in (n.lower() for n in names):
+                    names.append(bird.common_name)
+        return names[:Config.MAX_SPECIES_PER_TURN], analysis
+
+    def _resolve_many(self, names: List[str], analysis: QueryAnalysis, trace: Trace) -> List[tuple]:
+        """Định danh song song nhiều tên loài. Output: [(tên thường, tên khoa học)] không trùng loài."""
+        tasks = {f"wikidata@{name}": (lambda n=name: self.wikidata.get_bird_data(n)) for name in names}
+        with trace.span("resolve", species=len(names)) as span:
+            results = self.fetch_stage.run(tasks)
+            span["found"] = sum(1 for r in results.values() if r)
+        # Fallback: tên khoa học do LLM đoán trong lời gọi phân tích (nếu có)
+        guesses = {b.common_name.lower(): b.scientific_name for b in analysis.birds} if analysis else {}
+
+        species, seen = [], set()
+        for name in names:
+            data = results.get(f"wikidata@{name}")
+            sci = data['scientific_name'] if data else guesses.get(name.lower()) or name
+            if sci not in seen:
+                seen.add(sci)
+                species.append((name, sci))
+        return species
+
+    def _answer_species(self, session_id: str, user_input: str, standalone_query: str,
+                        names: List[str], analysis: QueryAnalysis, trace: Trace) -> Iterator[Dict]:
+        """
+        Trả lời một câu hỏi về nhiều loài trong một lượt: định danh song song, một lần đọc
+        Graph (UNWIND) cho mọi loài, lazy loading mọi phần thiếu trong một stage song song,
+        một lần đọc lại context, MỘT lần sinh câu trả lời. Độ trễ ~ loài chậm nhất, không phải N lần.
+        """
+        species = self._resolve_many(names, analysis, trace)
+        print(f"   🐦 Target Birds: {', '.join(f'{name} ({sci})' for name, sci in species)}")
+        self.rewrite_classifier.add_names([name for name, _ in species])
+        yield {"event": "stage", "stage": "resolved_species",
+               "species": [{"common_name": name, "scientific_name": sci} for name, sci in species]}
+
+        scis = [sci for _, sci in species]
+        for sci in scis:
+            self.popularity.record(sci)
+        with trace.span("check_data_status", species=len(scis)):
+            records = self.graph.read_birds(scis)
+        if self._lazy_load_many([(sci, name, records[sci][0]) for name, sci in species], trace):
+            with trace.span("get_full_context", species=len(scis)):
+                records = self.graph.read_birds(scis)
+
+        contexts = [records[sci][1] for sci in scis if records[sci][1] is not None]
+        yield {"event": "stage", "stage": "context_ready"}
+        yield from self._stream_answer(session_id, user_input,
+                                       self._build_rag_prompt(contexts, standalone_query, trace, comparison=True),
+                                       trace)
+
+    def _build_rag_prompt(self, context_data: Any, standalone_query: str, trace: Trace,
+                          comparison: bool = False) -> List:
+        """Prompt sinh câu trả lời: prefix tĩnh + context đóng gói gọn, trong ngân sách token."""
+        with trace.span("prompt") as span:
+            messages, stats = self.prompts.build(context_data, standalone_query, comparison=comparison)
+            span.update(stats)
+        PROMPT_TOKENS_SAVED.inc(stats["saved_tokens"], part="context")
+        return messages
+
+    def _stream_answer(self, session_id: str, user_input: str, prompt, trace: Trace,
+                       cache_entry: tuple = None) -> Iterator[Dict]:
+        """
+        Stream token từ LLM, cuối cùng lưu lịch sử, kết thúc trace và phát sự kiện 'done'.
+        prompt: chuỗi hoặc danh sách message (từ _build_rag_prompt).
+        cache_entry: (tên khoa học, câu hỏi, generation) -> lưu câu trả lời vào answer_cache.
+        """
+        prompt_text = prompt if isinstance(prompt, str) else "\n".join(m.content for m in prompt)
+        parts = []
+        with trace.span("generation") as span:
+            started = time.perf_counter()
+            for chunk in self.llm.stream(prompt):
+                if chunk.content:
+                    if not parts:
+                        span["ttft_ms"] = round((time.perf_counter() - started) * 1000, 1)
+                    parts.append(chunk.content)
+                    yield {"event": "token", "text": chunk.content}
+            final_response = "".join(parts)
+            trace.record_llm("generation", span, prompt_text, final_response)
+
+        self._remember(session_id, user_input, final_response)
+        if cache_entry is not None:
+            sci_name, question, generation = cache_entry
+            self.answer_cache.store(sci_name, question, final_response, generation)
+            self.answer_cache.record_latency(hit=False, seconds=time.perf_counter() - trace.started)
+        trace.finish(cached=False)
+        yield {"event": "done", "response": final_response, "trace_id": trace.trace_id}
+
+    def _remember(self, session_id: str, user_input: str, response: str):
+        self.sessions.append(session_id, "human", user_input)
+        self.sessions.append(session_id, "ai", response)
 
-    def process_turn(self, user_input: str) -> str:
-        print(f"👤 User: {user_input}")
+    def stream_turn(self, user_input: str, session_id: str = "default",
+                    trace: Trace = None) -> Iterator[Dict]:
+        """
+        Chạy pipeline và phát sự kiện theo từng giai đoạn (mỗi giai đoạn là một span của trace):
+          {"event": "stage", "stage": ...}   -> tiến độ (contextualized, resolved_species, context_ready)
+          {"event": "token", "text": ...}    -> từng đoạn câu trả lời từ LLM
+          {"event": "done", "response": ...} -> câu trả lời đầy đủ
+        """
+        trace = trace or Trace()
+        print(f"👤 User: {user_input} (trace {trace.trace_id})")
         
         # --- BƯỚC 1: Xử lý ngữ cảnh ---
-        standalone_query = self._contextualize_query(user_input)
+        # Chỉ gọi LLM khi có lịch sử và câu hỏi có đại từ / chưa nêu tên loài đã biết.
+        # Lời gọi đó trả luôn tên loài + tên khoa học nên không cần gọi lại ở bước 2, 3.
+        history = self.sessions.get_history(session_id)
+        analysis = None
+        if history and self.rewrite_classifier.needs_rewrite(user_input):
+            analysis = self._analyze_query(user_input, history, trace)
+            standalone_query = analysis.standalone_question
+        else:
+            if history:
+                self.rewrite_classifier.record(skipped=True)
+                print("⏭️ [Context] Standalone query, skipping rewrite.")
+            standalone_query = user_input
+        yield {"event": "stage", "stage": "contextualized", "query": standalone_query}
 
-        # --- BƯỚC 2: Nhận diện thực thể ---
-        bird_name = self._extract_entity(standalone_query)
-        
-        if not bird_name or bird_name.lower() == 'none':
-            response = self.llm.invoke(user_input).content
-            self.chat_history.append(HumanMessage(content=user_input))
-            self.chat_history.append(AIMessage(content=response))
-            return response
+        # --- BƯỚC 1.4: Câu hỏi theo tập ("các loài chim nguy cấp sống ở rừng ngập mặn") ---
+        # Điều kiện nhận ra được (sinh cảnh, thức ăn, bảo tồn, họ / bộ) -> một truy vấn Cypher có index.
+        facets = self.facet_parser.parse(standalone_query)
+        if facets:
+            answered = False
+            for event in self._answer_facets(session_id, user_input, standalone_query, facets, trace):
+                answered = True
+                yield event
+            if answered:
+                return
 
-        print(f"   🐦 Target Bird: {bird_name}")
+        # --- BƯỚC 1.5: Truy xuất ngữ nghĩa (Vector Index) ---
+        # Nếu Graph đã có loài khớp đủ tốt thì bỏ qua nhận diện thực thể + Wikidata.
+        hits = self._semantic_lookup(standalone_query, trace)
 
-        # --- BƯỚC 3: Định danh (Tên thường -> Tên khoa học) ---
-        # Hàm get_bird_data giờ trả về dict, ta lấy scientific_name
-        bird_data = self.wikidata.get_bird_data(bird_name)
-        
-        if bird_data:
-            sci_name = bird_data['scientific_name']
+        if MULTI_BIRD_PATTERN.search(standalone_query):
+            # Câu hỏi dạng "những loài chim nào ăn cá" -> trả lời bằng top-k loài
+            matches = [h for h in hits if h['Score'] >= Config.VECTOR_MULTI_THRESHOLD]
+            if matches:
+                print(f"   🐦 Multi-bird answer from {len(matches)} stored species")
+                yield {"event": "stage", "stage": "resolved_species",
+                       "species": [{"common_name": h['Name'], "scientific_name": h['ScientificName']} for h in matches]}
+                yield {"event": "stage", "stage": "context_ready"}
+                yield from self._stream_answer(session_id, user_input,
+                                               self._build_rag_prompt(matches, standalone_query, trace), trace)
+                return
+
+        # --- BƯỚC 1.6: Câu hỏi về nhiều loài cụ thể (so sánh) ---
+        names, analysis = self._extract_species_names(standalone_query, analysis, trace)
+        if len(names) >= 2:
+            yield from self._answer_species(session_id, user_input, standalone_query, names, analysis, trace)
+            return
+
+        context_data = None
+        # Câu hỏi đã nêu tên một loài: chỉ dùng kết quả vector khi đúng loài đó
+        # (không trả lời về loài X bằng context của loài Y "gần" hơn trong không gian vector)
+        top = hits[0] if hits and hits[0]['Score'] >= Config.VECTOR_MATCH_THRESHOLD else None
+        if top is not None and names and not self._hit_matches_name(top, names[0]):
+            print(f"   ↪️ Vector hit '{top['Name']}' is not the named species '{names[0]}', resolving by name")
+            top = None
+        if top is not None:
+            sci_name = top['ScientificName']
+            bird_name = top['Name'] or sci_name
+            status = self._status_from_context(top)
+            context_data = {k: v for k, v in top.items() if k != 'Score'}
+            print(f"   🐦 Target Bird (vector): {bird_name}")
+            print(f"   🔬 Scientific Name: {sci_name}")
         else:
-            # Fallback LLM
-            sci_name = self.llm.invoke(f"Scientific name of '{bird_name}'? Return only the name.").content.strip()
-        
-        print(f"   🔬 Scientific Name: {sci_name}")
+            # --- BƯỚC 2: Nhận diện thực thể ---
+            # Ưu tiên tên loài đã biết có trong câu hỏi (tìm ở bước 1.6, không tốn LLM)
+            bird_name = None
+            if analysis is None:
+                bird_name = names[0] if names else None
+                if bird_name is None:
+                    analysis = self._analyze_query(standalone_query, [], trace, stage="extract")
+            if bird_name is None:
+                bird_name = analysis.common_name
+            
+            if not bird_name:
+                yield from self._stream_answer(session_id, user_input, user_input, trace)
+                return
+
+            print(f"   🐦 Target Bird: {bird_name}")
+
+            # --- BƯỚC 3: Định danh (Tên thường -> Tên khoa học) ---
+            # Hàm get_bird_data giờ trả về dict, ta lấy scientific_name
+            with trace.span("resolve") as span:
+                bird_data = self.wikidata.get_bird_data(bird_name)
+                span["found"] = bool(bird_data)
+            
+            if bird_data:
+                sci_name = bird_data['scientific_name']
+            else:
+                # Fallback: tên khoa học do LLM đoán trong lời gọi phân tích
+                if analysis is None:
+                    analysis = self._analyze_query(standalone_query, [], trace, stage="extract")
+                sci_name = analysis.scientific_name or bird_name
+            
+            print(f"   🔬 Scientific Name: {sci_name}")
+            self.popularity.record(sci_name)
+            status = None
+
+        self.rewrite_classifier.add_names([bird_name])
+        yield {"event": "stage", "stage": "resolved_species",
+               "species": [{"common_name": bird_name, "scientific_name": sci_name}]}
+
+        # --- BƯỚC 3.5: Cache câu trả lời (cùng loài + câu hỏi gần giống) ---
+        # Tra ngay khi đã có tên khoa học: trúng cache thì bỏ qua cả đọc Graph, lazy loading và LLM.
+        # Mỗi lần ghi loài này (write listener) đã xoá cache của loài và tăng generation.
+        if self.answer_cache is not None:
+            with trace.span("answer_cache") as span:
+                cached = self.answer_cache.lookup(sci_name, standalone_query)
+                span["hit"] = cached is not None
+            if cached is not None:
+                answer, score = cached
+                print(f"   💾 [Answer Cache] Hit ({score:.3f}), skipping graph read + LLM")
+                yield {"event": "stage", "stage": "context_ready"}
+                yield {"event": "token", "text": answer}
+                self._remember(session_id, user_input, answer)
+                self.answer_cache.record_latency(hit=True, seconds=time.perf_counter() - trace.started)
+                trace.finish(cached=True)
+                yield {"event": "done", "response": answer, "cached": True, "trace_id": trace.trace_id}
+                return
+
+        if status is None:
+            # --- BƯỚC 4: Kiểm tra Graph (Check Cache) ---
+            # Một query trả cả cờ dữ liệu lẫn context đầy đủ (qua read-through cache):
+            # loài đã đủ dữ liệu thì không cần đọc Graph thêm lần nào ở bước 6.
+            with trace.span("check_data_status") as span:
+                status, context_data = self.graph.read_bird(sci_name)
+                span["exists"] = status['exists']
+
+            if not status['exists']:
+                print("   ✨ New Entity detected! Creating base node...")
 
-        # --- BƯỚC 4: Kiểm tra Graph (Check Cache) ---
-        status = self.graph.check_data_status(sci_name)
-        
-        if not status['exists']:
-            print("   ✨ New Entity detected! Creating base node...")
-        
         # --- BƯỚC 5: Lazy Loading (Chạy fetch các phần thiếu) ---
-        self._lazy_load_data(sci_name, bird_name, status)
+        # Nếu có ghi, context đầy đủ được trả về ngay trong transaction ghi.
+        loaded_context, missed = self._lazy_load_data(sci_name, bird_name, status, trace)
+        if loaded_context is not None:
+            context_data = loaded_context
+
+        # generation đọc sau lazy loading (ghi của chính lượt này đã tăng nó), trước khi lấy
+        # context ở bước 6: có ghi xen giữa thì câu trả lời không được lưu.
+        # Có nguồn trễ hạn / lỗi: context thiếu -> không lưu câu trả lời (cache trúng sẽ bỏ qua
+        # lazy loading nên nguồn đó không bao giờ được tải lại).
+        cache_entry = None
+        if missed:
+            print(f"   💾 [Answer Cache] Partial context (missed {missed}), answer not cached")
+        elif self.answer_cache is not None:
+            cache_entry = (sci_name, standalone_query, self.answer_cache.generation(sci_name))
 
         # --- BƯỚC 6: Truy xuất ngữ cảnh đầy đủ ---
-        context_data = self.graph.get_full_context(sci_name)
-        
-        # --- BƯỚC 7: Tổng hợp câu trả lời (RAG Generation) ---
-        # Prompt mới: Bắt buộc hiển thị hình ảnh
-        system_prompt = """
-        You are an expert Ornithologist representing the Vietnam Bird Association. 
-        
-        TASK:
-        Use the provided Knowledge Graph Context to answer the user's question in VIETNAMESE (Tiếng Việt).
+        # Thường đã có từ bước 4 / bước 5; chỉ đọc lại khi lazy loading không ghi được gì.
+        if context_data is None:
+            with trace.span("get_full_context"):
+                context_data = self.graph.get_full_context(sci_name)
+        yield {"event": "stage", "stage": "context_ready"}
         
-        GUIDELINES:
-        1. IMAGE: If 'ImageURL' is provided in the context, YOU MUST DISPLAY IT at the very top of your answer using Markdown format: ![Bird Image](ImageURL).
-        2. TRANSLATION: Translate technical terms (e.g., "Least Concern" -> "Ít quan tâm", "Omnivore" -> "Động vật ăn tạp") naturally.
-        3. AUDIO: If audio is available, link it as: [🔊 Nghe giọng hót](AudioURL).
-        4. TONE: Friendly and educational.
+        # --- BƯỚC 7 + 8: Tổng hợp câu trả lời (stream) và cập nhật lịch sử ---
+        yield from self._stream_answer(session_id, user_input, self._build_rag_prompt(context_data, standalone_query, trace),
+                                       trace, cache_entry=cache_entry)
+
+    def process_turn(self, user_input: str, session_id: str = "default", trace: Trace = None) -> str:
+        """Bản không stream: chạy hết pipeline và trả về câu trả lời đầy đủ."""
+        for event in self.stream_turn(user_input, session_id, trace):
+            if event["event"] == "done":
+                return event["response"]
+
+    async def aprocess_turn(self, user_input: str, session_id: str = "default", trace: Trace = None) -> str:
         """
-        
-        rag_prompt = f"""
-        {system_prompt}
-        
-        --- CONTEXT DATA ---
-        {context_data}
-        
-        --- USER QUESTION ---
-        {standalone_query}
+        Bản coroutine của process_turn cho server ASGI. Pipeline (Neo4j, HTTP, LLM)
+        là I/O chặn nên chạy trên turn_executor, event loop không bị chặn.
         """
-        
-        final_response = self.llm.invoke(rag_prompt).content
-        
-        # --- BƯỚC 8: Cập nhật lịch sử ---
-        self.chat_history.append(HumanMessage(content=user_input))
-        self.chat_history.append(AIMessage(content=final_response))
-        
-        return final_response
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.turn_executor, self.process_turn, user_input, session_id, trace)
+
+    async def astream_turn(self, user_input: str, session_id: str = "default",
+                           trace: Trace = None) -> AsyncIterator[Dict]:
+        """Bản async của stream_turn: mỗi bước của generator chạy trên turn_executor."""
+        loop = asyncio.get_running_loop()
+        events = self.stream_turn(user_input, session_id, trace)
+        try:
+            while True:
+                event = await loop.run_in_executor(self.turn_executor, next, events, None)
+                if event is None:
+                    return
+                yield event
+        finally:
+            try:
+                events.close()
+            except ValueError:
+                # Client ngắt khi bước hiện tại còn chạy trong thread: generator tự kết thúc sau đó
+                pass
+
+    def start_refresh(self, busy=None):
+        """
+        Bật làm mới nền (src/refresh.py) trên thread riêng; lượt chat không bao giờ chờ nó.
+        busy(): True khi server đang đông -> scheduler tạm dừng giữa các bước.
+        """
+        if self.refresher is None:
+            self.refresher = RefreshScheduler(
+                self.graph, self.wikidata, self.wiki, self.iucn, self.birdspedia,
+                popularity=self.popularity, busy=busy, on_taxa=self.facet_parser.add_taxa
+            )
+            self.refresher.start()
+        return self.refresher
 
     def close(self):
+        if self.refresher is not None:
+            self.refresher.stop()
+        self.turn_executor.shutdown(wait=False, cancel_futures=True)
+        self.fetch_stage.shutdown()
         self.graph.close()
         print("👋 Connection closed.")
 
@@ -0,0 +1,109 @@
+import threading
+from bisect import bisect_left
+from typing import Dict, Iterable, Tuple
+
+# Bucket (giây) cho độ trễ từng giai đoạn: từ lookup cache (ms) tới LLM / nguồn ngoài (chục giây)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    parts = [f'{n}="{str(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class Histogram:
+    """Histogram kiểu Prometheus (bucket cộng dồn + _sum + _count) theo bộ nhãn."""
+    def __init__(self, name: str, doc: str, labelnames: Iterable[str] = (), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.doc = doc
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series = {}   # label values -> [counts per bucket (+Inf cuối), sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(str(labels.get(n, "")) for n in self.labelnames)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][bisect_left(self.buckets, value)] += 1
+            series[1] += value
+
+    def render(self) -> Iterable[str]:
+        yield f"# HELP {self.name} {self.doc}"
+        yield f"# TYPE {self.name} histogram"
+        with self._lock:
+            snapshot = [(key, list(counts), total) for key, (counts, total) in sorted(self._series.items())]
+        for key, counts, total in snapshot:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                labels = _format_labels(self.labelnames, key, 'le="%s"' % le)
+                yield f"{self.name}_bucket{labels} {cumulative}"
+            yield f"{self.name}_sum{_format_labels(self.labelnames, key)} {total}"
+            yield f"{self.name}_count{_format_labels(self.labelnames, key)} {cumulative}"
+
+
+class Counter:
+    """Counter kiểu Prometheus theo bộ nhãn."""
+    def __init__(self, name: str, doc: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.doc = doc
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(str(labels.get(n, "")) for n in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> Iterable[str]:
+        yield f"# HELP {self.name} {self.doc}"
+        yield f"# TYPE {self.name} counter"
+        with self._lock:
+            snapshot = sorted(self._values.items())
+        for key, value in snapshot:
+            yield f"{self.name}{_format_labels(self.labelnames, key)} {value}"
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics = []
+
+    def histogram(self, name: str, doc: str, labelnames: Iterable[str] = (), buckets=LATENCY_BUCKETS) -> Histogram:
+        metric = Histogram(name, doc, labelnames, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, doc: str, labelnames: Iterable[str] = ()) -> Counter:
+        metric = Counter(name, doc, labelnames)
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        """Định dạng text exposition của Prometheus (cho endpoint /metrics)."""
+        return "\n".join(line for metric in self._metrics for line in metric.render()) + "\n"
+
+
+METRICS = MetricsRegistry()
+# Content-Type của endpoint /metrics
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+STAGE_SECONDS = METRICS.histogram(
+    "birdrag_stage_duration_seconds", "Duration of one pipeline stage.", ("stage", "status"))
+TURN_SECONDS = METRICS.histogram(
+    "birdrag_turn_duration_seconds", "End-to-end duration of a chat turn.", ("cached",))
+LLM_TOKENS = METRICS.counter(
+    "birdrag_llm_tokens_total", "LLM tokens counted with tiktoken.", ("stage", "kind"))
+SLOW_TURNS = METRICS.counter(
+    "birdrag_slow_turns_total", "Turns slower than SLOW_TURN_MS.")
+PROMPT_TOKENS_SAVED = METRICS.counter(
+    "birdrag_prompt_tokens_saved_total", "Prompt tokens saved by context packing and history compression.", ("part",))
+REFRESH_CHECKS = METRICS.counter(
+    "birdrag_refresh_checks_total", "Species checked by the background refresh, per source and outcome.",
+    ("source", "outcome"))
@@ -0,0 +1,142 @@
+import re
+from typing import Any, Dict, List, Tuple
+
+from langchain_core.messages import HumanMessage, SystemMessage
+
+from src.tracing import count_tokens
+
+# Phần tĩnh của prompt sinh câu trả lời: giống hệt nhau ở mọi lượt chat và luôn đứng đầu
+# (SystemMessage) -> provider có thể cache prefix; phần thay đổi nằm hết trong HumanMessage.
+SYSTEM_PREFIX = """You are an expert Ornithologist representing the Vietnam Bird Association.
+Answer the user's question in VIETNAMESE (Tiếng Việt) using the Knowledge Graph Context.
+1. IMAGE: if a bird has an ImageURL, show it at the very top of its part of the answer: ![Bird Image](ImageURL).
+2. TRANSLATION: translate technical terms naturally ("Least Concern" -> "Ít quan tâm", "Omnivore" -> "Động vật ăn tạp").
+3. AUDIO: if an AudioURL is given, link it as [🔊 Nghe giọng hót](AudioURL).
+4. TONE: friendly and educational."""
+
+COMPARISON_RULE = "Several birds are listed: compare them point by point (a Markdown table is welcome)."
+
+# Thứ tự trường khi đóng gói context; Description (dài nhất) đứng cuối và bị cắt trước
+CONTEXT_KEYS = ("Name", "ScientificName", "Family", "ImageURL", "Mass", "ConservationStatus",
+                "Diet", "Habitat", "AudioURL", "Description")
+
+MARKDOWN_IMAGE = re.compile(r"!\[[^\]]*\]\([^)]*\)")
+MARKDOWN_LINK = re.compile(r"\[([^\]]*)\]\([^)]*\)")
+SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """Giữ các câu đầu tiên vừa max_tokens; câu đầu đã quá dài thì cắt theo ký tự (~4 ký tự / token)."""
+    if count_tokens(text) <= max_tokens:
+        return text
+    kept = ""
+    for sentence in SENTENCE_END.split(text):
+        candidate = f"{kept} {sentence}".strip()
+        if count_tokens(candidate) > max_tokens:
+            break
+        kept = candidate
+    return kept or text[:max(0, max_tokens) * 4].rstrip() + "…"
+
+
+def pack_context(context: Dict, description_tokens: int = None) -> str:
+    """Context của một loài -> các dòng 'Trường: giá trị' (bỏ trường rỗng, Score)."""
+    lines = []
+    for key in CONTEXT_KEYS:
+        value = context.get(key)
+        if value in (None, ""):
+            continue
+        if key == "Description" and description_tokens is not None:
+            if description_tokens <= 0:
+                continue
+            value = truncate_to_tokens(" ".join(str(value).split()), description_tokens)
+        lines.append(f"{key}: {value}")
+    return "\n".join(lines)
+
+
+class PromptAssembler:
+    """
+    Dựng prompt sinh câu trả lời trong một ngân sách token (đo bằng tiktoken):
+      1. SYSTEM_PREFIX tĩnh (cache được) + HumanMessage gồm context đã đóng gói và câu hỏi
+      2. vượt ngân sách -> cắt Description của từng loài (giữ các câu đầu)
+      3. vẫn vượt -> bỏ bớt loài cuối danh sách (điểm vector thấp nhất), giữ ít nhất một loài
+    Và nén lịch sử cho lời gọi phân tích câu hỏi (xem compress_history).
+    """
+    def __init__(self, token_budget: int = 1200, history_budget: int = 300,
+                 history_message_tokens: int = 60):
+        self.token_budget = token_budget
+        self.history_budget = history_budget
+        self.history_message_tokens = history_message_tokens
+        self.system_tokens = count_tokens(SYSTEM_PREFIX)
+
+    def build(self, context_data: Any, question: str, comparison: bool = False) -> Tuple[List, Dict]:
+        """Output: (messages cho LLM, thống kê token: prompt_tokens, raw_tokens, dropped_birds...)."""
+        contexts = context_data if isinstance(context_data, list) else [context_data]
+        question_block = f"--- USER QUESTION ---\n{question}"
+        if comparison:
+            question_block = f"{COMPARISON_RULE}\n{question_block}"
+        # Token cố định: phần tĩnh + câu hỏi + tiêu đề khối context
+        available = self.token_budget - self.system_tokens - count_tokens(question_block) - 10
+
+        records = [c for c in contexts if isinstance(c, dict)]
+        bird_count = len(records)
+        if not records:
+            blocks = [str(context_data)]
+        else:
+            # Phần không có Description của từng loài; bỏ loài cuối nếu riêng phần này đã vượt
+            headers = [count_tokens(pack_context(dict(c, Description=None))) for c in records]
+            while len(records) > 1 and sum(headers) > available:
+                records.pop()
+                headers.pop()
+            blocks = [pack_context(c) for c in records]
+            if sum(count_tokens(b) for b in blocks) > available:
+                # - 4: nhãn "Description: " + xuống dòng
+                per_bird = (available - sum(headers)) // len(records) - 4
+                blocks = [pack_context(c, description_tokens=per_bird) for c in records]
+
+        body = "--- CONTEXT DATA ---\n" + "\n\n".join(blocks) + "\n\n" + question_block
+        prompt_tokens = self.system_tokens + count_tokens(body)
+        # Cùng prompt nhưng context để nguyên dạng repr của dict (như trước) -> số token tiết kiệm
+        raw_tokens = self.system_tokens + count_tokens(f"--- CONTEXT DATA ---\n{context_data}\n\n{question_block}")
+        stats = {
+            "prompt_tokens": prompt_tokens,
+            "raw_tokens": raw_tokens,
+            "saved_tokens": max(0, raw_tokens - prompt_tokens),
+            "dropped_birds": bird_count - len(records),
+        }
+        return [SystemMessage(content=SYSTEM_PREFIX), HumanMessage(content=body)], stats
+
+    def _compact_message(self, role: str, content: str) -> str:
+        """Câu trả lời của AI: bỏ ảnh / URL Markdown (tốn token, vô ích cho việc phân tích)."""
+        if role == "ai":
+            content = MARKDOWN_LINK.sub(r"\1", MARKDOWN_IMAGE.sub("", content))
+        return " ".join(content.split())
+
+    def compress_history(self, history: List[Tuple[str, str]]) -> Tuple[str, Dict]:
+        """
+        Lịch sử cho lời gọi phân tích câu hỏi, trong history_budget token:
+        - lượt gần nhất giữ nguyên (đã bỏ ảnh / link)
+        - câu trả lời cũ hơn được tóm lược: chỉ giữ các câu đầu (history_message_tokens)
+        - vượt ngân sách -> bỏ các tin nhắn cũ nhất
+        Output: (chuỗi lịch sử, thống kê history_tokens, raw_history_tokens, dropped_messages).
+        """
+        raw = "\n".join(f"{role.upper()}: {content}" for role, content in history)
+        lines, used = [], 0
+        for index, (role, content) in enumerate(reversed(history)):
+            text = self._compact_message(role, content)
+            if index >= 2:
+                text = truncate_to_tokens(text, self.history_message_tokens)
+            line = f"{role.upper()}: {text}"
+            tokens = count_tokens(line)
+            if lines and used + tokens > self.history_budget:
+                break
+            if not lines and tokens > self.history_budget:
+                line = truncate_to_tokens(line, self.history_budget)
+                tokens = count_tokens(line)
+            lines.append(line)
+            used += tokens
+        history_str = "\n".join(reversed(lines))
+        return history_str, {
+            "history_tokens": count_tokens(history_str),
+            "raw_history_tokens": count_tokens(raw),
+            "dropped_messages": len(history) - len(lines),
+        }
@@ -0,0 +1,92 @@
+import json
+from typing import Callable, List, Optional
+
+from pydantic import BaseModel, ValidationError, field_validator, model_validator
+
+# Phần hướng dẫn tĩnh đứng trước, lịch sử + câu hỏi (thay đổi mỗi lượt) đứng cuối -> prefix cache được
+ANALYSIS_PROMPT = """You analyze questions for a bird knowledge base.
+Return ONLY a JSON object with these keys:
+- "standalone_question": the latest question rewritten so it is understandable without the history (replace pronouns such as nó, loài này, it, this bird with the bird name). Keep the original language. If no rewrite is needed, copy it unchanged.
+- "common_name": the bird common name mentioned, exactly as the user wrote it (e.g. "Chim sẻ", "Kingfisher"), or null if no bird is mentioned.
+- "scientific_name": your best guess of that bird's scientific name, or null.
+- "birds": EVERY bird mentioned (e.g. both birds in a comparison), in order, as a list of {{"common_name": ..., "scientific_name": ...}}; [] if none.
+
+Chat History:
+{history}
+
+Latest Question: {question}
+"""
+
+
+def _none_like(value):
+    if isinstance(value, str):
+        value = value.strip().strip('"')
+        if not value or value.lower() in ("none", "null", "unknown"):
+            return None
+    return value
+
+
+class BirdMention(BaseModel):
+    common_name: Optional[str] = None
+    scientific_name: Optional[str] = None
+
+    _normalize_names = field_validator("common_name", "scientific_name", mode="before")(_none_like)
+
+
+class QueryAnalysis(BaseModel):
+    """
+    Kết quả của lời gọi LLM gộp: câu hỏi độc lập + tên thường + tên khoa học dự đoán.
+    birds: mọi loài được nhắc (câu so sánh); common_name / scientific_name là loài đầu tiên.
+    """
+    standalone_question: str
+    common_name: Optional[str] = None
+    scientific_name: Optional[str] = None
+    birds: List[BirdMention] = []
+
+    _normalize_names = field_validator("common_name", "scientific_name", mode="before")(_none_like)
+
+    @field_validator("birds", mode="before")
+    @classmethod
+    def _bird_list(cls, value):
+        return value if isinstance(value, list) else []
+
+    @model_validator(mode="after")
+    def _first_bird(self):
+        self.birds = [b for b in self.birds if b.common_name]
+        if self.common_name and not any(b.common_name.lower() == self.common_name.lower() for b in self.birds):
+            self.birds.insert(0, BirdMention(common_name=self.common_name, scientific_name=self.scientific_name))
+        return self
+
+
+def parse_analysis(text: str) -> QueryAnalysis:
+    """Parse + validate JSON do LLM trả về (chấp nhận cả khi bị bọc trong ```json)."""
+    text = text.strip()
+    if text.startswith("```"):
+        text = text.strip("`")
+        if text.lower().startswith("json"):
+            text = text[4:]
+    start, end = text.find("{"), text.rfind("}")
+    if start == -1 or end == -1:
+        raise ValueError("No JSON object in LLM output")
+    return QueryAnalysis.model_validate(json.loads(text[start:end + 1]))
+
+
+def analyze_query(llm, question: str, history_str: str, max_retries: int = 2,
+                  on_call: Optional[Callable[[str, str], None]] = None) -> QueryAnalysis:
+    """
+    Một lời gọi LLM thay cho 3 bước (viết lại câu hỏi, nhận diện loài, đoán tên khoa học).
+    Chỉ gọi lại khi output không parse/validate được; lỗi mạng được ném ra ngay.
+    on_call(prompt, output): gọi sau mỗi lần gọi LLM (vd đếm token).
+    """
+    prompt = ANALYSIS_PROMPT.format(history=history_str or "(empty)", question=question)
+    last_error = None
+    for attempt in range(max_retries + 1):
+        text = llm.invoke(prompt).content
+        if on_call is not None:
+            on_call(prompt, text)
+        try:
+            return parse_analysis(text)
+        except (ValueError, ValidationError) as e:
+            last_error = e
+            print(f"   [Analysis] Invalid JSON (attempt {attempt + 1}): {e}")
+    raise ValueError(f"Could not parse query analysis: {last_error}")
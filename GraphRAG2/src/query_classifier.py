@@ -0,0 +1,97 @@
+import re
+import threading
+from typing import Iterable
+
+# Đại từ / cụm thay thế trỏ về loài chim đã nhắc trước đó
+# ("chúng ta / chúng tôi / chúng mình" là ngôi thứ nhất, không trỏ về loài nào)
+ANAPHORA_PATTERN = re.compile(
+    r"(?<!\w)(nó|chúng nó|chúng(?!\s+(?:ta|tôi|mình|em)(?!\w))|loài này|loài đó|loài kia|con này|con đó|con kia|"
+    r"chim này|chim đó|loài chim này|loài chim đó|loài trên|con trên)(?!\w)"
+    r"|\b(it|its|it's|they|them|their|this bird|that bird|these birds|those birds|"
+    r"this species|that species|the bird|the species|same bird)\b",
+    re.IGNORECASE
+)
+
+# Câu hỏi nối tiếp dạng rút gọn ("còn chào mào thì sao?", "what about ...")
+FOLLOW_UP_PATTERN = re.compile(
+    r"(?<!\w)(thì sao|còn\s+\w+.*\?$|vậy còn|thế còn)(?!\w)|\b(what about|how about|and the)\b",
+    re.IGNORECASE
+)
+
+# Tên loài một âm tiết trùng từ thông dụng ("thành công", "công viên"):
+# chỉ nhận là tên loài khi có "chim " đứng trước
+AMBIGUOUS_NAMES = {"công"}
+
+
+class RewriteClassifier:
+    """
+    Bộ phân loại cục bộ, rẻ: quyết định câu hỏi có cần LLM viết lại theo lịch sử không.
+    Bỏ qua LLM khi câu hỏi đã nêu tên một loài đã biết và không có đại từ /
+    câu hỏi nối tiếp. Đồng thời thống kê số lượt bỏ qua và thời gian tiết kiệm.
+    """
+    def __init__(self, known_names: Iterable[str] = ()):
+        self._names = set()
+        self._pattern = None
+        self._lock = threading.Lock()
+        self.skipped = 0
+        self.called = 0
+        self.llm_seconds = 0.0
+        self.add_names(known_names)
+
+    def add_names(self, names: Iterable[str]):
+        with self._lock:
+            before = len(self._names)
+            for name in names:
+                name = " ".join((name or "").lower().split())
+                if name:
+                    self._names.add(f"chim {name}" if name in AMBIGUOUS_NAMES else name)
+            if len(self._names) != before:
+                # Tên dài khớp trước ("chích chòe than" trước "chích chòe")
+                alternatives = "|".join(re.escape(n) for n in sorted(self._names, key=len, reverse=True))
+                self._pattern = re.compile(rf"(?<!\w)({alternatives})(?!\w)", re.IGNORECASE)
+
+    def find_known_species(self, query: str):
+        """Tên loài đã biết đầu tiên (ưu tiên tên dài nhất) xuất hiện trong câu hỏi, hoặc None."""
+        pattern = self._pattern
+        match = pattern.search(query) if pattern else None
+        return match.group(1) if match else None
+
+    def find_all_known_species(self, query: str):
+        """Mọi tên loài đã biết trong câu hỏi, theo thứ tự xuất hiện, không trùng (vd câu so sánh)."""
+        pattern = self._pattern
+        if pattern is None:
+            return []
+        names = []
+        for match in pattern.finditer(query):
+            if match.group(1).lower() not in (n.lower() for n in names):
+                names.append(match.group(1))
+        return names
+
+    def mentions_known_species(self, query: str) -> bool:
+        return self.find_known_species(query) is not None
+
+    def needs_rewrite(self, query: str) -> bool:
+        if ANAPHORA_PATTERN.search(query) or FOLLOW_UP_PATTERN.search(query.strip()):
+            return True
+        return not self.mentions_known_species(query)
+
+    def record(self, skipped: bool, llm_seconds: float = 0.0):
+        with self._lock:
+            if skipped:
+                self.skipped += 1
+            else:
+                self.called += 1
+                self.llm_seconds += llm_seconds
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.skipped + self.called
+            avg_llm = self.llm_seconds / self.called if self.called else 0.0
+            return {
+                "turns": total,
+                "skipped": self.skipped,
+                "skip_rate": self.skipped / total if total else 0.0,
+                "avg_rewrite_latency_s": avg_llm,
+                # Ước lượng: mỗi lượt bỏ qua tiết kiệm ~ độ trễ trung bình của một lần gọi
+                "estimated_saved_s": self.skipped * avg_llm,
+            }
@@ -0,0 +1,363 @@
+# File: src/refresh.py
+# Làm mới dần dữ liệu cũ trong Graph, chạy nền (không bao giờ chặn lượt chat):
+#   - mỗi node ghi kèm nguồn gốc: fetched_at + revision của nguồn (Wikidata lastrevid,
+#     Wikipedia revid, phiên bản Red List, ETag của trang ADW) — xem ENRICH_QUERY
+#   - mỗi lượt lấy một batch loài lâu chưa kiểm tra, loài được hỏi nhiều trước
+#   - kiểm tra theo batch bằng request rẻ (chỉ revision / ETag), chỉ tải lại + embed lại phần đã đổi
+# Chạy tay (từ thư mục GraphRAG2):
+#   python -m src.refresh --once          # một batch
+#   python -m src.refresh                 # lặp theo REFRESH_INTERVAL tới khi Ctrl+C
+import argparse
+import threading
+import time
+from typing import Callable, Dict, List
+
+from src.config import Config
+from src.data_loaders.base_fetcher import get_background_http_client
+from src.metrics import REFRESH_CHECKS
+
+
+class PopularityCounter:
+    """
+    Điểm phổ biến của từng loài: mỗi lần được hỏi +1, điểm giảm một nửa sau mỗi half_life giây.
+    Giữ tối đa max_entries loài (bỏ loài điểm thấp nhất khi đầy).
+    """
+    def __init__(self, half_life: float = 86400, max_entries: int = 5000):
+        self.half_life = half_life
+        self.max_entries = max_entries
+        self._scores = {}   # sci -> (điểm, thời điểm cập nhật)
+        self._lock = threading.Lock()
+
+    def _decayed(self, score: float, updated: float, now: float) -> float:
+        return score * 0.5 ** ((now - updated) / self.half_life)
+
+    def record(self, scientific_name: str):
+        if not scientific_name:
+            return
+        now = time.time()
+        with self._lock:
+            score, updated = self._scores.get(scientific_name, (0.0, now))
+            self._scores[scientific_name] = (self._decayed(score, updated, now) + 1, now)
+            if len(self._scores) > self.max_entries:
+                weakest = min(self._scores, key=lambda s: self._decayed(*self._scores[s], now))
+                del self._scores[weakest]
+
+    def scores(self, limit: int = 1000) -> Dict[str, float]:
+        """Top `limit` loài: {sci: điểm hiện tại} (tham số popularity của refresh_candidates)."""
+        now = time.time()
+        with self._lock:
+            current = {sci: self._decayed(score, updated, now) for sci, (score, updated) in self._scores.items()}
+        return dict(sorted(current.items(), key=lambda item: item[1], reverse=True)[:limit])
+
+
+class RefreshScheduler:
+    """
+    Mỗi lượt (run_once):
+      1. graph.refresh_candidates: batch loài có checked_at cũ hơn max_age, phổ biến trước
+      2. Wikipedia: revid hiện tại theo batch (50 trang / request) -> chỉ tải lại trang đã đổi;
+         chỉ embed lại khi đoạn mở đầu thật sự khác (sửa chỗ khác trong bài: chỉ ghi revid mới)
+      3. Wikidata: lastrevid theo batch -> một câu SPARQL cho các item đã đổi (hoặc chưa có họ / bộ)
+      4. IUCN: một request phiên bản Red List; chỉ tải lại trạng thái khi phiên bản đổi
+      5. ADW: GET có điều kiện theo ETag / Last-Modified (304 -> không đổi)
+      6. một commit_batch cho mọi loài có thay đổi (xoá cache context / câu trả lời của loài đó),
+         rồi mark_checked các loài đã kiểm tra xong mọi nguồn
+    Node cũ chưa có liên kết Status / Habitat / Diet được nối từ dữ liệu đã lưu, không cần tải lại.
+    Lỗi của một nguồn không chặn các nguồn khác; loài gặp lỗi (cả bước, hoặc request của riêng
+    loài đó) không được mark_checked nên lượt sau kiểm tra lại. Mọi request đi qua client HTTP
+    riêng (get_background_http_client: bucket chậm hơn, circuit breaker riêng). busy(): True khi
+    server đang đông -> tạm dừng trước mỗi request để nhường mạng / CPU cho lượt chat.
+    """
+    def __init__(self, graph, wikidata, wiki, iucn, birdspedia, popularity: PopularityCounter = None,
+                 interval: float = None, batch_size: int = None, max_age: float = None,
+                 busy: Callable[[], bool] = None, on_taxa: Callable[[List[Dict]], None] = None,
+                 http=None):
+        self.graph = graph
+        # Bản sao fetcher dùng client riêng: không tranh token bucket / breaker với lượt chat
+        http = http or get_background_http_client()
+        self.wikidata = wikidata.with_client(http)
+        self.wiki = wiki.with_client(http)
+        self.iucn = iucn.with_client(http)
+        self.birdspedia = birdspedia.with_client(http)
+        self.popularity = popularity or PopularityCounter(Config.REFRESH_POPULARITY_HALF_LIFE)
+        self.interval = interval if interval is not None else Config.REFRESH_INTERVAL
+        self.batch_size = batch_size or Config.REFRESH_BATCH_SIZE
+        self.max_age = max_age if max_age is not None else Config.REFRESH_MAX_AGE
+        self.busy = busy or (lambda: False)
+        # on_taxa(taxa): họ / bộ mới ghi vào Graph (vd FacetParser.add_taxa)
+        self.on_taxa = on_taxa
+        self._stop = threading.Event()
+        self._thread = None
+
+    # ------------------------------------------------------------------
+    # Thread nền
+    # ------------------------------------------------------------------
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._loop, name="refresh", daemon=True)
+            self._thread.start()
+            print(f"🔄 [Refresh] Scheduler started (every {self.interval:.0f}s, batch {self.batch_size})")
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def _loop(self):
+        wait = self.interval
+        while not self._stop.wait(wait):
+            try:
+                stats = self.run_once()
+            except Exception as e:
+                print(f"⚠️ [Refresh] Pass failed: {e}")
+                wait = self.interval
+                continue
+            # Batch đầy: còn loài cũ -> lượt tiếp theo chạy sớm
+            wait = 1.0 if stats["checked"] >= self.batch_size else self.interval
+
+    def _yield_to_foreground(self):
+        while self.busy() and not self._stop.is_set():
+            self._stop.wait(1.0)
+
+    def _pause(self) -> bool:
+        """Trước mỗi request: chờ khi server đông. True nếu scheduler đang dừng (bỏ qua phần còn lại)."""
+        self._yield_to_foreground()
+        return self._stop.is_set()
+
+    # ------------------------------------------------------------------
+    # Một lượt làm mới
+    # ------------------------------------------------------------------
+    def run_once(self) -> Dict:
+        """Output: {checked, failed, updated, reembedded, sources: {nguồn: {kết quả: số loài}}}."""
+        stats = {"checked": 0, "failed": 0, "updated": 0, "reembedded": 0, "sources": {}}
+        self._yield_to_foreground()
+        checked_before = int((time.time() - self.max_age) * 1000)
+        candidates = self.graph.refresh_candidates(self.batch_size, checked_before, self.popularity.scores())
+        if not candidates:
+            return stats
+
+        units = {}
+        unchecked = set()   # loài có request lỗi / chưa kiểm tra hết: không mark_checked
+
+        def unit(candidate):
+            sci = candidate["sci"]
+            if sci not in units:
+                units[sci] = self.graph.begin_enrichment(sci, candidate["common"])
+            return units[sci]
+
+        for source, step in (("wikipedia", self._refresh_wikipedia), ("wikidata", self._refresh_wikidata),
+                             ("iucn", self._refresh_iucn), ("ecology", self._refresh_ecology)):
+            self._yield_to_foreground()
+            if self._stop.is_set():
+                unchecked.update(c["sci"] for c in candidates)
+                break
+            try:
+                outcomes = step(candidates, unit, stats, unchecked)
+            except Exception as e:
+                print(f"⚠️ [Refresh] {source} check failed: {e}")
+                outcomes = {"error": len(candidates)}
+                unchecked.update(c["sci"] for c in candidates)
+            for outcome, count in outcomes.items():
+                if count:
+                    REFRESH_CHECKS.inc(count, source=source, outcome=outcome)
+            stats["sources"][source] = outcomes
+
+        if units:
+            self.graph.commit_batch(list(units.values()))
+        checked = [c["sci"] for c in candidates if c["sci"] not in unchecked]
+        if checked:
+            self.graph.mark_checked(checked)
+        stats.update(checked=len(checked), failed=len(candidates) - len(checked), updated=len(units))
+        print(f"🔄 [Refresh] {stats}")
+        return stats
+
+    def _refresh_wikipedia(self, candidates: List[Dict], unit, stats: Dict, unchecked: set) -> Dict[str, int]:
+        outcomes = {"unchanged": 0, "changed": 0, "missing": 0, "mismatch": 0, "error": 0}
+        changed = []   # (candidate, page mới)
+        by_lang = {}
+        for c in candidates:
+            if c["wiki_summary"] is None:
+                continue  # chưa có mô tả: lazy loading tải khi có người hỏi
+            if c["wiki_pageid"] is None or not c["wiki_lang"]:
+                # Node cũ chưa có id trang: tìm lại theo tên một lần để ghi revision. Kết quả tìm
+                # kiếm có thể là trang khác -> chỉ nhận khi đoạn mở đầu trùng mô tả đang lưu
+                if self._pause():
+                    unchecked.add(c["sci"])
+                    continue
+                try:
+                    page = self.wiki.refresh_page(c["common"], lang="vi")
+                except Exception as e:
+                    print(f"⚠️ [Refresh] wikipedia {c['sci']}: {e}")
+                    unchecked.add(c["sci"])
+                    outcomes["error"] += 1
+                    continue
+                if not page:
+                    outcomes["missing"] += 1
+                elif page["summary"] != c["wiki_summary"]:
+                    outcomes["mismatch"] += 1   # giữ nguyên node (mô tả, embedding)
+                else:
+                    changed.append((c, page))
+                continue
+            by_lang.setdefault(c["wiki_lang"], []).append(c)
+
+        for lang, group in by_lang.items():
+            if self._pause():
+                unchecked.update(c["sci"] for c in group)
+                continue
+            revisions = self.wiki.get_revisions([c["wiki_pageid"] for c in group], lang)
+            stale = [c for c in group if revisions.get(c["wiki_pageid"]) != c["wiki_revid"]]
+            outcomes["unchanged"] += len(group) - len(stale)
+            pages = self.wiki.fetch_pages([c["wiki_pageid"] for c in stale], lang) if stale else {}
+            for c in stale:
+                page = pages.get(c["wiki_pageid"])
+                if page and page["summary"]:
+                    changed.append((c, page))
+                else:
+                    outcomes["missing"] += 1  # trang bị xoá / đổi hướng: giữ mô tả cũ
+
+        # Chỉ embed lại khi đoạn mở đầu khác; embed cả nhóm trong một batch
+        rewritten = [(c, page) for c, page in changed if page["summary"] != c["wiki_summary"]]
+        if rewritten:
+            self._yield_to_foreground()
+            vectors = self.graph.embeddings.embed_documents([page["summary"] for _, page in rewritten])
+            for (c, page), vector in zip(rewritten, vectors):
+                unit(c).set_wiki(page["summary"], embedding=vector, revision=page)
+            stats["reembedded"] += len(rewritten)
+        for c, page in changed:
+            if page["summary"] == c["wiki_summary"]:
+                unit(c).set_wiki_revision(page)
+        outcomes["changed"] += len(rewritten)
+        outcomes["unchanged"] += len(changed) - len(rewritten)
+        return outcomes
+
+    def _refresh_wikidata(self, candidates: List[Dict], unit, stats: Dict, unchecked: set) -> Dict[str, int]:
+        outcomes = {"unchanged": 0, "changed": 0, "untracked": 0, "error": 0}
+        tracked = [c for c in candidates if c["wikidata_id"]]
+        for c in candidates:
+            if not c["wikidata_id"]:
+                # Node cũ: lấy QID (gazetteer / cache), lượt sau mới so revision
+                if self._pause():
+                    unchecked.add(c["sci"])
+                    continue
+                try:
+                    data = self.wikidata.get_bird_data(c["sci"], strict=True) or {}
+                except Exception as e:
+                    print(f"⚠️ [Refresh] wikidata {c['sci']}: {e}")
+                    unchecked.add(c["sci"])
+                    outcomes["error"] += 1
+                    continue
+                if data.get("wikidata_id"):
+                    unit(c).set_details(None, None, wikidata_id=data["wikidata_id"])
+                outcomes["untracked"] += 1
+        if not tracked:
+            return outcomes
+        if self._pause():
+            unchecked.update(c["sci"] for c in tracked)
+            return outcomes
+
+        revisions = self.wikidata.get_revisions([c["wikidata_id"] for c in tracked])
+        stale = [c for c in tracked
+                 if revisions.get(c["wikidata_id"]) != c["wikidata_revid"] or not c["has_family"]]
+        outcomes["unchanged"] += len(tracked) - len(stale)
+        details = self.wikidata.fetch_details([c["wikidata_id"] for c in stale]) if stale else {}
+        for c in stale:
+            data = details.get(c["wikidata_id"])
+            if data:
+                # revid từ wbgetentities (mới hơn bản của SPARQL endpoint nếu endpoint còn trễ)
+                unit(c).set_details(data["image_url"], data["mass"], wikidata_id=c["wikidata_id"],
+                                    revid=revisions.get(c["wikidata_id"]) or data["revid"],
+                                    family=data["family"], order=data["order"])
+                if self.on_taxa:
+                    self.on_taxa([dict(data["family"] or {}, rank="family"), dict(data["order"] or {}, rank="order")])
+                outcomes["changed"] += 1
+        return outcomes
+
+    def _refresh_iucn(self, candidates: List[Dict], unit, stats: Dict, unchecked: set) -> Dict[str, int]:
+        outcomes = {"unchanged": 0, "changed": 0, "error": 0}
+        with_status = [c for c in candidates if c["has_status"]]
+        if not with_status:
+            return outcomes
+        if not self.iucn.has_token():
+            # Không kiểm tra được nguồn: chỉ nối node Status từ trạng thái đã lưu
+            for c in with_status:
+                if not c["has_category"]:
+                    unit(c).set_status(c["iucn_status"], version=c["iucn_version"])
+            return outcomes
+        version = self.iucn.get_version()
+        for c in with_status:
+            if version and c["iucn_version"] == version:
+                if not c["has_category"]:
+                    unit(c).set_status(c["iucn_status"], version=version)
+                outcomes["unchanged"] += 1
+                continue
+            if self._pause():
+                unchecked.add(c["sci"])
+                continue
+            try:
+                status = self.iucn.refresh_status(c["sci"])
+            except Exception as e:
+                print(f"⚠️ [Refresh] iucn {c['sci']}: {e}")
+                unchecked.add(c["sci"])
+                outcomes["error"] += 1
+                continue
+            if status:
+                unit(c).set_status(status, version=version)
+                outcomes["changed" if status != c["iucn_status"] else "unchanged"] += 1
+        return outcomes
+
+    def _refresh_ecology(self, candidates: List[Dict], unit, stats: Dict, unchecked: set) -> Dict[str, int]:
+        outcomes = {"unchanged": 0, "changed": 0, "error": 0}
+        for c in candidates:
+            if not c["has_ecology"]:
+                continue
+            if self._pause():
+                unchecked.add(c["sci"])
+                continue
+            try:
+                data = self.birdspedia.fetch_if_modified(c["sci"], c["ecology_etag"], c["ecology_last_modified"])
+            except Exception as e:
+                print(f"⚠️ [Refresh] ecology {c['sci']}: {e}")
+                unchecked.add(c["sci"])
+                outcomes["error"] += 1
+                continue
+            if data:
+                unit(c).set_ecology(data)
+                outcomes["changed"] += 1
+            else:
+                if not c["has_facets"]:
+                    unit(c).set_ecology({"diet": c["ecology_diet"], "habitat": c["ecology_habitat"],
+                                         "migration": c["ecology_migration"], "etag": c["ecology_etag"],
+                                         "last_modified": c["ecology_last_modified"]})
+                outcomes["unchanged"] += 1
+        return outcomes
+
+
+if __name__ == "__main__":
+    from src.data_loaders.birdspedia import BirdspediaFetcher
+    from src.data_loaders.iucn import IUCNFetcher
+    from src.data_loaders.wikidata import WikidataFetcher
+    from src.data_loaders.wikipedia import WikipediaFetcher
+    from src.graph.neo4j_handler import Neo4jHandler
+
+    parser = argparse.ArgumentParser(description="Refresh stale species data in the graph")
+    parser.add_argument("--once", action="store_true", help="chạy một batch rồi thoát")
+    parser.add_argument("--batch-size", type=int, default=Config.REFRESH_BATCH_SIZE)
+    parser.add_argument("--max-age", type=float, default=Config.REFRESH_MAX_AGE,
+                        help="kiểm tra lại loài đã kiểm tra cách đây hơn chừng này giây")
+    args = parser.parse_args()
+
+    graph = Neo4jHandler()
+    scheduler = RefreshScheduler(graph, WikidataFetcher(), WikipediaFetcher(), IUCNFetcher(),
+                                 BirdspediaFetcher(), batch_size=args.batch_size, max_age=args.max_age)
+    try:
+        if args.once:
+            scheduler.run_once()
+        else:
+            scheduler.start()
+            while True:
+                time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        scheduler.stop()
+        graph.close()
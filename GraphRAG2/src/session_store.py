@@ -0,0 +1,135 @@
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import List, Tuple
+
+from src.config import Config
+
+# Một tin nhắn trong lịch sử: (role, content) với role là 'human' hoặc 'ai'
+Message = Tuple[str, str]
+
+
+class InMemorySessionStore:
+    """
+    Lịch sử hội thoại theo session_id, lưu trong RAM.
+    - Mỗi session chỉ giữ max_messages tin nhắn gần nhất (deque có maxlen).
+    - Session không hoạt động quá idle_ttl giây bị xoá; tổng số session bị chặn
+      bởi max_sessions (xoá session cũ nhất trước).
+    """
+    def __init__(self, max_messages: int = 6, idle_ttl: float = 1800, max_sessions: int = 10000):
+        self.max_messages = max_messages
+        self.idle_ttl = idle_ttl
+        self.max_sessions = max_sessions
+        # session_id -> [last_seen, deque]; thứ tự = thứ tự truy cập (cũ nhất ở đầu)
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _evict_locked(self, now: float):
+        while self._sessions:
+            session_id, (last_seen, _) = next(iter(self._sessions.items()))
+            if last_seen + self.idle_ttl >= now and len(self._sessions) <= self.max_sessions:
+                break
+            del self._sessions[session_id]
+
+    def get_history(self, session_id: str) -> List[Message]:
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            if entry is None or entry[0] + self.idle_ttl < time.time():
+                return []
+            return list(entry[1])
+
+    def append(self, session_id: str, role: str, content: str):
+        now = time.time()
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            if entry is None:
+                entry = self._sessions[session_id] = [now, deque(maxlen=self.max_messages)]
+            entry[0] = now
+            entry[1].append((role, content))
+            self._sessions.move_to_end(session_id)
+            self._evict_locked(now)
+
+    def evict_idle(self):
+        with self._lock:
+            self._evict_locked(time.time())
+
+    def __len__(self):
+        return len(self._sessions)
+
+
+class SQLiteSessionStore:
+    """
+    Cùng interface với InMemorySessionStore nhưng lưu xuống SQLite,
+    dùng khi cần giữ lịch sử qua các lần restart hoặc chia sẻ giữa các process.
+    """
+    def __init__(self, path: str, max_messages: int = 6, idle_ttl: float = 1800):
+        self.max_messages = max_messages
+        self.idle_ttl = idle_ttl
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS messages (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                session_id TEXT NOT NULL,
+                role TEXT NOT NULL,
+                content TEXT NOT NULL,
+                ts REAL NOT NULL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_messages_session ON messages(session_id, id)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_messages_ts ON messages(ts)")
+        self._conn.commit()
+        self._appends = 0
+
+    def get_history(self, session_id: str) -> List[Message]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT role, content FROM messages WHERE session_id = ? AND ts >= ? "
+                "ORDER BY id DESC LIMIT ?",
+                (session_id, time.time() - self.idle_ttl, self.max_messages)
+            ).fetchall()
+        return [(role, content) for role, content in reversed(rows)]
+
+    def append(self, session_id: str, role: str, content: str):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO messages (session_id, role, content, ts) VALUES (?, ?, ?, ?)",
+                (session_id, role, content, now)
+            )
+            # Chỉ giữ max_messages tin nhắn cuối của session
+            self._conn.execute(
+                "DELETE FROM messages WHERE session_id = ? AND id NOT IN "
+                "(SELECT id FROM messages WHERE session_id = ? ORDER BY id DESC LIMIT ?)",
+                (session_id, session_id, self.max_messages)
+            )
+            # Thỉnh thoảng dọn các session idle để file không phình to
+            self._appends += 1
+            if self._appends % 100 == 0:
+                self._conn.execute("DELETE FROM messages WHERE ts < ?", (now - self.idle_ttl,))
+            self._conn.commit()
+
+    def evict_idle(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM messages WHERE ts < ?", (time.time() - self.idle_ttl,))
+            self._conn.commit()
+
+
+def create_session_store():
+    """Chọn backend theo Config.SESSION_BACKEND ('memory' hoặc 'sqlite')."""
+    if Config.SESSION_BACKEND == "sqlite":
+        return SQLiteSessionStore(
+            Config.SESSION_DB_PATH,
+            max_messages=Config.SESSION_MAX_MESSAGES,
+            idle_ttl=Config.SESSION_IDLE_TTL
+        )
+    return InMemorySessionStore(
+        max_messages=Config.SESSION_MAX_MESSAGES,
+        idle_ttl=Config.SESSION_IDLE_TTL,
+        max_sessions=Config.SESSION_MAX_SESSIONS
+    )
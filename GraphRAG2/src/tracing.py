@@ -0,0 +1,124 @@
+import json
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional
+
+from src.config import Config
+from src.metrics import LLM_TOKENS, SLOW_TURNS, STAGE_SECONDS, TURN_SECONDS
+
+_encoding = None
+_encoding_lock = threading.Lock()
+
+
+def count_tokens(text: str) -> int:
+    """
+    Đếm token bằng tiktoken (cl100k_base). Tokenizer của Llama trên Groq khác một
+    chút, nhưng đủ để so sánh chi phí giữa các giai đoạn / các lượt chat.
+    tiktoken tải file BPE ở lần dùng đầu; nếu không tải được (offline) thì ước lượng
+    ~4 ký tự / token, không làm hỏng lượt chat.
+    """
+    global _encoding
+    if not text:
+        return 0
+    if _encoding is None:
+        with _encoding_lock:
+            if _encoding is None:
+                try:
+                    import tiktoken
+                    _encoding = tiktoken.get_encoding("cl100k_base")
+                except Exception as e:
+                    print(f"   [Trace Warning] tiktoken unavailable, estimating token counts: {e.__class__.__name__}")
+                    _encoding = False
+    if _encoding is False:
+        return max(1, len(text) // 4)
+    return len(_encoding.encode(text, disallowed_special=()))
+
+
+def tokenizer_name() -> str:
+    """'tiktoken' hoặc 'estimate' (khi không tải được tiktoken); None nếu chưa đếm lần nào."""
+    if _encoding is None:
+        return None
+    return "tiktoken" if _encoding else "estimate"
+
+
+class Trace:
+    """
+    Các span thời gian của MỘT lượt chat (contextualize, extract, resolve,
+    check_data_status, fetch.<nguồn>, embedding, get_full_context, generation...).
+    - Mỗi span được ghi vào histogram birdrag_stage_duration_seconds.
+    - finish() ghi thời gian cả lượt và, nếu chậm hơn Config.SLOW_TURN_MS,
+      ghi toàn bộ breakdown vào slow-turn log (JSONL).
+    An toàn giữa các thread (các fetcher chạy song song cùng ghi span).
+    """
+    def __init__(self, trace_id: Optional[str] = None):
+        self.trace_id = trace_id or uuid.uuid4().hex[:16]
+        self.started = time.perf_counter()
+        self.spans: List[Dict] = []
+        self.attrs: Dict = {}
+        self._lock = threading.Lock()
+
+    def add_span(self, name: str, start: float, seconds: float, status: str = "ok", **attrs):
+        STAGE_SECONDS.observe(seconds, stage=name, status=status)
+        span = {"name": name, "start_ms": round((start - self.started) * 1000, 1),
+                "duration_ms": round(seconds * 1000, 1), "status": status}
+        span.update(attrs)
+        with self._lock:
+            self.spans.append(span)
+
+    @contextmanager
+    def span(self, name: str, **attrs):
+        """with trace.span("resolve") as attrs: ... ; attrs là dict, thêm thuộc tính tuỳ ý."""
+        start = time.perf_counter()
+        status = "ok"
+        try:
+            yield attrs
+        except BaseException:
+            status = "error"
+            raise
+        finally:
+            self.add_span(name, start, time.perf_counter() - start, status, **attrs)
+
+    def wrap(self, name: str, fn: Callable) -> Callable:
+        """Bọc một hàm không tham số (vd task của ConcurrentFetchStage) trong một span."""
+        def run():
+            with self.span(name):
+                return fn()
+        return run
+
+    def record_llm(self, stage: str, attrs: Dict, prompt: str, completion: str):
+        """Đếm token vào và ra của một lời gọi LLM, cộng vào attrs của span và counter."""
+        prompt_tokens, completion_tokens = count_tokens(prompt), count_tokens(completion)
+        attrs["prompt_tokens"] = attrs.get("prompt_tokens", 0) + prompt_tokens
+        attrs["completion_tokens"] = attrs.get("completion_tokens", 0) + completion_tokens
+        LLM_TOKENS.inc(prompt_tokens, stage=stage, kind="prompt")
+        LLM_TOKENS.inc(completion_tokens, stage=stage, kind="completion")
+
+    def finish(self, **attrs) -> Dict:
+        """Kết thúc lượt chat. Output: breakdown {trace_id, total_ms, spans, ...}."""
+        total = time.perf_counter() - self.started
+        self.attrs.update(attrs)
+        TURN_SECONDS.observe(total, cached=bool(self.attrs.get("cached")))
+        with self._lock:
+            spans = sorted(self.spans, key=lambda s: s["start_ms"])
+        breakdown = {"trace_id": self.trace_id, "total_ms": round(total * 1000, 1), **self.attrs, "spans": spans}
+        if total * 1000 >= Config.SLOW_TURN_MS:
+            self._log_slow_turn(breakdown)
+        return breakdown
+
+    def _log_slow_turn(self, breakdown: Dict):
+        SLOW_TURNS.inc()
+        slowest = max(breakdown["spans"], key=lambda s: s["duration_ms"], default=None)
+        if slowest:
+            print(f"🐢 [Slow turn {self.trace_id}] {breakdown['total_ms']:.0f}ms, "
+                  f"slowest stage: {slowest['name']} ({slowest['duration_ms']:.0f}ms)")
+        path = Config.SLOW_TURN_LOG_PATH
+        try:
+            if os.path.dirname(path):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(breakdown, ensure_ascii=False) + "\n")
+        except OSError as e:
+            print(f"   [Trace Warning] Could not write slow-turn log: {e}")
@@ -0,0 +1,243 @@
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+
+
+class _InFlight:
+    """Một lần load đang chạy; các request trùng key chờ trên event này."""
+    def __init__(self):
+        self.event = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class TTLCache:
+    """
+    Cache LRU trong bộ nhớ, có TTL, dùng an toàn giữa nhiều thread.
+    - Kết quả None (không tìm thấy) được cache với negative_ttl riêng (ngắn hơn).
+    - get_or_load gộp các request đồng thời cùng key: chỉ một thread gọi loader,
+      các thread khác chờ và dùng chung kết quả (request coalescing).
+    - Lỗi (exception) từ loader không được cache.
+    """
+    def __init__(self, maxsize: int = 1024, ttl: float = 3600, negative_ttl: float = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.negative_ttl = ttl if negative_ttl is None else negative_ttl
+        self._data = OrderedDict()   # key -> (expires_at, value)
+        self._inflight = {}          # key -> _InFlight
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    def _lookup(self, key):
+        """Gọi khi đang giữ lock. Trả về (found, value)."""
+        entry = self._data.get(key)
+        if entry is None:
+            return False, None
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._data[key]
+            return False, None
+        self._data.move_to_end(key)
+        return True, value
+
+    def get(self, key, default=None):
+        with self._lock:
+            found, value = self._lookup(key)
+            if found:
+                self.hits += 1
+                return value
+            self.misses += 1
+            return default
+
+    def set(self, key, value, ttl: float = None):
+        if ttl is None:
+            ttl = self.negative_ttl if value is None else self.ttl
+        with self._lock:
+            self._data[key] = (time.monotonic() + ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def invalidate(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def get_or_load(self, key, loader):
+        with self._lock:
+            found, value = self._lookup(key)
+            if found:
+                self.hits += 1
+                return value
+            flight = self._inflight.get(key)
+            leader = flight is None
+            if leader:
+                self.misses += 1
+                flight = self._inflight[key] = _InFlight()
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            flight.event.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+
+        try:
+            flight.value = loader()
+            self.set(key, flight.value)
+            return flight.value
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+            flight.event.set()
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses + self.coalesced
+            return {
+                "size": len(self._data),
+                "hits": self.hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "hit_rate": (self.hits + self.coalesced) / total if total else 0.0,
+            }
+
+
+class TokenBucket:
+    """Token bucket: trung bình `rate` lượt/giây, cho phép burst tới `capacity`."""
+    def __init__(self, rate: float, capacity: float = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def try_acquire(self, tokens: float = 1) -> float:
+        """Lấy token nếu đủ -> 0.0; nếu không, trả về số giây cần chờ."""
+        with self._lock:
+            self._refill(time.monotonic())
+            if self._tokens >= tokens:
+                self._tokens -= tokens
+                return 0.0
+            return (tokens - self._tokens) / self.rate
+
+    def acquire(self, tokens: float = 1):
+        """Chặn cho tới khi lấy được token."""
+        while True:
+            wait = self.try_acquire(tokens)
+            if wait <= 0:
+                return
+            time.sleep(wait)
+
+
+class RateLimiter:
+    """Một token bucket cho mỗi host (vd 'query.wikidata.org')."""
+    def __init__(self, rates: dict = None, default_rate: float = 5.0):
+        self.rates = rates or {}
+        self.default_rate = default_rate
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def bucket(self, host: str) -> TokenBucket:
+        with self._lock:
+            if host not in self._buckets:
+                self._buckets[host] = TokenBucket(self.rates.get(host, self.default_rate))
+            return self._buckets[host]
+
+    def acquire(self, host: str):
+        self.bucket(host).acquire()
+
+
+class Overloaded(Exception):
+    """Hết slot xử lý và hàng chờ đã đầy (hoặc chờ quá lâu) -> server trả 503."""
+
+
+class ConcurrencyLimiter:
+    """
+    Giới hạn số lượt chat xử lý đồng thời (`limit`) kèm một hàng chờ có giới hạn
+    (`max_waiting`). Hàng chờ đầy, hoặc chờ quá `wait_timeout` giây -> Overloaded.
+    Bản đồng bộ, dùng cho server WSGI (mỗi request một thread).
+    """
+    def __init__(self, limit: int, max_waiting: int = 0, wait_timeout: float = 5.0):
+        self.limit = limit
+        self.max_waiting = max_waiting
+        self.wait_timeout = wait_timeout
+        self._cond = threading.Condition()
+        self.in_flight = 0
+        self.waiting = 0
+        self.rejected = 0
+
+    def acquire(self):
+        with self._cond:
+            if self.in_flight >= self.limit:
+                if self.waiting >= self.max_waiting:
+                    self.rejected += 1
+                    raise Overloaded("queue is full")
+                self.waiting += 1
+                try:
+                    ok = self._cond.wait_for(lambda: self.in_flight < self.limit, timeout=self.wait_timeout)
+                finally:
+                    self.waiting -= 1
+                if not ok:
+                    self.rejected += 1
+                    raise Overloaded("timed out waiting for a slot")
+            self.in_flight += 1
+
+    def release(self):
+        with self._cond:
+            self.in_flight -= 1
+            self._cond.notify()
+
+    def stats(self) -> dict:
+        return {"limit": self.limit, "in_flight": self.in_flight,
+                "waiting": self.waiting, "rejected": self.rejected}
+
+
+class AsyncConcurrencyLimiter:
+    """Cùng chính sách với ConcurrencyLimiter nhưng cho event loop (server ASGI)."""
+    def __init__(self, limit: int, max_waiting: int = 0, wait_timeout: float = 5.0):
+        self.limit = limit
+        self.max_waiting = max_waiting
+        self.wait_timeout = wait_timeout
+        self._sem = asyncio.Semaphore(limit)
+        self.in_flight = 0
+        self.waiting = 0
+        self.rejected = 0
+
+    async def acquire(self):
+        # Đếm cả các request đang chờ semaphore: kiểm tra và tăng waiting không có await
+        # ở giữa nên không bị chen ngang trên cùng event loop
+        if self.in_flight + self.waiting >= self.limit + self.max_waiting:
+            self.rejected += 1
+            raise Overloaded("queue is full")
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(self._sem.acquire(), timeout=self.wait_timeout)
+        except asyncio.TimeoutError:
+            self.rejected += 1
+            raise Overloaded("timed out waiting for a slot")
+        finally:
+            self.waiting -= 1
+        self.in_flight += 1
+
+    def release(self):
+        self.in_flight -= 1
+        self._sem.release()
+
+    def stats(self) -> dict:
+        return {"limit": self.limit, "in_flight": self.in_flight,
+                "waiting": self.waiting, "rejected": self.rejected}
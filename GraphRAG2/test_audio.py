@@ -1,7 +1,7 @@
 # File: test_audio.py
 from src.data_loaders.xenocanto import XenoCantoFetcher
 
-print("--- BẮT ĐẦU TEST (SCRAPING MODE) ---")
+print("--- BẮT ĐẦU TEST (XENO-CANTO API) ---")
 
 sci_name = "Alcedo atthis" 
 fetcher = XenoCantoFetcher()
@@ -12,9 +12,9 @@ try:
     result = fetcher.get_audio(sci_name)
     
     if result:
-        print(f"✅ THÀNH CÔNG!")
-        print(f"🎵 URL: {result['url']}")
-        print(f"📍 Location: {result['loc']}")
+        print(f"✅ THÀNH CÔNG! {len(result)} bản ghi")
+        for rec in result:
+            print(f"🎵 [{rec['quality']}] {rec['url']} | 📍 {rec['loc']} | ⏱️ {rec['length']}s")
     else:
         print("❌ Không tìm thấy dữ liệu.")
 